@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Tests for the ml2c transpiler: the generated code of every code generation
+option set must agree with scikit-learn, and the prediction server must
+answer both of its protocols.
+
+Run with: python -m pytest test_transpiler.py (needs gcc)
+"""
+
+import ctypes
+import http.client
+import json
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+from sklearn.datasets import load_wine
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from transpiler import LINEAR_STRATEGIES, TREE_STRATEGIES, ModelTranspiler
+
+pytestmark = pytest.mark.skipif(shutil.which("gcc") is None, reason="gcc is required")
+
+
+@pytest.fixture(scope="module")
+def wine():
+    X, y = load_wine(return_X_y=True)
+    return X.astype(np.float32), y
+
+
+@pytest.fixture(scope="module")
+def models(wine):
+    X, y = wine
+    return {
+        "linear": LinearRegression().fit(X, X[:, 12]),
+        "logistic": LogisticRegression(max_iter=10000).fit(X, y == 0),
+        "tree": DecisionTreeClassifier(random_state=0).fit(X, y),
+        "forest": RandomForestClassifier(n_estimators=25, max_depth=6, random_state=0).fit(X, y)
+    }
+
+
+def threshold_rows(X, model):
+    """
+    Rows of X with one feature set to each float32 neighbour of a threshold
+    the model compares against: the largest float32 below or at it, which
+    goes left, and the next one up, which goes right.
+    """
+    estimators = getattr(model, "estimators_", [model])
+    rows = []
+    for estimator in estimators:
+        tree = estimator.tree_
+        for node in np.flatnonzero(tree.children_left != tree.children_right)[:20]:
+            # sklearn compares float32 inputs against the float64 threshold
+            t32 = np.float32(tree.threshold[node])
+            if t32 > tree.threshold[node]:
+                t32 = np.nextafter(t32, np.float32(-np.inf))
+            for value in (t32, np.nextafter(t32, np.float32(np.inf))):
+                row = X[node % len(X)].copy()
+                row[tree.feature[node]] = value
+                rows.append(row)
+    return np.vstack([X] + rows)
+
+
+def native_outputs(transpiler, X, workdir):
+    """Outputs of the generated prediction_batch() for X, through a shared library."""
+    c_file = transpiler.save_library(os.path.join(workdir, "model.c"))
+    library = ctypes.CDLL(transpiler.compile_shared(c_file))
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    out = np.empty(len(X), dtype=np.float32)
+    library.prediction_batch(ctypes.c_void_p(X.ctypes.data), ctypes.c_int(len(X)),
+                             ctypes.c_void_p(out.ctypes.data))
+    return out, library
+
+
+@pytest.mark.parametrize("name", ["linear", "logistic"])
+@pytest.mark.parametrize("strategy", LINEAR_STRATEGIES)
+def test_linear_models_match_sklearn(models, wine, tmp_path, name, strategy):
+    X, _ = wine
+    transpiler = ModelTranspiler.from_model(models[name], {"linear": strategy})
+    out, _ = native_outputs(transpiler, X, str(tmp_path))
+    expected = transpiler.reference_output(X)
+    atol = 1e-5 * max(1.0, float(np.abs(expected).max()))
+    np.testing.assert_allclose(out, expected, rtol=1e-5, atol=atol)
+
+
+@pytest.mark.parametrize("strategy", TREE_STRATEGIES)
+@pytest.mark.parametrize("binning", [False, True])
+def test_decision_tree_matches_sklearn(models, wine, tmp_path, strategy, binning):
+    model = models["tree"]
+    X = threshold_rows(wine[0], model)
+    transpiler = ModelTranspiler.from_model(model, {"tree": strategy, "binning": binning})
+    out, _ = native_outputs(transpiler, X, str(tmp_path))
+    np.testing.assert_array_equal(model.classes_[out.astype(np.intp)], model.predict(X))
+
+
+@pytest.mark.parametrize("strategy", TREE_STRATEGIES)
+@pytest.mark.parametrize("binning", [False, True])
+@pytest.mark.parametrize("early_exit", [False, True])
+def test_forest_matches_sklearn(models, wine, tmp_path, strategy, binning, early_exit):
+    model = models["forest"]
+    X = threshold_rows(wine[0], model)
+    transpiler = ModelTranspiler.from_model(
+        model, {"tree": strategy, "binning": binning, "early_exit": early_exit})
+    out, library = native_outputs(transpiler, X, str(tmp_path))
+    np.testing.assert_array_equal(out, model.predict(X))
+    if early_exit:
+        library.prediction_avg_trees.restype = ctypes.c_double
+        avg_trees = library.prediction_avg_trees()
+        assert len(model.estimators_) / 2 <= avg_trees <= len(model.estimators_)
+
+
+def test_build_incremental_reuses_tree_objects(models, wine, tmp_path):
+    model = models["forest"]
+    X = wine[0][:3]
+    binary = str(tmp_path / "forest_inference")
+
+    transpiler = ModelTranspiler.from_model(model)
+    transpiler.build_incremental(binary, test_data=X)
+    assert transpiler.build_stats["compiled"] == transpiler.build_stats["trees"]
+
+    transpiler = ModelTranspiler.from_model(model)
+    transpiler.build_incremental(binary, test_data=X)
+    assert transpiler.build_stats["compiled"] == 0
+
+    output = subprocess.run([binary], capture_output=True, text=True, check=True).stdout
+    predictions = [float(line.split(":")[1]) for line in output.splitlines() if "Test" in line]
+    np.testing.assert_array_equal(predictions, model.predict(X))
+
+
+def test_autotune_checks_candidates_against_sklearn(models, wine, monkeypatch):
+    transpiler = ModelTranspiler.from_model(models["forest"])
+    candidates = [{"tree": "nested_if"}, {"tree": "table"}]
+    benchmark = transpiler._benchmark_options
+
+    def wrong_baseline(options, *args):
+        timings, outputs, avg_trees = benchmark(options, *args)
+        if options["tree"] == "nested_if":
+            # A miscompiled first candidate must not become the reference
+            outputs = outputs + 1
+        return timings, outputs, avg_trees
+
+    monkeypatch.setattr(transpiler, "_benchmark_options", wrong_baseline)
+    results = transpiler.autotune(wine[0], batch_sizes=(1, 64), min_time_ms=1,
+                                  candidates=candidates, save=False)
+    assert [r["options"]["tree"] for r in results] == ["table"]
+    assert transpiler.options["tree"] == "table"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def server(models, tmp_path):
+    model = models["forest"]
+    transpiler = ModelTranspiler.from_model(model, {"early_exit": True})
+    binary = transpiler.compile(transpiler.save_server(str(tmp_path / "model_server.c")))
+    port = free_port()
+    process = subprocess.Popen([binary, "--port", str(port)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline or process.poll() is not None:
+                    raise RuntimeError("Prediction server did not start")
+                time.sleep(0.05)
+        yield port
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def read_exactly(sock, n):
+    data = b""
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        assert chunk, "connection closed"
+        data += chunk
+    return data
+
+
+def test_server_binary_protocol(server, models, wine):
+    X = wine[0][:50]
+    payload = np.ascontiguousarray(X, dtype="<f4").tobytes()
+    with socket.create_connection(("127.0.0.1", server), timeout=10) as sock:
+        # Two pipelined requests on one connection
+        sock.sendall((struct.pack("<I", len(payload)) + payload) * 2)
+        for _ in range(2):
+            (n_bytes,) = struct.unpack("<I", read_exactly(sock, 4))
+            predictions = np.frombuffer(read_exactly(sock, n_bytes), dtype="<f4")
+            np.testing.assert_array_equal(predictions, models["forest"].predict(X))
+
+
+def test_server_http_protocol(server, models, wine):
+    X = wine[0][:10]
+    connection = http.client.HTTPConnection("127.0.0.1", server, timeout=10)
+    connection.request("POST", "/predict", json.dumps({"features": X.tolist()}),
+                       {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    assert response.status == 200
+    predictions = json.loads(response.read())["predictions"]
+    np.testing.assert_array_equal(predictions, models["forest"].predict(X))
+    connection.close()
+
+    for path in ("/health", "/stats"):
+        connection = http.client.HTTPConnection("127.0.0.1", server, timeout=10)
+        connection.request("GET", path)
+        response = connection.getresponse()
+        assert response.status == 200
+        body = json.loads(response.read())
+        connection.close()
+    assert body["requests"] >= 1
@@ -4,95 +4,606 @@ Core transpiler module for converting ML models to C code.
 
 import joblib
 import numpy as np
+from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LinearRegression, LogisticRegression
 from sklearn.tree import DecisionTreeClassifier
+import hashlib
+import itertools
+import json
+import shutil
 import subprocess
+import tempfile
 import os
 
 
+# Code generation options. "linear" applies to linear and logistic
+# regression, "tree" to decision trees and forests. The "simd" linear
+# strategy replaces prediction_batch() with explicit SSE/AVX2/AVX-512
+# kernels selected at load time (see LINEAR_SIMD_KERNELS). "binning"
+# makes tree models compare small integer bin indices instead of floats.
+# "early_exit" lets forests stop once the remaining trees cannot change
+# the predicted class.
+DEFAULT_OPTIONS = {
+    "linear": "unrolled",
+    "tree": "nested_if",
+    "binning": False,
+    "early_exit": False,
+    "cflags": "-O2",
+}
+
+LINEAR_STRATEGIES = ("unrolled", "looped", "simd")
+TREE_STRATEGIES = ("nested_if", "table", "branchless")
+CFLAGS_CANDIDATES = ("-O2", "-O3", "-O3 -march=native")
+
+# Bumped whenever the generated tree code changes, so that objects cached by
+# build_incremental() from older code are rebuilt
+TREE_CODEGEN_VERSION = 2
+
+
 class ModelTranspiler:
     """Transpile scikit-learn models to C code."""
     
-    def __init__(self, model_path):
-        """Load model from joblib file."""
-        self.model = joblib.load(model_path)
+    def __init__(self, model_path, options=None):
+        """
+        Load model from joblib file.
+        
+        Code generation options start from DEFAULT_OPTIONS, then the
+        configuration persisted by autotune() next to the model (if any),
+        then the explicit options argument.
+        """
+        self._init_model(joblib.load(model_path), model_path, options)
+    
+    @classmethod
+    def from_model(cls, model, options=None):
+        """
+        Wrap an already loaded model (e.g. one loaded from MLflow).
+        
+        There is no model file, so no autotune() configuration is read
+        and autotune(save=True) does not persist one.
+        """
+        transpiler = cls.__new__(cls)
+        transpiler._init_model(model, None, options)
+        return transpiler
+    
+    def _init_model(self, model, model_path, options):
+        """Set the model and resolve code generation options."""
+        self.model = model
         self.model_type = type(self.model).__name__
+        self.model_path = model_path
+        self.config_path = None
+        if model_path is not None:
+            self.config_path = os.path.splitext(model_path)[0] + ".ml2c.json"
+        
+        self.options = dict(DEFAULT_OPTIONS)
+        if self.config_path and os.path.exists(self.config_path):
+            with open(self.config_path) as f:
+                self.options.update(json.load(f)["options"])
+        if options:
+            self.options.update(options)
+        self._check_options()
+    
+    def _check_options(self):
+        """Validate code generation options."""
+        if self.options["linear"] not in LINEAR_STRATEGIES:
+            raise ValueError(f"Unknown linear strategy: {self.options['linear']}")
+        if self.options["tree"] not in TREE_STRATEGIES:
+            raise ValueError(f"Unknown tree strategy: {self.options['tree']}")
     
     def generate_c_code(self, test_data=None):
         """Generate C code for the model."""
+        code = self._generate_model_code()
+        code += self._generate_main(test_data, self._n_features())
+        return code
+    
+    def generate_server_code(self, port=9000, host="127.0.0.1", unix_socket=None):
+        """
+        Generate C code for a standalone prediction server.
+        
+        The server wraps the generated prediction function in an epoll
+        loop listening on TCP (host:port) or on a Unix domain socket when
+        unix_socket is given. Both defaults can be overridden at runtime
+        with --host, --port and --unix.
+        """
+        code = self._generate_model_code()
+        code += self._generate_server_main(port, host, unix_socket)
+        return code
+    
+    def generate_library_code(self):
+        """
+        Generate C code for a shared library.
+        
+        Only the prediction functions are emitted (prediction() and
+        prediction_batch()), to be loaded in-process, e.g. with ctypes.
+        """
+        return self._generate_model_code()
+    
+    def _generate_server_main(self, port=9000, host="127.0.0.1", unix_socket=None):
+        """Generate the server defines and entry point."""
+        code = f'#define ML2C_DEFAULT_HOST "{host}"\n'
+        code += f"#define ML2C_DEFAULT_PORT {int(port)}\n"
+        if unix_socket:
+            code += f'#define ML2C_DEFAULT_UNIX "{unix_socket}"\n'
+        code += SERVER_MAIN
+        return code
+    
+    def _n_features(self):
+        """Number of input features expected by the model."""
+        if isinstance(self.model, (LinearRegression, LogisticRegression)):
+            return np.atleast_2d(self.model.coef_).shape[1]
+        return self.model.n_features_in_
+    
+    def _generate_model_code(self):
+        """Generate the prediction functions without an entry point."""
         if isinstance(self.model, LinearRegression):
-            return self._generate_linear_code(test_data)
+            code = self._generate_linear_code()
         elif isinstance(self.model, LogisticRegression):
-            return self._generate_logistic_code(test_data)
+            code = self._generate_logistic_code()
         elif isinstance(self.model, DecisionTreeClassifier):
-            return self._generate_tree_code(test_data)
+            code = self._generate_tree_code()
+        elif isinstance(self.model, RandomForestClassifier):
+            code = self._generate_forest_header()
+            for tree_hash, tree in self._unique_trees().items():
+                code += self._generate_forest_tree(tree_hash, tree)
+            code += self._generate_forest_prediction()
         else:
             raise ValueError(f"Model type {self.model_type} not supported")
+        
+        if self._uses_simd():
+            code += self._generate_simd_batch_code()
+        else:
+            code += self._generate_batch_code()
+        return code
     
-    def _generate_linear_code(self, test_data):
+    def _uses_simd(self):
+        """Whether prediction_batch() uses the explicit SIMD kernels."""
+        return (isinstance(self.model, (LinearRegression, LogisticRegression))
+                and self.options["linear"] == "simd")
+    
+    def _generate_header(self, includes=("stdio.h",)):
+        """Generate includes and the feature count define."""
+        code = "".join(f"#include <{name}>\n" for name in includes)
+        code += f"\n#define N_FEATURES {self._n_features()}\n\n"
+        return code
+    
+    def _generate_linear_code(self):
         """Generate C code for linear regression."""
         intercept = self.model.intercept_
         coef = self.model.coef_
-        n_features = len(coef)
         
-        code = "#include <stdio.h>\n\n"
+        code = self._generate_header()
+        code += self._generate_coef_table(coef)
         code += "float prediction(float *features, int n_features) {\n"
         code += f"    float result = {intercept:.10f}f;\n"
-        for i, c in enumerate(coef):
-            code += f"    result += {c:.10f}f * features[{i}];\n"
+        code += self._generate_dot_product("result", coef)
         code += "    return result;\n}\n\n"
-        code += self._generate_main(test_data, n_features)
         return code
     
-    def _generate_logistic_code(self, test_data):
+    def _generate_logistic_code(self):
         """Generate C code for logistic regression."""
         intercept = self.model.intercept_[0]
         coef = self.model.coef_[0]
-        n_features = len(coef)
         
-        code = "#include <stdio.h>\n#include <math.h>\n\n"
+        code = self._generate_header(("stdio.h", "math.h"))
         code += "float sigmoid(float x) {\n"
         code += "    return 1.0f / (1.0f + expf(-x));\n}\n\n"
+        code += self._generate_coef_table(coef)
         code += "float prediction(float *features, int n_features) {\n"
         code += f"    float z = {intercept:.10f}f;\n"
-        for i, c in enumerate(coef):
-            code += f"    z += {c:.10f}f * features[{i}];\n"
+        code += self._generate_dot_product("z", coef)
         code += "    return sigmoid(z);\n}\n\n"
-        code += self._generate_main(test_data, n_features)
         return code
     
-    def _generate_tree_code(self, test_data):
+    def _generate_coef_table(self, coef):
+        """Generate the coefficient array used by the looped and simd strategies."""
+        if self.options["linear"] == "unrolled":
+            return ""
+        values = ", ".join(f"{c:.10f}f" for c in coef)
+        return f"static const float coef[N_FEATURES] = {{{values}}};\n\n"
+    
+    def _generate_simd_batch_code(self):
+        """Generate the runtime-dispatched SIMD prediction_batch()."""
+        intercept = np.ravel(self.model.intercept_)[0]
+        code = f"#define ML2C_INTERCEPT {intercept:.10f}f\n"
+        if isinstance(self.model, LogisticRegression):
+            code += "#define ML2C_LOGISTIC 1\n"
+        code += LINEAR_SIMD_KERNELS
+        return code
+    
+    def _generate_dot_product(self, acc, coef):
+        """Accumulate coef . features into acc, unrolled or looped."""
+        if self.options["linear"] == "looped":
+            code = "    for (int i = 0; i < N_FEATURES; i++) {\n"
+            code += f"        {acc} += coef[i] * features[i];\n"
+            code += "    }\n"
+            return code
+        return "".join(f"    {acc} += {c:.10f}f * features[{i}];\n"
+                       for i, c in enumerate(coef))
+    
+    def _generate_tree_code(self):
         """Generate C code for decision tree."""
         tree = self.model.tree_
-        n_features = self.model.n_features_in_
         
-        code = "#include <stdio.h>\n\n"
+        code = self._generate_tree_header()
+        if not self.options["binning"]:
+            code += self._generate_tree_function(
+                "float prediction(float *features, int n_features)", tree, "dt")
+            return code
+        
+        code += self._generate_tree_function(
+            "static float predict_bins(const ml2c_bin_t *bins)", tree, "dt")
+        code += self._generate_bin_features()
         code += "float prediction(float *features, int n_features) {\n"
-        code += self._generate_tree_node(tree, 0, 1)
+        code += "    ml2c_bin_t bins[N_FEATURES];\n"
+        code += "    bin_features(features, bins);\n"
+        code += "    return predict_bins(bins);\n}\n\n"
+        return code
+    
+    def _generate_tree_header(self):
+        """Generate the header for tree models, with the bin type if binning."""
+        if not self.options["binning"]:
+            return self._generate_header()
+        code = self._generate_header(("stdio.h", "stdint.h", "math.h"))
+        code += f"typedef {self._bin_ctype()} ml2c_bin_t;\n\n"
+        return code
+    
+    def _trees(self):
+        """All fitted trees of the model."""
+        if isinstance(self.model, RandomForestClassifier):
+            return [e.tree_ for e in self.model.estimators_]
+        return [self.model.tree_]
+    
+    def _float32_thresholds(self, tree):
+        """
+        Node thresholds as the largest float32 not above the float64 value.
+        
+        For a float32 input x, x <= t holds exactly when x is at most this
+        value, so comparisons against it match scikit-learn. A literal of
+        the float64 value could round up to the next float32 instead.
+        """
+        cache = self.__dict__.setdefault("_float32_thresholds_cache", {})
+        if id(tree) not in cache:
+            t64 = tree.threshold
+            t32 = t64.astype(np.float32)
+            cache[id(tree)] = np.where(t32 > t64, np.nextafter(t32, np.float32(-np.inf)), t32)
+        return cache[id(tree)]
+    
+    def _bin_edges(self):
+        """
+        Per feature, the sorted distinct thresholds used by any tree.
+        
+        Binning an input counts the edges strictly below it, so the node
+        test x <= edges[k] becomes bin <= k.
+        """
+        if getattr(self, "_bin_edges_cache", None) is None:
+            edges = [set() for _ in range(self._n_features())]
+            for tree in self._trees():
+                internal = tree.children_left != tree.children_right
+                for f, t in zip(tree.feature[internal], self._float32_thresholds(tree)[internal]):
+                    edges[f].add(t)
+            self._bin_edges_cache = [np.array(sorted(e), dtype=np.float32) for e in edges]
+        return self._bin_edges_cache
+    
+    def _bin_search_top(self, n_edges):
+        """Largest power of two such that edges padded to 2 * top - 1 hold n_edges."""
+        top = 1
+        while 2 * top - 1 < n_edges:
+            top *= 2
+        return top
+    
+    def _bin_ctype(self):
+        """Smallest unsigned type holding every bin index (0..padded edges)."""
+        max_bin = max(2 * self._bin_search_top(len(e)) - 1 for e in self._bin_edges())
+        if max_bin < 256:
+            return "uint8_t"
+        if max_bin < 65536:
+            return "uint16_t"
+        return "uint32_t"
+    
+    def _node_bins(self, tree):
+        """Bin index compared at each node (0 for leaves)."""
+        cache = self.__dict__.setdefault("_node_bins_cache", {})
+        if id(tree) not in cache:
+            edges = self._bin_edges()
+            thresholds = self._float32_thresholds(tree)
+            bins = np.zeros(tree.node_count, dtype=np.int64)
+            for node in np.flatnonzero(tree.children_left != tree.children_right):
+                bins[node] = np.searchsorted(edges[tree.feature[node]], thresholds[node])
+            cache[id(tree)] = bins
+        return cache[id(tree)]
+    
+    def _generate_bin_features(self):
+        """
+        Generate bin_features(), mapping each used feature to its bin once.
+        
+        Edge arrays are padded with +inf to 2 * top - 1 entries so each
+        search is a fixed number of branch-free steps. The steps of all
+        features are interleaved so the independent searches overlap
+        instead of forming one long chain of dependent loads. A NaN input
+        lands past every real edge and takes the right branch everywhere,
+        as the float comparisons do.
+        """
+        used = [(f, self._bin_search_top(len(e)), e)
+                for f, e in enumerate(self._bin_edges()) if len(e)]
+        code = ""
+        for f, top, edges in used:
+            values = [f"{float(e)!r}f" for e in edges]
+            values += ["INFINITY"] * (2 * top - 1 - len(edges))
+            code += f"static const float bin_edges_{f}[{2 * top - 1}] = {{{', '.join(values)}}};\n"
+        code += "\nstatic void bin_features(const float *features, ml2c_bin_t *bins) {\n"
+        for f, top, edges in used:
+            code += f"    int lo_{f} = 0;\n"
+        step = max(top for _, top, _ in used) if used else 0
+        while step > 0:
+            for f, top, edges in used:
+                if top >= step:
+                    code += (f"    lo_{f} += !(features[{f}] <= bin_edges_{f}[lo_{f} + {step - 1}])"
+                             f" * {step};\n")
+            step //= 2
+        for f, top, edges in used:
+            code += f"    bins[{f}] = (ml2c_bin_t)lo_{f};\n"
         code += "}\n\n"
-        code += self._generate_main(test_data, n_features)
         return code
     
-    def _generate_tree_node(self, tree, node_id, indent):
-        """Recursively generate tree node code."""
+    def _generate_tree_function(self, signature, tree, prefix, forest=False):
+        """
+        Generate a tree traversal function with the configured strategy.
+        
+        nested_if emits one if/else per node. table walks node arrays until
+        it reaches a leaf. branchless walks the same arrays for a fixed
+        max_depth steps, with leaves pointing to themselves, so the only
+        branch is the loop counter.
+        
+        Single trees return their majority class; forest trees (forest=True)
+        add their class probabilities to proba.
+        
+        With binning, the function reads bins instead of features and node
+        tables use the smallest integer types that fit.
+        """
+        strategy = self.options["tree"]
+        binning = self.options["binning"]
+        if strategy == "nested_if":
+            leaf = self._forest_leaf(tree) if forest else None
+            return f"{signature} {{\n" + self._generate_tree_node(tree, 0, 1, leaf) + "}\n\n"
+        
+        is_leaf = tree.children_left == tree.children_right
+        feature = np.where(is_leaf, 0 if strategy == "branchless" else -1, tree.feature)
+        nodes = np.arange(tree.node_count)
+        left = np.where(is_leaf, nodes, tree.children_left)
+        right = np.where(is_leaf, nodes, tree.children_right)
+        
+        def table(ctype, name, values, fmt=str):
+            body = ", ".join(fmt(v) for v in values)
+            return f"static const {ctype} {prefix}_{name}[{len(values)}] = {{{body}}};\n"
+        
+        def index_ctype(max_value):
+            if not binning:
+                return "int"
+            return "int8_t" if max_value < 128 else "int16_t" if max_value < 32768 else "int"
+        
+        code = table(index_ctype(self._n_features()), "feature", feature)
+        if binning:
+            x = "bins"
+            code += table("ml2c_bin_t", "threshold", self._node_bins(tree))
+        else:
+            x = "features"
+            threshold = np.where(is_leaf, np.float32(0.0), self._float32_thresholds(tree))
+            code += table("float", "threshold", threshold, lambda v: f"{float(v)!r}f")
+        node_ctype = index_ctype(tree.node_count)
+        if strategy == "table":
+            code += table(node_ctype, "left", left)
+            code += table(node_ctype, "right", right)
+        else:
+            code += table(node_ctype, "children", np.column_stack([left, right]).ravel())
+        if forest:
+            proba = tree.value[:, 0, :] / tree.value[:, 0, :].sum(axis=1, keepdims=True)
+            code += table("double", "value", np.where(is_leaf[:, None], proba, 0.0).ravel(),
+                          lambda v: repr(float(v)))
+        else:
+            code += table("float", "value", np.argmax(tree.value[:, 0, :], axis=1),
+                          lambda v: f"{v}.0f")
+        
+        code += f"\n{signature} {{\n"
+        code += "    int node = 0;\n"
+        if strategy == "table":
+            code += f"    while ({prefix}_feature[node] >= 0) {{\n"
+            code += f"        node = {x}[{prefix}_feature[node]] <= {prefix}_threshold[node]\n"
+            code += f"            ? {prefix}_left[node] : {prefix}_right[node];\n"
+            code += "    }\n"
+        else:
+            code += f"    for (int depth = 0; depth < {tree.max_depth}; depth++) {{\n"
+            code += f"        int go_right = {x}[{prefix}_feature[node]] > {prefix}_threshold[node];\n"
+            code += f"        node = {prefix}_children[2 * node + go_right];\n"
+            code += "    }\n"
+        if forest:
+            code += "    for (int k = 0; k < N_CLASSES; k++) {\n"
+            code += f"        proba[k] += {prefix}_value[node * N_CLASSES + k];\n"
+            code += "    }\n"
+        else:
+            code += f"    return {prefix}_value[node];\n"
+        code += "}\n\n"
+        return code
+    
+    def _generate_forest_header(self):
+        """Generate includes and defines shared by the forest sources."""
+        code = self._generate_tree_header()
+        code += f"#define N_CLASSES {len(self.model.classes_)}\n"
+        code += f"#define N_TREES {len(self.model.estimators_)}\n"
+        if self.options["early_exit"]:
+            code += "#define ML2C_EARLY_EXIT 1\n"
+        code += "\n"
+        return code
+    
+    def _tree_hash(self, tree):
+        """
+        Content hash of a fitted tree, used to name and cache its code.
+        
+        The code generator version, tree strategy and compiler flags are
+        part of the hash so cached objects built otherwise are never reused. With binning the
+        tree's code depends on the bin indices it compares against, which
+        shift when other trees add thresholds, so those are hashed too.
+        """
+        h = hashlib.sha256()
+        for arr in (tree.feature, tree.threshold, tree.children_left,
+                    tree.children_right, tree.value):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        h.update(f"{TREE_CODEGEN_VERSION}|{self.options['tree']}|{self.options['cflags']}".encode())
+        if self.options["binning"]:
+            h.update(self._node_bins(tree).tobytes())
+            h.update(self._bin_ctype().encode())
+        return h.hexdigest()[:16]
+    
+    def _unique_trees(self):
+        """Map tree hash to tree for the forest, preserving first-seen order."""
+        trees = {}
+        for estimator in self.model.estimators_:
+            trees.setdefault(self._tree_hash(estimator.tree_), estimator.tree_)
+        return trees
+    
+    def _forest_leaf(self, tree):
+        """Leaf generator adding the leaf's class probabilities to proba."""
+        def leaf(node_id, indent_str):
+            value = tree.value[node_id][0]
+            value = value / value.sum()
+            return "".join(f"{indent_str}proba[{k}] += {float(v)!r};\n"
+                           for k, v in enumerate(value) if v > 0)
+        return leaf
+    
+    def _generate_forest_tree(self, tree_hash, tree):
+        """Generate a function adding one tree's class probabilities to proba."""
+        if self.options["binning"]:
+            signature = f"void ml2c_tree_{tree_hash}(const ml2c_bin_t *bins, double *proba)"
+        else:
+            signature = f"void ml2c_tree_{tree_hash}(const float *features, double *proba)"
+        return self._generate_tree_function(signature, tree, f"t_{tree_hash}", forest=True)
+    
+    def _tree_order(self):
+        """
+        Forest estimator indices, most decisive trees first.
+        
+        A tree's decisiveness is the sample-weighted mean of its leaves'
+        top class probability: trees with purer leaves move the vote margin
+        the most, so evaluating them first lets early exit trigger sooner.
+        """
+        scores = []
+        for estimator in self.model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == tree.children_right
+            value = tree.value[is_leaf, 0, :]
+            purity = value.max(axis=1) / value.sum(axis=1)
+            weights = tree.weighted_n_node_samples[is_leaf]
+            scores.append(np.average(purity, weights=weights))
+        return list(np.argsort(-np.array(scores), kind="stable"))
+    
+    def _generate_early_exit_check(self):
+        """Generate the counters and the vote margin test used by early exit."""
+        code = "unsigned long long ml2c_rows_evaluated = 0;\n"
+        code += "unsigned long long ml2c_trees_evaluated = 0;\n\n"
+        code += "double prediction_avg_trees(void) {\n"
+        code += "    return ml2c_rows_evaluated ? (double)ml2c_trees_evaluated / ml2c_rows_evaluated : 0.0;\n"
+        code += "}\n\n"
+        code += "/* Each tree adds probabilities summing to 1, so the runner-up can\n"
+        code += "   gain at most `remaining` on the leader. */\n"
+        code += "static int forest_decided(const double *proba, int remaining) {\n"
+        code += "    double top = proba[0], runner_up = 0.0;\n"
+        code += "    for (int k = 1; k < N_CLASSES; k++) {\n"
+        code += "        if (proba[k] > top) {\n"
+        code += "            runner_up = top;\n"
+        code += "            top = proba[k];\n"
+        code += "        } else if (proba[k] > runner_up) {\n"
+        code += "            runner_up = proba[k];\n"
+        code += "        }\n"
+        code += "    }\n"
+        code += "    return top - runner_up > remaining;\n"
+        code += "}\n\n"
+        return code
+    
+    def _generate_forest_prediction(self, declare_trees=False):
+        """
+        Generate the forest prediction function (soft voting, like sklearn).
+        
+        With early_exit, trees run in _tree_order() and the vote stops once
+        the margin between the top two classes exceeds the number of trees
+        left. The margin can grow by at most 1 per tree, so the check only
+        starts at the halfway point.
+        """
+        early_exit = self.options["early_exit"]
+        order = self._tree_order() if early_exit else range(len(self.model.estimators_))
+        hashes = [self._tree_hash(self.model.estimators_[i].tree_) for i in order]
+        x, x_type = ("bins", "ml2c_bin_t") if self.options["binning"] else ("features", "float")
+        code = ""
+        if declare_trees:
+            for tree_hash in dict.fromkeys(hashes):
+                code += f"void ml2c_tree_{tree_hash}(const {x_type} *{x}, double *proba);\n"
+            code += "\n"
+        if self.options["binning"]:
+            code += self._generate_bin_features()
+        if early_exit:
+            code += self._generate_early_exit_check()
+        classes = ", ".join(f"{float(c):.1f}f" for c in self.model.classes_)
+        code += f"static const float classes[N_CLASSES] = {{{classes}}};\n\n"
+        code += "float prediction(float *features, int n_features) {\n"
+        code += "    double proba[N_CLASSES] = {0};\n"
+        if self.options["binning"]:
+            code += "    ml2c_bin_t bins[N_FEATURES];\n"
+            code += "    bin_features(features, bins);\n"
+        if early_exit:
+            code += "    int evaluated = N_TREES;\n"
+        n_trees = len(hashes)
+        for i, tree_hash in enumerate(hashes):
+            code += f"    ml2c_tree_{tree_hash}({x}, proba);\n"
+            remaining = n_trees - i - 1
+            if early_exit and 0 < remaining < i + 1:
+                code += f"    if (forest_decided(proba, {remaining})) {{ evaluated = {i + 1}; goto vote; }}\n"
+        if early_exit:
+            code += "vote:\n"
+            code += "    ml2c_rows_evaluated++;\n"
+            code += "    ml2c_trees_evaluated += evaluated;\n"
+        code += "    int best = 0;\n"
+        code += "    for (int k = 1; k < N_CLASSES; k++) {\n"
+        code += "        if (proba[k] > proba[best]) best = k;\n"
+        code += "    }\n"
+        code += "    return classes[best];\n}\n\n"
+        return code
+    
+    def _generate_batch_code(self):
+        """Generate a row-major batch wrapper around prediction()."""
+        code = "void prediction_batch(const float *X, int n_rows, float *out) {\n"
+        code += "    for (int i = 0; i < n_rows; i++) {\n"
+        code += "        out[i] = prediction((float *)(X + (long)i * N_FEATURES), N_FEATURES);\n"
+        code += "    }\n}\n\n"
+        return code
+    
+    def _generate_tree_node(self, tree, node_id, indent, leaf=None):
+        """
+        Recursively generate tree node code.
+        
+        leaf(node_id, indent_str) returns the statements for a leaf; by
+        default a leaf returns its majority class.
+        """
         indent_str = "    " * indent
         
         if tree.children_left[node_id] == tree.children_right[node_id]:
             # Leaf node
+            if leaf is not None:
+                return leaf(node_id, indent_str)
             value = tree.value[node_id][0]
             predicted_class = np.argmax(value)
             return f"{indent_str}return {predicted_class}.0f;\n"
         
         # Decision node
         feature = tree.feature[node_id]
-        threshold = tree.threshold[node_id]
         left = tree.children_left[node_id]
         right = tree.children_right[node_id]
         
-        code = f"{indent_str}if (features[{feature}] <= {threshold:.10f}f) {{\n"
-        code += self._generate_tree_node(tree, left, indent + 1)
+        if self.options["binning"]:
+            condition = f"bins[{feature}] <= {self._node_bins(tree)[node_id]}"
+        else:
+            threshold = self._float32_thresholds(tree)[node_id]
+            condition = f"features[{feature}] <= {float(threshold)!r}f"
+        code = f"{indent_str}if ({condition}) {{\n"
+        code += self._generate_tree_node(tree, left, indent + 1, leaf)
         code += f"{indent_str}}} else {{\n"
-        code += self._generate_tree_node(tree, right, indent + 1)
+        code += self._generate_tree_node(tree, right, indent + 1, leaf)
         code += f"{indent_str}}}\n"
         return code
     
@@ -118,6 +629,9 @@ class ModelTranspiler:
         for idx in range(len(test_data)):
             code += f'    printf("  Test {idx}: %f\\n", pred_{idx});\n'
         
+        if isinstance(self.model, RandomForestClassifier) and self.options["early_exit"]:
+            code += '    printf("Average trees evaluated per row: %.2f\\n", prediction_avg_trees());\n'
+        
         code += "    return 0;\n}\n"
         return code
     
@@ -128,21 +642,228 @@ class ModelTranspiler:
             f.write(code)
         return output_file
     
+    def save_server(self, output_file, port=9000, host="127.0.0.1", unix_socket=None):
+        """Save generated prediction server C code to file."""
+        code = self.generate_server_code(port=port, host=host, unix_socket=unix_socket)
+        with open(output_file, 'w') as f:
+            f.write(code)
+        return output_file
+    
+    def save_library(self, output_file):
+        """Save shared library C code to file."""
+        code = self.generate_library_code()
+        with open(output_file, 'w') as f:
+            f.write(code)
+        return output_file
+    
     def compile(self, c_file, output_binary=None):
         """Compile C code to binary."""
         if output_binary is None:
             output_binary = c_file.replace('.c', '')
         
-        cmd = f"gcc -o {output_binary} {c_file} -lm"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        self._run_gcc(f"-o {output_binary} {c_file} -lm")
+        return output_binary
+    
+    def compile_shared(self, c_file, output_library=None):
+        """Compile library C code to a shared object (.so)."""
+        if output_library is None:
+            output_library = c_file.replace('.c', '.so')
+        
+        self._run_gcc(f"-shared -fPIC -o {output_library} {c_file} -lm")
+        return output_library
+    
+    def autotune(self, sample_X, batch_sizes=(1, 64, 1024), min_time_ms=50,
+                 candidates=None, save=True):
+        """
+        Pick the fastest code generation options for this model.
+        
+        Every candidate option set (by default all strategies applicable to
+        the model crossed with CFLAGS_CANDIDATES) is compiled into a
+        benchmark harness and timed on sample_X at each batch size.
+        Candidates whose outputs differ from the model's own (see
+        reference_output()) are rejected. The winner minimises the mean
+        time per row relative to the first candidate, becomes self.options,
+        and is written to self.config_path so later ModelTranspiler
+        instances reuse it.
+        
+        Returns a list of per-candidate results, fastest first. Raises
+        RuntimeError if no candidate matches the model.
+        """
+        sample_X = np.ascontiguousarray(np.atleast_2d(sample_X), dtype=np.float32)
+        if candidates is None:
+            candidates = self._autotune_candidates()
+        
+        results = []
+        workdir = tempfile.mkdtemp(prefix="ml2c_autotune_")
+        try:
+            sample_file = os.path.join(workdir, "sample.bin")
+            sample_X.tofile(sample_file)
+            for idx, candidate in enumerate(candidates):
+                options = dict(self.options, **candidate)
+                timings, outputs, avg_trees = self._benchmark_options(
+                    options, workdir, idx, sample_file, len(sample_X),
+                    batch_sizes, min_time_ms)
+                result = {"options": options, "ns_per_row": timings, "outputs": outputs}
+                if avg_trees is not None:
+                    result["avg_trees_per_row"] = avg_trees
+                results.append(result)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        
+        # Float32 arithmetic differs from scikit-learn's float64, so outputs
+        # are compared with a tolerance relative to the largest expected one.
+        # Class outputs differ by at least 1 when wrong, so they must match.
+        expected = self.reference_output(sample_X)
+        atol = 1e-5 * max(1.0, float(np.abs(expected).max()))
+        baseline = results[0]
+        for result in results:
+            result["matches"] = bool(np.allclose(
+                result["outputs"], expected, rtol=1e-4, atol=atol))
+            result["score"] = float(np.mean([
+                result["ns_per_row"][bs] / baseline["ns_per_row"][bs]
+                for bs in result["ns_per_row"]]))
+        for result in results:
+            del result["outputs"]
+        
+        valid = sorted((r for r in results if r["matches"]), key=lambda r: r["score"])
+        if not valid:
+            raise RuntimeError("No candidate matches the model's predictions")
+        self.options = dict(valid[0]["options"])
+        if save and self.config_path:
+            with open(self.config_path, 'w') as f:
+                json.dump({"options": self.options, "batch_sizes": list(batch_sizes),
+                           "results": valid}, f, indent=2)
+        return valid
+    
+    def reference_output(self, X):
+        """
+        What the generated prediction() should return for each row of X,
+        computed with scikit-learn: the regression value, the positive
+        class probability for logistic regression, the class index for a
+        decision tree and the class label for a forest.
+        """
+        X = np.atleast_2d(X)
+        if isinstance(self.model, LogisticRegression):
+            return self.model.predict_proba(X)[:, 1]
+        if isinstance(self.model, DecisionTreeClassifier):
+            return np.argmax(self.model.predict_proba(X), axis=1).astype(np.float64)
+        if isinstance(self.model, (LinearRegression, RandomForestClassifier)):
+            return np.asarray(self.model.predict(X), dtype=np.float64)
+        raise ValueError(f"Model type {self.model_type} not supported")
+    
+    def _autotune_candidates(self):
+        """All option combinations applicable to the loaded model."""
+        if isinstance(self.model, (LinearRegression, LogisticRegression)):
+            return [{"linear": strategy, "cflags": cflags}
+                    for strategy, cflags in itertools.product(LINEAR_STRATEGIES, CFLAGS_CANDIDATES)]
+        early_exit = (False, True) if isinstance(self.model, RandomForestClassifier) else (False,)
+        return [{"tree": strategy, "binning": binning, "early_exit": exit_early, "cflags": cflags}
+                for strategy, binning, exit_early, cflags in itertools.product(
+                    TREE_STRATEGIES, (False, True), early_exit, CFLAGS_CANDIDATES)]
+    
+    def _benchmark_options(self, options, workdir, idx, sample_file, n_rows,
+                           batch_sizes, min_time_ms):
+        """Compile and run the benchmark harness for one option set."""
+        saved = self.options
+        self.options = options
+        try:
+            self._check_options()
+            c_file = os.path.join(workdir, f"candidate_{idx}.c")
+            with open(c_file, 'w') as f:
+                f.write(self._generate_model_code() + BENCHMARK_MAIN)
+            binary = self.compile(c_file)
+        finally:
+            self.options = saved
+        
+        out_file = os.path.join(workdir, f"candidate_{idx}.out")
+        cmd = [binary, sample_file, str(n_rows), out_file, str(min_time_ms)]
+        cmd += [str(bs) for bs in batch_sizes]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        
+        timings = {}
+        avg_trees = None
+        for line in result.stdout.split("\n"):
+            if line.strip():
+                bs, value = line.split()
+                if bs == "avg_trees":
+                    avg_trees = float(value)
+                else:
+                    timings[int(bs)] = float(value)
+        outputs = np.fromfile(out_file, dtype=np.float32)
+        return timings, outputs, avg_trees
+    
+    def build_incremental(self, output_binary, cache_dir=None, test_data=None,
+                          target="cli", **server_options):
+        """
+        Build a forest binary, compiling one cached object file per tree.
+        
+        Each tree is compiled to <cache_dir>/tree_<hash>.o, named after a
+        hash of the fitted tree, so after a warm_start retrain or a partial
+        tree swap only new or changed trees are compiled before relinking.
+        Non-forest models are built with save() and compile().
+        
+        Returns the binary path; counts are stored in self.build_stats.
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(output_binary) or ".", ".ml2c_cache")
+        os.makedirs(cache_dir, exist_ok=True)
         
-        if result.returncode == 0:
-            return output_binary
+        if not isinstance(self.model, RandomForestClassifier):
+            c_file = os.path.join(cache_dir, os.path.basename(output_binary) + ".c")
+            if target == "server":
+                self.save_server(c_file, **server_options)
+            else:
+                self.save(c_file, test_data)
+            self.build_stats = {"trees": 0, "compiled": 0, "cached": 0}
+            return self.compile(c_file, output_binary)
+        
+        header = self._generate_forest_header()
+        objects = []
+        compiled = 0
+        for tree_hash, tree in self._unique_trees().items():
+            obj_file = os.path.join(cache_dir, f"tree_{tree_hash}.o")
+            objects.append(obj_file)
+            if os.path.exists(obj_file):
+                continue
+            src_file = os.path.join(cache_dir, f"tree_{tree_hash}.c")
+            with open(src_file, 'w') as f:
+                f.write(header + self._generate_forest_tree(tree_hash, tree))
+            # Compile to a temporary name so an interrupted build never
+            # leaves a truncated object in the cache.
+            tmp_obj = f"{obj_file}.{os.getpid()}.tmp"
+            self._run_gcc(f"-c -o {tmp_obj} {src_file}")
+            os.replace(tmp_obj, obj_file)
+            compiled += 1
+        
+        forest_file = os.path.join(cache_dir, os.path.basename(output_binary) + ".c")
+        code = header + self._generate_forest_prediction(declare_trees=True)
+        code += self._generate_batch_code()
+        if target == "server":
+            code += self._generate_server_main(**server_options)
         else:
+            code += self._generate_main(test_data, self._n_features())
+        with open(forest_file, 'w') as f:
+            f.write(code)
+        
+        self._run_gcc(f"-o {output_binary} {forest_file} {' '.join(objects)} -lm")
+        self.build_stats = {
+            "trees": len(objects),
+            "compiled": compiled,
+            "cached": len(objects) - compiled,
+        }
+        return output_binary
+    
+    def _run_gcc(self, args):
+        """Run gcc with the given arguments, raising on failure."""
+        cmd = f"gcc {self.options['cflags']} {args}"
+        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        
+        if result.returncode != 0:
             raise RuntimeError(f"Compilation failed: {result.stderr}")
 
 
-def transpile_model(model_path, output_file=None, compile_code=True, test_data=None):
+def transpile_model(model_path, output_file=None, compile_code=True, test_data=None,
+                    target="cli"):
     """
     Quick function to transpile a model.
     
@@ -151,6 +872,7 @@ def transpile_model(model_path, output_file=None, compile_code=True, test_data=N
         output_file: Output C file (default: auto-generated)
         compile_code: Whether to compile the C code
         test_data: Optional test data array
+        target: "cli" for a test program, "server" for a prediction server
     
     Returns:
         tuple: (c_file, binary_file or None)
@@ -159,9 +881,15 @@ def transpile_model(model_path, output_file=None, compile_code=True, test_data=N
     
     if output_file is None:
         base = os.path.splitext(os.path.basename(model_path))[0]
-        output_file = f"{base}_inference.c"
+        suffix = "server" if target == "server" else "inference"
+        output_file = f"{base}_{suffix}.c"
     
-    c_file = transpiler.save(output_file, test_data)
+    if target == "server":
+        c_file = transpiler.save_server(output_file)
+    elif target == "cli":
+        c_file = transpiler.save(output_file, test_data)
+    else:
+        raise ValueError(f"Unknown target: {target}")
     binary_file = None
     
     if compile_code:
@@ -172,3 +900,692 @@ def transpile_model(model_path, output_file=None, compile_code=True, test_data=N
     
     return c_file, binary_file
 
+
+# C entry point appended by ModelTranspiler.generate_server_code().
+# Expects prediction_batch(), N_FEATURES and the ML2C_DEFAULT_* defines.
+SERVER_MAIN = r"""
+/* ------------------------------------------------------------------ */
+/* Standalone prediction server (generated by ml2c)                    */
+/*                                                                    */
+/* Binary protocol: each request is a little-endian uint32 byte count */
+/* followed by that many bytes of row-major float32 features (a        */
+/* multiple of N_FEATURES floats). The reply uses the same framing     */
+/* and carries one float32 prediction per row. Malformed frames close  */
+/* the connection. Requests may be pipelined on one connection.        */
+/*                                                                    */
+/* HTTP: POST /predict with a JSON body such as                        */
+/* {"features": [[...], [...]]} returns {"predictions": [...]}.        */
+/* GET /stats returns the request counters, GET /health liveness.      */
+/*                                                                    */
+/* The protocol is chosen per connection from its first bytes: "POST"  */
+/* and "GET " read as a uint32 are larger than ML2C_MAX_FRAME_BYTES,   */
+/* so they can never start a valid binary frame.                       */
+/* ------------------------------------------------------------------ */
+
+#include <errno.h>
+#include <fcntl.h>
+#include <signal.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <strings.h>
+#include <unistd.h>
+#include <arpa/inet.h>
+#include <netinet/in.h>
+#include <netinet/tcp.h>
+#include <sys/epoll.h>
+#include <sys/socket.h>
+#include <sys/un.h>
+
+#define ML2C_MAX_EVENTS 64
+#define ML2C_READ_CHUNK 65536
+#define ML2C_MAX_FRAME_BYTES (64u << 20)
+
+enum { PROTO_UNKNOWN, PROTO_BINARY, PROTO_HTTP };
+
+typedef struct {
+    int fd;
+    int proto;
+    int close_after_write;
+    char *in;
+    size_t in_len, in_cap;
+    char *out;
+    size_t out_len, out_off, out_cap;
+} ml2c_conn;
+
+static int epoll_fd;
+static unsigned long long stat_requests = 0;
+static unsigned long long stat_rows = 0;
+static unsigned long long stat_errors = 0;
+static unsigned long long stat_connections = 0;
+static float *scratch_in = NULL;
+static size_t scratch_in_cap = 0;
+static float *scratch_out = NULL;
+static size_t scratch_out_cap = 0;
+
+static int reserve(char **buf, size_t *cap, size_t need) {
+    if (need <= *cap) return 0;
+    size_t new_cap = *cap ? *cap : 4096;
+    while (new_cap < need) new_cap *= 2;
+    char *p = realloc(*buf, new_cap);
+    if (!p) return -1;
+    *buf = p;
+    *cap = new_cap;
+    return 0;
+}
+
+static float *scratch(float **buf, size_t *cap, size_t n) {
+    if (n > *cap) {
+        size_t new_cap = *cap * 2 > n ? *cap * 2 : n;
+        float *p = realloc(*buf, new_cap * sizeof(float));
+        if (!p) return NULL;
+        *buf = p;
+        *cap = new_cap;
+    }
+    return *buf;
+}
+
+static void conn_close(ml2c_conn *c) {
+    epoll_ctl(epoll_fd, EPOLL_CTL_DEL, c->fd, NULL);
+    close(c->fd);
+    free(c->in);
+    free(c->out);
+    free(c);
+}
+
+static int conn_append(ml2c_conn *c, const void *data, size_t len) {
+    if (reserve(&c->out, &c->out_cap, c->out_len + len) < 0) return -1;
+    memcpy(c->out + c->out_len, data, len);
+    c->out_len += len;
+    return 0;
+}
+
+/* Write as much pending output as the socket accepts. Returns -1 when
+   the connection must be closed. */
+static int conn_flush(ml2c_conn *c) {
+    while (c->out_off < c->out_len) {
+        ssize_t n = write(c->fd, c->out + c->out_off, c->out_len - c->out_off);
+        if (n < 0) {
+            if (errno == EINTR) continue;
+            if (errno == EAGAIN || errno == EWOULDBLOCK) break;
+            return -1;
+        }
+        c->out_off += (size_t)n;
+    }
+    struct epoll_event ev = {0};
+    ev.data.ptr = c;
+    if (c->out_off == c->out_len) {
+        c->out_off = c->out_len = 0;
+        if (c->close_after_write) return -1;
+        ev.events = EPOLLIN;
+    } else {
+        ev.events = EPOLLIN | EPOLLOUT;
+    }
+    epoll_ctl(epoll_fd, EPOLL_CTL_MOD, c->fd, &ev);
+    return 0;
+}
+
+/* Returns bytes consumed, 0 if the frame is incomplete, -1 on error. */
+static long handle_binary(ml2c_conn *c, const char *buf, size_t len) {
+    uint32_t n_bytes;
+    if (len < 4) return 0;
+    memcpy(&n_bytes, buf, 4);
+    if (n_bytes > ML2C_MAX_FRAME_BYTES || n_bytes % (4 * N_FEATURES) != 0) {
+        stat_errors++;
+        return -1;
+    }
+    if (len < 4 + (size_t)n_bytes) return 0;
+
+    int n_rows = (int)(n_bytes / (4 * N_FEATURES));
+    float *out = scratch(&scratch_out, &scratch_out_cap, n_rows + 1);
+    if (!out) return -1;
+    /* Frames are multiples of 4 bytes and the buffer is compacted to
+       offset 0, so the payload is always float aligned. */
+    prediction_batch((const float *)(buf + 4), n_rows, out);
+
+    uint32_t out_bytes = (uint32_t)n_rows * 4;
+    if (conn_append(c, &out_bytes, 4) < 0 || conn_append(c, out, out_bytes) < 0)
+        return -1;
+    stat_requests++;
+    stat_rows += (unsigned long long)n_rows;
+    return 4 + (long)n_bytes;
+}
+
+static int line_has(const char *line, const char *eol, const char *word) {
+    size_t n = strlen(word);
+    for (const char *p = line; p + n <= eol; p++)
+        if (strncasecmp(p, word, n) == 0) return 1;
+    return 0;
+}
+
+static int http_reply(ml2c_conn *c, const char *status, const char *body, size_t body_len) {
+    char header[256];
+    int n = snprintf(header, sizeof(header),
+                     "HTTP/1.1 %s\r\nContent-Type: application/json\r\n"
+                     "Content-Length: %zu\r\n%s\r\n",
+                     status, body_len,
+                     c->close_after_write ? "Connection: close\r\n" : "");
+    if (conn_append(c, header, (size_t)n) < 0) return -1;
+    return conn_append(c, body, body_len);
+}
+
+/* Parse every number in a JSON body, skipping strings and punctuation. */
+static long parse_json_floats(char *p, char *end) {
+    size_t n = 0;
+    char saved = *end;
+    *end = '\0';
+    while (p < end) {
+        if (*p == '"') {
+            for (p++; p < end && *p != '"'; p++)
+                if (*p == '\\' && p + 1 < end) p++;
+            p++;
+        } else if ((*p >= '0' && *p <= '9') || *p == '-' || *p == '+' || *p == '.') {
+            char *next;
+            float v = strtof(p, &next);
+            if (next == p) { *end = saved; return -1; }
+            float *vals = scratch(&scratch_in, &scratch_in_cap, n + 1);
+            if (!vals) { *end = saved; return -1; }
+            vals[n++] = v;
+            p = next;
+        } else {
+            p++;
+        }
+    }
+    *end = saved;
+    return (long)n;
+}
+
+static int http_predict(ml2c_conn *c, char *body, size_t body_len) {
+    long n_values = parse_json_floats(body, body + body_len);
+    if (n_values <= 0 || n_values % N_FEATURES != 0) {
+        static const char err[] = "{\"detail\": \"expected a multiple of N_FEATURES numbers\"}";
+        stat_errors++;
+        return http_reply(c, "400 Bad Request", err, sizeof(err) - 1);
+    }
+    int n_rows = (int)(n_values / N_FEATURES);
+    float *out = scratch(&scratch_out, &scratch_out_cap, n_rows);
+    if (!out) return -1;
+    prediction_batch(scratch_in, n_rows, out);
+
+    size_t cap = 32 + (size_t)n_rows * 24, len = 0;
+    char *json = malloc(cap);
+    if (!json) return -1;
+    len += (size_t)snprintf(json + len, cap - len, "{\"predictions\": [");
+    for (int i = 0; i < n_rows; i++)
+        len += (size_t)snprintf(json + len, cap - len, "%s%.9g", i ? ", " : "", out[i]);
+    len += (size_t)snprintf(json + len, cap - len, "]}");
+    int rc = http_reply(c, "200 OK", json, len);
+    free(json);
+    stat_requests++;
+    stat_rows += (unsigned long long)n_rows;
+    return rc;
+}
+
+/* Returns bytes consumed, 0 if the request is incomplete, -1 on error. */
+static long handle_http(ml2c_conn *c, char *buf, size_t len) {
+    char *header_end = NULL;
+    for (size_t i = 3; i < len; i++) {
+        if (buf[i - 3] == '\r' && buf[i - 2] == '\n' && buf[i - 1] == '\r' && buf[i] == '\n') {
+            header_end = buf + i + 1;
+            break;
+        }
+    }
+    if (!header_end) return len > 8192 ? -1 : 0;
+
+    size_t content_length = 0;
+    int close_requested = 0;
+    for (char *line = buf; line < header_end; ) {
+        char *eol = memchr(line, '\n', (size_t)(header_end - line));
+        if (!eol) break;
+        if (line == buf && line_has(line, eol, "HTTP/1.0"))
+            close_requested = 1;
+        else if (strncasecmp(line, "Content-Length:", 15) == 0)
+            content_length = strtoul(line + 15, NULL, 10);
+        else if (strncasecmp(line, "Connection:", 11) == 0 && line_has(line, eol, "close"))
+            close_requested = 1;
+        line = eol + 1;
+    }
+    if (content_length > ML2C_MAX_FRAME_BYTES) return -1;
+    size_t header_len = (size_t)(header_end - buf);
+    if (len < header_len + content_length) return 0;
+    c->close_after_write = close_requested;
+
+    char *body = header_end;
+    int rc;
+    if (strncmp(buf, "POST /predict ", 14) == 0) {
+        rc = http_predict(c, body, content_length);
+    } else if (strncmp(buf, "GET /stats ", 11) == 0) {
+        char json[256];
+        int n = snprintf(json, sizeof(json),
+                         "{\"requests\": %llu, \"rows\": %llu, \"errors\": %llu, \"connections\": %llu"
+#ifdef ML2C_EARLY_EXIT
+                         ", \"avg_trees_per_row\": %.3f"
+#endif
+                         "}",
+                         stat_requests, stat_rows, stat_errors, stat_connections
+#ifdef ML2C_EARLY_EXIT
+                         , prediction_avg_trees()
+#endif
+                         );
+        rc = http_reply(c, "200 OK", json, (size_t)n);
+    } else if (strncmp(buf, "GET /health ", 12) == 0) {
+        static const char ok[] = "{\"status\": \"healthy\"}";
+        rc = http_reply(c, "200 OK", ok, sizeof(ok) - 1);
+    } else {
+        static const char missing[] = "{\"detail\": \"Not Found\"}";
+        rc = http_reply(c, "404 Not Found", missing, sizeof(missing) - 1);
+    }
+    return rc < 0 ? -1 : (long)(header_len + content_length);
+}
+
+static void conn_read(ml2c_conn *c) {
+    if (reserve(&c->in, &c->in_cap, c->in_len + ML2C_READ_CHUNK + 1) < 0) {
+        conn_close(c);
+        return;
+    }
+    ssize_t n = read(c->fd, c->in + c->in_len, ML2C_READ_CHUNK);
+    if (n == 0 || (n < 0 && errno != EAGAIN && errno != EINTR)) {
+        conn_close(c);
+        return;
+    }
+    if (n < 0) return;
+    c->in_len += (size_t)n;
+    c->in[c->in_len] = '\0';
+
+    if (c->proto == PROTO_UNKNOWN && c->in_len >= 4) {
+        if (memcmp(c->in, "POST", 4) == 0 || memcmp(c->in, "GET ", 4) == 0)
+            c->proto = PROTO_HTTP;
+        else
+            c->proto = PROTO_BINARY;
+    }
+
+    size_t pos = 0;
+    while (c->proto != PROTO_UNKNOWN && pos < c->in_len && !c->close_after_write) {
+        long used = c->proto == PROTO_BINARY
+            ? handle_binary(c, c->in + pos, c->in_len - pos)
+            : handle_http(c, c->in + pos, c->in_len - pos);
+        if (used < 0) {
+            conn_close(c);
+            return;
+        }
+        if (used == 0) break;
+        pos += (size_t)used;
+    }
+    if (pos > 0) {
+        memmove(c->in, c->in + pos, c->in_len - pos);
+        c->in_len -= pos;
+    }
+    if (c->out_len > 0 && conn_flush(c) < 0)
+        conn_close(c);
+}
+
+static int open_listener(const char *host, int port, const char *unix_path) {
+    int fd;
+    if (unix_path) {
+        struct sockaddr_un addr = {0};
+        addr.sun_family = AF_UNIX;
+        strncpy(addr.sun_path, unix_path, sizeof(addr.sun_path) - 1);
+        unlink(unix_path);
+        fd = socket(AF_UNIX, SOCK_STREAM, 0);
+        if (fd < 0 || bind(fd, (struct sockaddr *)&addr, sizeof(addr)) < 0) return -1;
+    } else {
+        struct sockaddr_in addr = {0};
+        int one = 1;
+        addr.sin_family = AF_INET;
+        addr.sin_port = htons((uint16_t)port);
+        if (inet_pton(AF_INET, host, &addr.sin_addr) != 1) return -1;
+        fd = socket(AF_INET, SOCK_STREAM, 0);
+        if (fd < 0) return -1;
+        setsockopt(fd, SOL_SOCKET, SO_REUSEADDR, &one, sizeof(one));
+        if (bind(fd, (struct sockaddr *)&addr, sizeof(addr)) < 0) return -1;
+    }
+    if (listen(fd, 1024) < 0) return -1;
+    fcntl(fd, F_SETFL, fcntl(fd, F_GETFL) | O_NONBLOCK);
+    return fd;
+}
+
+int main(int argc, char **argv) {
+    const char *host = ML2C_DEFAULT_HOST;
+    int port = ML2C_DEFAULT_PORT;
+#ifdef ML2C_DEFAULT_UNIX
+    const char *unix_path = ML2C_DEFAULT_UNIX;
+#else
+    const char *unix_path = NULL;
+#endif
+    for (int i = 1; i + 1 < argc; i += 2) {
+        if (strcmp(argv[i], "--host") == 0) { host = argv[i + 1]; unix_path = NULL; }
+        else if (strcmp(argv[i], "--port") == 0) { port = atoi(argv[i + 1]); unix_path = NULL; }
+        else if (strcmp(argv[i], "--unix") == 0) unix_path = argv[i + 1];
+    }
+
+    signal(SIGPIPE, SIG_IGN);
+    int listen_fd = open_listener(host, port, unix_path);
+    if (listen_fd < 0) {
+        perror("ml2c server: listen");
+        return 1;
+    }
+    epoll_fd = epoll_create1(0);
+    struct epoll_event ev = {0}, events[ML2C_MAX_EVENTS];
+    ev.events = EPOLLIN;
+    ev.data.ptr = NULL;
+    epoll_ctl(epoll_fd, EPOLL_CTL_ADD, listen_fd, &ev);
+
+    if (unix_path)
+        fprintf(stderr, "ml2c server listening on unix:%s\n", unix_path);
+    else
+        fprintf(stderr, "ml2c server listening on %s:%d\n", host, port);
+
+    for (;;) {
+        int n = epoll_wait(epoll_fd, events, ML2C_MAX_EVENTS, -1);
+        for (int i = 0; i < n; i++) {
+            ml2c_conn *c = events[i].data.ptr;
+            if (c == NULL) {
+                int fd;
+                while ((fd = accept(listen_fd, NULL, NULL)) >= 0) {
+                    int one = 1;
+                    fcntl(fd, F_SETFL, fcntl(fd, F_GETFL) | O_NONBLOCK);
+                    if (!unix_path)
+                        setsockopt(fd, IPPROTO_TCP, TCP_NODELAY, &one, sizeof(one));
+                    ml2c_conn *nc = calloc(1, sizeof(*nc));
+                    if (!nc) { close(fd); continue; }
+                    nc->fd = fd;
+                    struct epoll_event cev = {0};
+                    cev.events = EPOLLIN;
+                    cev.data.ptr = nc;
+                    epoll_ctl(epoll_fd, EPOLL_CTL_ADD, fd, &cev);
+                    stat_connections++;
+                }
+                continue;
+            }
+            if (events[i].events & (EPOLLERR | EPOLLHUP) && !(events[i].events & EPOLLIN)) {
+                conn_close(c);
+            } else if (events[i].events & EPOLLIN) {
+                conn_read(c);
+            } else if (events[i].events & EPOLLOUT) {
+                if (conn_flush(c) < 0) conn_close(c);
+            }
+        }
+    }
+    return 0;
+}
+"""
+
+
+# Batch kernels for the "simd" linear strategy, appended after prediction().
+LINEAR_SIMD_KERNELS = r"""
+/* Batch kernels for linear models: scalar, SSE4.1, AVX2+FMA and AVX-512.
+   Expects coef[N_FEATURES], ML2C_INTERCEPT and, for logistic regression,
+   ML2C_LOGISTIC. The variant is chosen once at load time from the CPU
+   features; ML2C_ISA=scalar|sse|avx2|avx512 forces a supported variant. */
+
+#include <stdlib.h>
+#include <string.h>
+#if defined(__x86_64__) || defined(__i386__)
+#include <immintrin.h>
+#define ML2C_X86 1
+#endif
+
+typedef void (*ml2c_batch_fn)(const float *X, int n_rows, float *out);
+
+static void batch_scalar(const float *X, int n_rows, float *out) {
+    for (int i = 0; i < n_rows; i++) {
+        const float *row = X + (long)i * N_FEATURES;
+        float acc = ML2C_INTERCEPT;
+        for (int j = 0; j < N_FEATURES; j++) acc += coef[j] * row[j];
+#ifdef ML2C_LOGISTIC
+        acc = 1.0f / (1.0f + expf(-acc));
+#endif
+        out[i] = acc;
+    }
+}
+
+#ifdef ML2C_X86
+
+/* exp(x) for the sigmoid: Cephes-style range reduction to x = n ln2 + r
+   followed by a degree-5 polynomial, accurate to about 2 ulp. */
+#define ML2C_EXP_HI 88.3762626647949f
+#define ML2C_EXP_LO -88.3762626647949f
+#define ML2C_LOG2E 1.44269504088896341f
+#define ML2C_LN2_HI 0.693359375f
+#define ML2C_LN2_LO -2.12194440e-4f
+#define ML2C_P0 1.9875691500e-4f
+#define ML2C_P1 1.3981999507e-3f
+#define ML2C_P2 8.3334519073e-3f
+#define ML2C_P3 4.1665795894e-2f
+#define ML2C_P4 1.6666665459e-1f
+#define ML2C_P5 5.0000001201e-1f
+
+__attribute__((target("sse4.1")))
+static __m128 exp_sse(__m128 x) {
+    x = _mm_min_ps(_mm_max_ps(x, _mm_set1_ps(ML2C_EXP_LO)), _mm_set1_ps(ML2C_EXP_HI));
+    __m128 fx = _mm_floor_ps(_mm_add_ps(_mm_mul_ps(x, _mm_set1_ps(ML2C_LOG2E)), _mm_set1_ps(0.5f)));
+    x = _mm_sub_ps(x, _mm_mul_ps(fx, _mm_set1_ps(ML2C_LN2_HI)));
+    x = _mm_sub_ps(x, _mm_mul_ps(fx, _mm_set1_ps(ML2C_LN2_LO)));
+    __m128 y = _mm_set1_ps(ML2C_P0);
+    y = _mm_add_ps(_mm_mul_ps(y, x), _mm_set1_ps(ML2C_P1));
+    y = _mm_add_ps(_mm_mul_ps(y, x), _mm_set1_ps(ML2C_P2));
+    y = _mm_add_ps(_mm_mul_ps(y, x), _mm_set1_ps(ML2C_P3));
+    y = _mm_add_ps(_mm_mul_ps(y, x), _mm_set1_ps(ML2C_P4));
+    y = _mm_add_ps(_mm_mul_ps(y, x), _mm_set1_ps(ML2C_P5));
+    y = _mm_add_ps(_mm_add_ps(_mm_mul_ps(y, _mm_mul_ps(x, x)), x), _mm_set1_ps(1.0f));
+    __m128i n = _mm_slli_epi32(_mm_add_epi32(_mm_cvttps_epi32(fx), _mm_set1_epi32(127)), 23);
+    return _mm_mul_ps(y, _mm_castsi128_ps(n));
+}
+
+__attribute__((target("sse4.1")))
+static void batch_sse(const float *X, int n_rows, float *out) {
+    for (int i = 0; i < n_rows; i++) {
+        const float *row = X + (long)i * N_FEATURES;
+        __m128 acc = _mm_setzero_ps();
+        int j = 0;
+        for (; j + 4 <= N_FEATURES; j += 4)
+            acc = _mm_add_ps(acc, _mm_mul_ps(_mm_loadu_ps(coef + j), _mm_loadu_ps(row + j)));
+        acc = _mm_add_ps(acc, _mm_movehl_ps(acc, acc));
+        acc = _mm_add_ss(acc, _mm_shuffle_ps(acc, acc, 1));
+        float sum = ML2C_INTERCEPT + _mm_cvtss_f32(acc);
+        for (; j < N_FEATURES; j++) sum += coef[j] * row[j];
+        out[i] = sum;
+    }
+#ifdef ML2C_LOGISTIC
+    int i = 0;
+    for (; i + 4 <= n_rows; i += 4) {
+        __m128 e = exp_sse(_mm_sub_ps(_mm_setzero_ps(), _mm_loadu_ps(out + i)));
+        _mm_storeu_ps(out + i, _mm_div_ps(_mm_set1_ps(1.0f), _mm_add_ps(_mm_set1_ps(1.0f), e)));
+    }
+    for (; i < n_rows; i++) out[i] = 1.0f / (1.0f + expf(-out[i]));
+#endif
+}
+
+__attribute__((target("avx2,fma")))
+static __m256 exp_avx2(__m256 x) {
+    x = _mm256_min_ps(_mm256_max_ps(x, _mm256_set1_ps(ML2C_EXP_LO)), _mm256_set1_ps(ML2C_EXP_HI));
+    __m256 fx = _mm256_floor_ps(_mm256_fmadd_ps(x, _mm256_set1_ps(ML2C_LOG2E), _mm256_set1_ps(0.5f)));
+    x = _mm256_fnmadd_ps(fx, _mm256_set1_ps(ML2C_LN2_HI), x);
+    x = _mm256_fnmadd_ps(fx, _mm256_set1_ps(ML2C_LN2_LO), x);
+    __m256 y = _mm256_set1_ps(ML2C_P0);
+    y = _mm256_fmadd_ps(y, x, _mm256_set1_ps(ML2C_P1));
+    y = _mm256_fmadd_ps(y, x, _mm256_set1_ps(ML2C_P2));
+    y = _mm256_fmadd_ps(y, x, _mm256_set1_ps(ML2C_P3));
+    y = _mm256_fmadd_ps(y, x, _mm256_set1_ps(ML2C_P4));
+    y = _mm256_fmadd_ps(y, x, _mm256_set1_ps(ML2C_P5));
+    y = _mm256_add_ps(_mm256_fmadd_ps(y, _mm256_mul_ps(x, x), x), _mm256_set1_ps(1.0f));
+    __m256i n = _mm256_slli_epi32(_mm256_add_epi32(_mm256_cvttps_epi32(fx), _mm256_set1_epi32(127)), 23);
+    return _mm256_mul_ps(y, _mm256_castsi256_ps(n));
+}
+
+__attribute__((target("avx2,fma")))
+static void batch_avx2(const float *X, int n_rows, float *out) {
+    /* Mask selecting the N_FEATURES % 8 tail lanes. */
+    int tail_mask[8];
+    for (int k = 0; k < 8; k++) tail_mask[k] = k < N_FEATURES % 8 ? -1 : 0;
+    __m256i tail = _mm256_loadu_si256((const __m256i *)tail_mask);
+    for (int i = 0; i < n_rows; i++) {
+        const float *row = X + (long)i * N_FEATURES;
+        __m256 acc = _mm256_setzero_ps();
+        int j = 0;
+        for (; j + 8 <= N_FEATURES; j += 8)
+            acc = _mm256_fmadd_ps(_mm256_loadu_ps(coef + j), _mm256_loadu_ps(row + j), acc);
+        if (N_FEATURES % 8)
+            acc = _mm256_fmadd_ps(_mm256_maskload_ps(coef + j, tail), _mm256_maskload_ps(row + j, tail), acc);
+        __m128 s = _mm_add_ps(_mm256_castps256_ps128(acc), _mm256_extractf128_ps(acc, 1));
+        s = _mm_add_ps(s, _mm_movehl_ps(s, s));
+        s = _mm_add_ss(s, _mm_shuffle_ps(s, s, 1));
+        out[i] = ML2C_INTERCEPT + _mm_cvtss_f32(s);
+    }
+#ifdef ML2C_LOGISTIC
+    int i = 0;
+    for (; i + 8 <= n_rows; i += 8) {
+        __m256 e = exp_avx2(_mm256_sub_ps(_mm256_setzero_ps(), _mm256_loadu_ps(out + i)));
+        _mm256_storeu_ps(out + i, _mm256_div_ps(_mm256_set1_ps(1.0f), _mm256_add_ps(_mm256_set1_ps(1.0f), e)));
+    }
+    for (; i < n_rows; i++) out[i] = 1.0f / (1.0f + expf(-out[i]));
+#endif
+}
+
+__attribute__((target("avx512f")))
+static __m512 exp_avx512(__m512 x) {
+    x = _mm512_min_ps(_mm512_max_ps(x, _mm512_set1_ps(ML2C_EXP_LO)), _mm512_set1_ps(ML2C_EXP_HI));
+    __m512 fx = _mm512_roundscale_ps(_mm512_fmadd_ps(x, _mm512_set1_ps(ML2C_LOG2E), _mm512_set1_ps(0.5f)),
+                                     _MM_FROUND_TO_NEG_INF | _MM_FROUND_NO_EXC);
+    x = _mm512_fnmadd_ps(fx, _mm512_set1_ps(ML2C_LN2_HI), x);
+    x = _mm512_fnmadd_ps(fx, _mm512_set1_ps(ML2C_LN2_LO), x);
+    __m512 y = _mm512_set1_ps(ML2C_P0);
+    y = _mm512_fmadd_ps(y, x, _mm512_set1_ps(ML2C_P1));
+    y = _mm512_fmadd_ps(y, x, _mm512_set1_ps(ML2C_P2));
+    y = _mm512_fmadd_ps(y, x, _mm512_set1_ps(ML2C_P3));
+    y = _mm512_fmadd_ps(y, x, _mm512_set1_ps(ML2C_P4));
+    y = _mm512_fmadd_ps(y, x, _mm512_set1_ps(ML2C_P5));
+    y = _mm512_add_ps(_mm512_fmadd_ps(y, _mm512_mul_ps(x, x), x), _mm512_set1_ps(1.0f));
+    __m512i n = _mm512_slli_epi32(_mm512_add_epi32(_mm512_cvttps_epi32(fx), _mm512_set1_epi32(127)), 23);
+    return _mm512_mul_ps(y, _mm512_castsi512_ps(n));
+}
+
+__attribute__((target("avx512f")))
+static void batch_avx512(const float *X, int n_rows, float *out) {
+    const __mmask16 tail = (__mmask16)((1u << (N_FEATURES % 16)) - 1);
+    for (int i = 0; i < n_rows; i++) {
+        const float *row = X + (long)i * N_FEATURES;
+        __m512 acc = _mm512_setzero_ps();
+        int j = 0;
+        for (; j + 16 <= N_FEATURES; j += 16)
+            acc = _mm512_fmadd_ps(_mm512_loadu_ps(coef + j), _mm512_loadu_ps(row + j), acc);
+        if (N_FEATURES % 16)
+            acc = _mm512_fmadd_ps(_mm512_maskz_loadu_ps(tail, coef + j), _mm512_maskz_loadu_ps(tail, row + j), acc);
+        out[i] = ML2C_INTERCEPT + _mm512_reduce_add_ps(acc);
+    }
+#ifdef ML2C_LOGISTIC
+    int i = 0;
+    for (; i + 16 <= n_rows; i += 16) {
+        __m512 e = exp_avx512(_mm512_sub_ps(_mm512_setzero_ps(), _mm512_loadu_ps(out + i)));
+        _mm512_storeu_ps(out + i, _mm512_div_ps(_mm512_set1_ps(1.0f), _mm512_add_ps(_mm512_set1_ps(1.0f), e)));
+    }
+    if (i < n_rows) {
+        __mmask16 rest = (__mmask16)((1u << (n_rows - i)) - 1);
+        __m512 e = exp_avx512(_mm512_sub_ps(_mm512_setzero_ps(), _mm512_maskz_loadu_ps(rest, out + i)));
+        _mm512_mask_storeu_ps(out + i, rest, _mm512_div_ps(_mm512_set1_ps(1.0f), _mm512_add_ps(_mm512_set1_ps(1.0f), e)));
+    }
+#endif
+}
+
+#endif /* ML2C_X86 */
+
+static ml2c_batch_fn batch_impl = batch_scalar;
+static const char *batch_isa = "scalar";
+
+static int isa_allowed(const char *forced, const char *name) {
+    return forced == NULL || strcmp(forced, name) == 0;
+}
+
+__attribute__((constructor))
+static void select_batch_impl(void) {
+    const char *forced = getenv("ML2C_ISA");
+#ifdef ML2C_X86
+    __builtin_cpu_init();
+    if (isa_allowed(forced, "avx512") && __builtin_cpu_supports("avx512f")) {
+        batch_impl = batch_avx512;
+        batch_isa = "avx512";
+        return;
+    }
+    if (isa_allowed(forced, "avx2") && __builtin_cpu_supports("avx2") && __builtin_cpu_supports("fma")) {
+        batch_impl = batch_avx2;
+        batch_isa = "avx2";
+        return;
+    }
+    if (isa_allowed(forced, "sse") && __builtin_cpu_supports("sse4.1")) {
+        batch_impl = batch_sse;
+        batch_isa = "sse";
+        return;
+    }
+#endif
+    (void)forced;
+}
+
+const char *prediction_batch_isa(void) {
+    return batch_isa;
+}
+
+void prediction_batch(const float *X, int n_rows, float *out) {
+    batch_impl(X, n_rows, out);
+}
+
+"""
+
+
+# C entry point appended by ModelTranspiler.autotune() for each candidate.
+# Usage: harness SAMPLE_FILE N_ROWS OUT_FILE MIN_TIME_MS BATCH_SIZE...
+# Writes the float32 predictions for the whole sample to OUT_FILE and
+# prints "<batch size> <ns per row>" for each batch size.
+BENCHMARK_MAIN = r"""
+#include <stdlib.h>
+#include <time.h>
+
+static double now_ns(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec * 1e9 + ts.tv_nsec;
+}
+
+int main(int argc, char **argv) {
+    if (argc < 6) return 2;
+    int n_rows = atoi(argv[2]);
+    float *X = malloc((size_t)n_rows * N_FEATURES * sizeof(float));
+    float *out = malloc((size_t)n_rows * sizeof(float));
+    FILE *f = fopen(argv[1], "rb");
+    if (!f || fread(X, sizeof(float), (size_t)n_rows * N_FEATURES, f) != (size_t)n_rows * N_FEATURES)
+        return 1;
+    fclose(f);
+
+    prediction_batch(X, n_rows, out);
+    f = fopen(argv[3], "wb");
+    if (!f) return 1;
+    fwrite(out, sizeof(float), (size_t)n_rows, f);
+    fclose(f);
+
+    double min_ns = atof(argv[4]) * 1e6;
+    volatile float sink = 0.0f;
+    for (int a = 5; a < argc; a++) {
+        int bs = atoi(argv[a]);
+        if (bs > n_rows) bs = n_rows;
+        long rows = 0;
+        int offset = 0;
+        double start = now_ns(), elapsed;
+        do {
+            for (int rep = 0; rep < 16; rep++) {
+                prediction_batch(X + (long)offset * N_FEATURES, bs, out);
+                sink += out[0];
+                rows += bs;
+                offset += bs;
+                if (offset + bs > n_rows) offset = 0;
+            }
+            elapsed = now_ns() - start;
+        } while (elapsed < min_ns);
+        printf("%d %.3f\n", bs, elapsed / rows);
+    }
+#ifdef ML2C_EARLY_EXIT
+    printf("avg_trees %.3f\n", prediction_avg_trees());
+#endif
+    free(X);
+    free(out);
+    return 0;
+}
+"""
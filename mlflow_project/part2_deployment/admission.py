@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Admission control for the model service.
+Requests are admitted up to an in-flight limit and otherwise queue for at
+most a maximum wait. A request whose estimated queueing delay would break
+the latency SLO is rejected right away instead of being served too late,
+so the service keeps its goodput under overload. Per-client token buckets
+optionally rate-limit individual callers.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted; carries the HTTP status to answer."""
+
+    def __init__(self, status_code: int, reason: str, message: str, retry_after_s: float = 1.0):
+        super().__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+    @property
+    def retry_after(self) -> str:
+        """Retry-After header value, in whole seconds."""
+        return str(max(1, math.ceil(self.retry_after_s)))
+
+
+class _QueueTimeout(Exception):
+    pass
+
+
+class TokenBucket:
+    """Allows rate requests per second on average, with bursts of up to burst."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token; return 0 on success, or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Bounds concurrent requests and sheds load early.
+
+    Only used from the event loop. Requests beyond max_inflight wait in
+    FIFO order for at most max_queue_wait_ms. The expected queueing delay
+    is estimated from the queue length and a moving average of request
+    service times; if it exceeds the maximum wait, or the latency SLO
+    minus the service time, the request is rejected with 503 before it
+    waits at all. Clients over client_rate requests per second get 429.
+    """
+
+    def __init__(self, max_inflight: int = 128, max_queue_wait_ms: float = 1000,
+                 latency_slo_ms: float = 0, client_rate: float = 0, client_burst: float = 0,
+                 max_clients: int = 10000):
+        self.max_inflight = max_inflight
+        self.max_queue_wait = max_queue_wait_ms / 1000
+        self.latency_slo = latency_slo_ms / 1000
+        self.client_rate = client_rate
+        self.client_burst = client_burst or max(1.0, client_rate)
+        self.max_clients = max_clients
+        self.inflight = 0
+        self.service_time = None
+        self.admitted = 0
+        self.rejected = {"rate_limited": 0, "shed": 0, "queue_timeout": 0}
+        self._waiters = deque()
+        self._buckets = OrderedDict()
+
+    @asynccontextmanager
+    async def admit(self, client_id: str = None):
+        """Hold an in-flight slot for the duration of one request, or raise Rejected."""
+        self._check_rate(client_id)
+        await self._acquire()
+        self.admitted += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe(time.perf_counter() - start)
+            self._release()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def estimated_wait(self) -> float:
+        """Expected queueing delay, in seconds, for a request arriving now."""
+        if self.inflight < self.max_inflight and not self._waiters:
+            return 0.0
+        if self.service_time is None:
+            return 0.0
+        return (self.queued + 1) * self.service_time / self.max_inflight
+
+    def _check_rate(self, client_id):
+        if not self.client_rate or client_id is None:
+            return
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = self._buckets[client_id] = TokenBucket(self.client_rate, self.client_burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client_id)
+        wait = bucket.take()
+        if wait:
+            self.rejected["rate_limited"] += 1
+            raise Rejected(429, "rate_limited",
+                           f"Rate limit of {self.client_rate:g} requests/s exceeded", wait)
+
+    async def _acquire(self):
+        if self.inflight < self.max_inflight and not self._waiters:
+            self.inflight += 1
+            return
+
+        wait = self.estimated_wait()
+        budget = self.max_queue_wait
+        if self.latency_slo:
+            budget = min(budget, self.latency_slo - (self.service_time or 0.0))
+        if wait > budget:
+            self.rejected["shed"] += 1
+            raise Rejected(503, "shed", f"Overloaded: estimated queueing delay {wait * 1000:.0f} ms "
+                                        f"exceeds {max(budget, 0) * 1000:.0f} ms", wait)
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        timer = loop.call_later(self.max_queue_wait,
+                                lambda: waiter.done() or waiter.set_exception(_QueueTimeout()))
+        try:
+            # Resolved by _release(), which hands over its slot
+            await waiter
+        except _QueueTimeout:
+            if waiter in self._waiters:
+                # Not already dropped by a _release() in the same loop iteration
+                self._waiters.remove(waiter)
+            self.rejected["queue_timeout"] += 1
+            raise Rejected(503, "queue_timeout",
+                           f"Overloaded: no capacity within {self.max_queue_wait * 1000:.0f} ms",
+                           self.max_queue_wait)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # Cancelled after being handed a slot: pass it on
+                self._release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        finally:
+            timer.cancel()
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.inflight -= 1
+
+    def _observe(self, elapsed: float):
+        if self.service_time is None:
+            self.service_time = elapsed
+        else:
+            self.service_time += 0.1 * (elapsed - self.service_time)
+
+    def stats(self):
+        return {
+            "max_inflight": self.max_inflight,
+            "max_queue_wait_ms": round(self.max_queue_wait * 1000, 1),
+            "latency_slo_ms": round(self.latency_slo * 1000, 1) if self.latency_slo else None,
+            "client_rate": self.client_rate or None,
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "service_time_ms": round(self.service_time * 1000, 3) if self.service_time else None,
+            "estimated_wait_ms": round(self.estimated_wait() * 1000, 3),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected)
+        }
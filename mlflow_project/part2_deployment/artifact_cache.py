@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Local content-addressed cache of MLflow model artifacts.
+Downloaded model directories are stored under the SHA-256 of their
+content, indexed by the resolved model URI (a registry version or a run),
+verified on every use and evicted LRU under a size budget. The cache may
+be shared by several worker processes: they coordinate through file locks.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+
+_MODELS_URI = re.compile(r"^models:/(?P<name>[^/]+)/(?P<ref>[^/]+)$")
+
+
+def hash_directory(path: str) -> tuple:
+    """Return (content hash, {relative path: sha256}, total bytes) of a directory."""
+    manifest = {}
+    size = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            full_path = os.path.join(root, name)
+            digest = hashlib.sha256()
+            with open(full_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            manifest[os.path.relpath(full_path, path).replace(os.sep, "/")] = digest.hexdigest()
+            size += os.path.getsize(full_path)
+    content_hash = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+    return content_hash, manifest, size
+
+
+class ArtifactCache:
+    """
+    Content-addressed store of model directories.
+
+    Registry versions and runs are immutable, so a pinned URI
+    (models:/name/3 or runs:/id/model) found in the cache is served without
+    contacting the tracking server. models:/name/latest is resolved to a
+    version first; if the server does not answer within resolve_timeout_s,
+    the version it last resolved to is used instead.
+
+    Every change to the index is made under an exclusive lock on
+    LOCK_FILE, on the index as last written by any process. Objects being
+    read hold a shared lock on <object>.lock, and are never evicted while
+    they do.
+    """
+
+    def __init__(self, root: str, max_mb: float = 2048, resolve_timeout_s: float = 10.0):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.resolve_timeout_s = resolve_timeout_s
+        self._lock = threading.Lock()
+        self._resolver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifact-resolve")
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._index = self._read_index()
+
+    @contextmanager
+    def fetch(self, model_uri: str):
+        """
+        Yield a local directory holding the model at model_uri, which is
+        not evicted until the block exits. The result has local_path,
+        resolved_uri, content_hash and source ("cache" or "download").
+        """
+        result, pin = self._fetch(self._resolve(model_uri))
+        try:
+            yield result
+        finally:
+            # Closing the file releases its shared lock
+            pin.close()
+
+    def _fetch(self, resolved_uri: str) -> tuple:
+        pin = None
+        with self._locked():
+            entry = self._index["entries"].get(resolved_uri)
+            if entry is not None and os.path.isdir(self._object_path(entry["content_hash"])):
+                # Pinned before the index lock is released, so it cannot be evicted
+                pin = self._pin(entry["content_hash"])
+                entry["last_used"] = time.time()
+                self._write_index()
+
+        if entry is not None:
+            # Hashing a large model takes seconds: verify outside the index
+            # lock, so other workers' loads do not wait for it
+            if pin is not None and self._verify(self._object_path(entry["content_hash"]), entry):
+                logger.info(f"Artifact cache hit: {resolved_uri} ({entry['content_hash'][:12]})")
+                return self._result(resolved_uri, entry, "cache"), pin
+            if pin is not None:
+                pin.close()
+            logger.warning(f"Artifact cache entry failed verification, refetching: {resolved_uri}")
+            with self._locked():
+                current = self._index["entries"].get(resolved_uri)
+                if current is not None and current["content_hash"] == entry["content_hash"]:
+                    # Corrupt: removed even if it is being read
+                    self._drop(resolved_uri, force=True)
+                    self._write_index()
+
+        import mlflow.artifacts
+
+        # Download outside the lock; installing the result is atomic
+        with tempfile.TemporaryDirectory(dir=self.root, prefix="download-") as tmp:
+            download_path = mlflow.artifacts.download_artifacts(artifact_uri=resolved_uri, dst_path=tmp)
+            content_hash, manifest, size = hash_directory(download_path)
+
+            with self._locked():
+                object_path = self._object_path(content_hash)
+                try:
+                    os.replace(download_path, object_path)
+                except OSError:
+                    # Installed meanwhile by another worker: same content, keep it
+                    if not os.path.isdir(object_path):
+                        raise
+                entry = {
+                    "content_hash": content_hash,
+                    "manifest": manifest,
+                    "size": size,
+                    "last_used": time.time()
+                }
+                self._index["entries"][resolved_uri] = entry
+                self._evict(keep=resolved_uri)
+                self._write_index()
+                pin = self._pin(content_hash)
+
+        logger.info(f"Artifact cached: {resolved_uri} ({content_hash[:12]}, {size / 1e6:.1f} MB)")
+        return self._result(resolved_uri, entry, "download"), pin
+
+    def remember_served(self, load_request: dict):
+        """Record the load request of the served model, to restore it at startup."""
+        with self._locked():
+            self._index["last_served"] = load_request
+            self._write_index()
+
+    @property
+    def last_served(self):
+        return self._read_index().get("last_served")
+
+    def stats(self):
+        # The index file is replaced atomically, so it can be read unlocked
+        entries = self._read_index()["entries"]
+        return {
+            "root": self.root,
+            "entries": len(entries),
+            "size_mb": round(sum(e["size"] for e in entries.values()) / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2)
+        }
+
+    @contextmanager
+    def _locked(self):
+        """
+        Hold the index lock, against other threads and other processes,
+        with self._index re-read from disk: another worker may have
+        changed it since this one last did.
+        """
+        with self._lock, open(os.path.join(self.root, LOCK_FILE), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._index = self._read_index()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _pin(self, content_hash: str):
+        """Take a shared lock on an object, held until the returned file is closed."""
+        pin = open(self._object_path(content_hash) + ".lock", "w")
+        fcntl.flock(pin, fcntl.LOCK_SH)
+        return pin
+
+    def _resolve(self, model_uri: str) -> str:
+        """Map model_uri to an immutable URI (a registry version or a run)."""
+        match = _MODELS_URI.match(model_uri)
+        if match is None or match.group("ref").isdigit():
+            return model_uri
+
+        # A moving reference such as 'latest': ask the registry, but do not
+        # let a slow or unreachable server block the load.
+        name = match.group("name")
+        future = self._resolver.submit(self._latest_version, name)
+        try:
+            version = future.result(timeout=self.resolve_timeout_s)
+        except Exception as e:
+            resolved_uri = self._read_index()["aliases"].get(model_uri)
+            if resolved_uri is None:
+                raise RuntimeError(f"Cannot resolve {model_uri} and no cached version is known: {e}")
+            logger.warning(f"Could not resolve {model_uri} ({e!r}); using cached {resolved_uri}")
+            return resolved_uri
+
+        resolved_uri = f"models:/{name}/{version}"
+        with self._locked():
+            self._index["aliases"][model_uri] = resolved_uri
+            self._write_index()
+        return resolved_uri
+
+    @staticmethod
+    def _latest_version(name: str) -> int:
+        from mlflow import MlflowClient
+        versions = MlflowClient().search_model_versions(f"name='{name}'")
+        if not versions:
+            raise RuntimeError(f"Registered model '{name}' has no versions")
+        return max(int(v.version) for v in versions)
+
+    def _object_path(self, content_hash: str) -> str:
+        return os.path.join(self.root, "objects", content_hash)
+
+    def _verify(self, path: str, entry: dict) -> bool:
+        if not os.path.isdir(path):
+            return False
+        content_hash, manifest, _size = hash_directory(path)
+        return content_hash == entry["content_hash"] and manifest == entry["manifest"]
+
+    def _evict(self, keep: str):
+        """
+        Drop least recently used entries until the cache fits its budget,
+        skipping objects that are being read. Called with the index lock held.
+        """
+        entries = self._index["entries"]
+        total = sum(self._unique_sizes().values())
+        for uri in sorted(entries, key=lambda u: entries[u]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            content_hash = entries[uri]["content_hash"]
+            if uri == keep or content_hash == entries[keep]["content_hash"]:
+                continue
+            size = entries[uri]["size"]
+            if not self._drop(uri):
+                continue
+            if content_hash not in self._unique_sizes():
+                total -= size
+                logger.info(f"Evicted cached artifact {uri} ({size / 1e6:.1f} MB)")
+
+    def _unique_sizes(self) -> dict:
+        # Several URIs may point at the same content; count it once
+        return {e["content_hash"]: e["size"] for e in self._index["entries"].values()}
+
+    def _drop(self, uri: str, force: bool = False) -> bool:
+        """
+        Remove an entry, and its object if no other entry uses it. Unless
+        force, returns False and changes nothing if the object is being read.
+        """
+        content_hash = self._index["entries"][uri]["content_hash"]
+        shared = sum(e["content_hash"] == content_hash for e in self._index["entries"].values()) > 1
+        if shared:
+            del self._index["entries"][uri]
+            return True
+
+        object_path = self._object_path(content_hash)
+        with open(object_path + ".lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                if not force:
+                    return False
+            del self._index["entries"][uri]
+            shutil.rmtree(object_path, ignore_errors=True)
+            # Nobody can open it again: the entry is gone and the index is locked
+            os.remove(object_path + ".lock")
+        return True
+
+    def _result(self, resolved_uri: str, entry: dict, source: str) -> dict:
+        return {
+            "local_path": self._object_path(entry["content_hash"]),
+            "resolved_uri": resolved_uri,
+            "content_hash": entry["content_hash"],
+            "source": source
+        }
+
+    def _read_index(self) -> dict:
+        try:
+            with open(os.path.join(self.root, INDEX_FILE)) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("entries", {})
+        index.setdefault("aliases", {})
+        return index
+
+    def _write_index(self):
+        path = os.path.join(self.root, INDEX_FILE)
+        # Unique per writer: several worker processes may share the cache
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=f"{INDEX_FILE}.")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, path)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Asynchronous batch scoring jobs for the model service.
+An input file (uploaded and spooled to disk, or already on the host) is
+scored chunk by chunk on a background worker, and the predictions are
+appended to a file on disk. Memory stays bounded by one chunk whatever the
+input size, and no HTTP connection is held while the job runs.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Input formats, by upload content type or input file extension
+INPUT_FORMATS = {"application/x-ndjson": "ndjson", "application/x-npy": "npy"}
+INPUT_EXTENSIONS = {".ndjson": "ndjson", ".jsonl": "ndjson", ".npy": "npy"}
+
+OUTPUT_FILE = "predictions.ndjson"
+FINAL_STATES = ("succeeded", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def resolve_input_path(root: str, input_path: str) -> str:
+    """
+    Resolve input_path relative to root, following symlinks. Raises
+    ValueError if it leads out of root, FileNotFoundError if it is not a file.
+    """
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, input_path))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"{input_path} is not under the input directory")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(input_path)
+    return path
+
+
+async def spool(chunks, path: str, max_bytes: int = 0) -> int:
+    """
+    Write an async iterable of byte strings to path as they arrive; returns
+    the bytes written. Raises UploadTooLarge past max_bytes (0: no limit).
+    """
+    received = 0
+    with open(path, "wb") as f:
+        async for data in chunks:
+            received += len(data)
+            if max_bytes and received > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+            f.write(data)
+    return received
+
+
+def _ndjson_chunk(lines: list, first_line: int) -> np.ndarray:
+    try:
+        X = np.array(json.loads(b"[" + b",".join(lines) + b"]"), dtype=float)
+    except ValueError as e:
+        raise ValueError(f"Invalid rows in lines {first_line}-{first_line + len(lines) - 1}: {e}")
+    if X.ndim != 2:
+        raise ValueError(f"Lines {first_line}-{first_line + len(lines) - 1}: each line must be "
+                         f"a JSON array of feature values")
+    return X
+
+
+def read_ndjson_chunks(path: str, chunk_rows: int):
+    """Yield (rows, bytes read so far) from a file of JSON arrays, one row per line."""
+    lines = []
+    first_line = 1
+    with open(path, "rb") as f:
+        for line_number, line in enumerate(f, start=1):
+            if line.strip():
+                lines.append(line)
+            if len(lines) == chunk_rows:
+                yield _ndjson_chunk(lines, first_line), f.tell()
+                lines = []
+                first_line = line_number + 1
+        if lines:
+            yield _ndjson_chunk(lines, first_line), f.tell()
+
+
+def read_npy_chunks(path: str, chunk_rows: int):
+    """Yield (rows, bytes read so far) from a memory-mapped 2D .npy file."""
+    X = np.load(path, mmap_mode="r", allow_pickle=False)
+    if X.ndim != 2:
+        raise ValueError(f"Features must be a 2D array, got shape {X.shape}")
+    if X.dtype.kind not in "fiu":
+        raise ValueError(f"Features must be numeric, got dtype {X.dtype}")
+    size = os.path.getsize(path)
+    for start in range(0, len(X), chunk_rows):
+        stop = min(start + chunk_rows, len(X))
+        # Copy the chunk out of the mapping, so only one chunk is resident
+        yield np.array(X[start:stop]), size * stop // len(X)
+
+
+def count_rows(path: str, input_format: str):
+    """Rows in an input file, when known without reading it (.npy only)."""
+    if input_format == "npy":
+        return int(np.load(path, mmap_mode="r", allow_pickle=False).shape[0])
+    return None
+
+
+class BatchJobManager:
+    """
+    Batch scoring jobs, each in its own directory under root.
+
+    Jobs run one at a time per worker. predict(X) is blocking and scores
+    one chunk; release() is called once the job is over, whatever its
+    outcome. Only the max_jobs most recent jobs are kept, with their files.
+    """
+
+    def __init__(self, root: str, chunk_rows: int = 10000, max_jobs: int = 50, workers: int = 1):
+        self.root = root
+        self.chunk_rows = chunk_rows
+        self.max_jobs = max_jobs
+        self.rows_scored = 0
+        self._jobs = {}
+        self._inputs = {}
+        self._cancelled = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-job")
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def output_path(self, job_id: str) -> str:
+        return os.path.join(self.job_dir(job_id), OUTPUT_FILE)
+
+    def create(self, input_format: str, model_info: dict, input_path: str = None) -> dict:
+        """
+        Register a job. Without input_path, the input is to be uploaded to
+        upload_path(job) before submit().
+        """
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id))
+        job = {
+            "job_id": job_id,
+            "status": "receiving" if input_path is None else "queued",
+            "input_format": input_format,
+            "input_source": "path" if input_path else "upload",
+            "model_name": model_info.get("model_name", "unknown"),
+            "version": model_info.get("version", "unknown"),
+            "model_uri": model_info.get("model_uri"),
+            "rows_done": 0,
+            "rows_total": None,
+            "progress": 0.0,
+            "input_bytes": None,
+            "output_bytes": None,
+            "error": None,
+            # Every key exists up front: the worker only updates values,
+            # so a job can be serialized while it runs
+            "submitted_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._inputs[job_id] = input_path or os.path.join(self.job_dir(job_id),
+                                                              f"input.{input_format}")
+            self._prune()
+        return job
+
+    def upload_path(self, job: dict) -> str:
+        return self._inputs[job["job_id"]]
+
+    def submit(self, job: dict, predict, release):
+        """Queue a created job for scoring."""
+        job["status"] = "queued"
+        self._executor.submit(self._run, job, predict, release)
+
+    def discard(self, job: dict):
+        """Forget a job that could not be submitted, with its files."""
+        with self._lock:
+            self._jobs.pop(job["job_id"], None)
+            self._inputs.pop(job["job_id"], None)
+        shutil.rmtree(self.job_dir(job["job_id"]), ignore_errors=True)
+
+    def _run(self, job: dict, predict, release):
+        job_id = job["job_id"]
+        input_path = self._inputs[job_id]
+        output_path = self.output_path(job_id)
+        partial_path = output_path + ".part"
+        try:
+            self._check_cancelled(job_id)
+            job["status"] = "running"
+            job["started_at"] = datetime.now().isoformat()
+            input_bytes = os.path.getsize(input_path) or 1
+            job["input_bytes"] = input_bytes
+            job["rows_total"] = count_rows(input_path, job["input_format"])
+            read_chunks = read_npy_chunks if job["input_format"] == "npy" else read_ndjson_chunks
+
+            with open(partial_path, "w") as out:
+                for X, bytes_read in read_chunks(input_path, self.chunk_rows):
+                    self._check_cancelled(job_id)
+                    predictions = np.asarray(predict(X))
+                    out.write("".join(json.dumps(p) + "\n" for p in predictions.tolist()))
+                    job["rows_done"] += len(X)
+                    job["progress"] = round(bytes_read / input_bytes, 4)
+                    self.rows_scored += len(X)
+            os.replace(partial_path, output_path)
+            job["output_bytes"] = os.path.getsize(output_path)
+            job["progress"] = 1.0
+            status = "succeeded"
+        except JobCancelled:
+            status = "cancelled"
+        except Exception as e:
+            logger.error(f"Batch job {job_id} failed: {str(e)}")
+            job["error"] = str(e)
+            status = "failed"
+        finally:
+            release()
+            if job["input_source"] == "upload" and os.path.exists(input_path):
+                # The spooled upload is not needed once the job is over
+                os.remove(input_path)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        job["finished_at"] = datetime.now().isoformat()
+        # Set last so pollers that see a final status also see the results
+        job["status"] = status
+        logger.info(f"Batch job {job_id} {status}: {job['rows_done']} rows")
+        if status == "cancelled":
+            self.discard(job)
+
+    def _check_cancelled(self, job_id: str):
+        if job_id in self._cancelled:
+            self._cancelled.discard(job_id)
+            raise JobCancelled()
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job and delete its files. A running job stops before its
+        next chunk. Returns False for unknown jobs.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return False
+        if job["status"] in FINAL_STATES:
+            self.discard(job)
+        else:
+            self._cancelled.add(job_id)
+        return True
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list:
+        """Known jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _prune(self):
+        """Drop the oldest finished jobs beyond max_jobs, with their files."""
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs:
+                return
+            if self._jobs[job_id]["status"] in FINAL_STATES:
+                del self._jobs[job_id]
+                del self._inputs[job_id]
+                shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            statuses = [job["status"] for job in self._jobs.values()]
+        return {
+            "jobs": len(statuses),
+            **{status: statuses.count(status)
+               for status in ("receiving", "queued", "running") + FINAL_STATES},
+            "rows_scored": self.rows_scored
+        }
+
+    def shutdown(self):
+        """Cancel queued and running jobs."""
+        for job in self.jobs():
+            if job["status"] not in FINAL_STATES:
+                self._cancelled.add(job["job_id"])
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Dynamic micro-batching for the model service.
+Concurrent /predict calls are queued and flushed to the model as one
+stacked NumPy batch, then the results are scattered back to each caller.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from model_service_common.metrics import BATCH_SIZE_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingRequest:
+    """One queued prediction request"""
+    served: object
+    X: np.ndarray
+    future: asyncio.Future
+    enqueued_at: float
+
+
+@dataclass
+class BatcherStats:
+    """Counters exported by the batcher"""
+    batches: int = 0
+    requests: int = 0
+    rows: int = 0
+    split_batches: int = 0
+    queue_wait_total_ms: float = 0.0
+    queue_wait_max_ms: float = 0.0
+    batch_size_buckets: dict = field(
+        default_factory=lambda: {str(b): 0 for b in BATCH_SIZE_BUCKETS + ("+Inf",)})
+
+    def as_dict(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "rows": self.rows,
+            "split_batches": self.split_batches,
+            "mean_batch_rows": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "mean_queue_wait_ms": round(self.queue_wait_total_ms / self.requests, 3) if self.requests else 0.0,
+            "max_queue_wait_ms": round(self.queue_wait_max_ms, 3),
+            "batch_size_buckets": dict(self.batch_size_buckets),
+        }
+
+
+class MicroBatcher:
+    """
+    Queue concurrent prediction requests and evaluate them together.
+
+    A batch is flushed when it holds max_batch_rows rows or when its oldest
+    request has waited max_wait_ms. Requests are only stacked with others
+    for the same served model and feature count.
+
+    predict_fn(served, X) is awaited to evaluate a batch. If a stacked batch
+    fails, its requests are evaluated again one by one, so that a request
+    the model rejects (e.g. with an infinite value) fails alone. At most
+    max_concurrent_batches batches are evaluated at once; while they are
+    all busy, new requests keep accumulating into the next batch.
+    on_flush(served, queue_waits), if given, receives the queue wait in
+    seconds of every request in a flushed batch.
+    """
+
+    def __init__(self, predict_fn, max_batch_rows: int = 64, max_wait_ms: float = 2.0,
+                 max_concurrent_batches: int = 1, on_flush=None):
+        self.predict_fn = predict_fn
+        self.on_flush = on_flush
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_concurrent_batches = max_concurrent_batches
+        self.stats = BatcherStats()
+        self._queue = None
+        self._slots = None
+        self._task = None
+
+    def start(self):
+        """Start the flush loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def predict(self, served, X: np.ndarray) -> np.ndarray:
+        """Queue X for prediction with served.model and wait for the result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put(PendingRequest(served, X, future, loop.time()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            first = await self._queue.get()
+            batch = [first]
+            rows = len(first.X)
+            deadline = first.enqueued_at + self.max_wait
+
+            while rows < self.max_batch_rows:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                batch.append(item)
+                rows += len(item.X)
+
+            task = loop.create_task(self._flush(batch))
+            task.add_done_callback(lambda _task: self._slots.release())
+
+    async def _flush(self, batch):
+        now = asyncio.get_running_loop().time()
+
+        groups = {}
+        for item in batch:
+            groups.setdefault((id(item.served), item.X.shape[1]), []).append(item)
+
+        for items in groups.values():
+            self._record(items, now)
+            if self.on_flush is not None:
+                self.on_flush(items[0].served, [now - item.enqueued_at for item in items])
+            sizes = [len(item.X) for item in items]
+            try:
+                X = items[0].X if len(items) == 1 else np.vstack([item.X for item in items])
+                predictions = await self.predict_fn(items[0].served, X)
+            except Exception as e:
+                if len(items) == 1:
+                    logger.warning(f"Batch prediction failed: {str(e)}")
+                    if not items[0].future.done():
+                        items[0].future.set_exception(e)
+                    continue
+                logger.warning(f"Batch prediction of {len(items)} requests failed, "
+                               f"evaluating them one by one: {str(e)}")
+                self.stats.split_batches += 1
+                for item in items:
+                    await self._flush_one(item)
+                continue
+
+            for item, part in zip(items, np.split(predictions, np.cumsum(sizes)[:-1])):
+                if not item.future.done():
+                    item.future.set_result(part)
+
+    async def _flush_one(self, item):
+        try:
+            predictions = await self.predict_fn(item.served, item.X)
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        if not item.future.done():
+            item.future.set_result(predictions)
+
+    def _record(self, items, now):
+        rows = sum(len(item.X) for item in items)
+        self.stats.batches += 1
+        self.stats.requests += len(items)
+        self.stats.rows += rows
+        for item in items:
+            wait_ms = (now - item.enqueued_at) * 1000.0
+            self.stats.queue_wait_total_ms += wait_ms
+            self.stats.queue_wait_max_ms = max(self.stats.queue_wait_max_ms, wait_ms)
+        for bound in BATCH_SIZE_BUCKETS:
+            if rows <= bound:
+                self.stats.batch_size_buckets[str(bound)] += 1
+                break
+        else:
+            self.stats.batch_size_buckets["+Inf"] += 1
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Single-flight coalescing of identical in-flight requests.
+Concurrent requests with the same key share one evaluation: the first one
+starts it, the others wait for its result. Nothing is kept once it
+completes, so unlike a cache a result can never be stale.
+"""
+
+import asyncio
+import hashlib
+
+import numpy as np
+
+
+def rows_key(X: np.ndarray) -> tuple:
+    """
+    Key of a feature array: its shape and a 128-bit hash of its values.
+    Values are hashed as float64, like the prediction cache does, so the
+    same rows decoded from JSON (float64) and from float32 bodies share a key.
+    """
+    # Treat 0.0 and -0.0 as the same value
+    X = np.ascontiguousarray(X, dtype=np.float64) + 0.0
+    return X.shape, hashlib.blake2b(X.data, digest_size=16).digest()
+
+
+class RequestCoalescer:
+    """
+    Runs at most one evaluation per key at a time. Only used from the event loop.
+
+    The evaluation runs as its own task, so a caller that is cancelled
+    (e.g. its client went away) does not cancel it for the others.
+    Exceptions are raised to every caller.
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    async def run(self, key, evaluate):
+        """Return the result of evaluate() for key, shared with concurrent callers."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(evaluate())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        total = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "evaluations": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / total, 4) if total else 0.0
+        }
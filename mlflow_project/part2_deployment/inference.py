@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Inference executors for the model service.
+Predictions run off the event loop, either on a thread pool (for backends
+that release the GIL) or on a process pool with the model preloaded in
+every worker.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_KINDS = ("thread", "process")
+
+# Model held by a process-pool worker, set once by the pool initializer
+_worker_model = None
+
+
+def _init_worker(payload: bytes):
+    global _worker_model
+    _worker_model = pickle.loads(payload)
+
+
+def _worker_ready(hold_s: float) -> int:
+    # Holding the worker briefly makes the other pings land on other workers
+    time.sleep(hold_s)
+    return os.getpid()
+
+
+def _worker_predict(X: np.ndarray) -> np.ndarray:
+    return _worker_model.predict(X)
+
+
+class ExecutorBusy(Exception):
+    """Raised when the inference queue is full."""
+
+
+class ModelRunner(ABC):
+    """
+    Executes predictions for one model. Subclasses implement submit().
+
+    Requests acquire() the runner before using it and release() it when
+    done. Once the runner is retired and no request holds it, it is closed
+    and acquire() returns False, so callers pick up the newer model instead.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._retired = False
+        self._closed = False
+
+    @property
+    def in_use(self) -> int:
+        """Requests holding the runner."""
+        return self._inflight
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self._closed:
+                return False
+            self._inflight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._inflight -= 1
+            close = self._retired and self._inflight == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self._close()
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+            close = self._inflight == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self._close()
+
+    @abstractmethod
+    def submit(self, X):
+        """Start predicting X; returns a concurrent.futures.Future."""
+
+    def _close(self):
+        pass
+
+
+class ThreadRunner(ModelRunner):
+    """Runs predictions for one model on the shared thread pool."""
+
+    def __init__(self, model, pool: ThreadPoolExecutor):
+        super().__init__(model)
+        self.pool = pool
+
+    def submit(self, X):
+        return self.pool.submit(self.model.predict, X)
+
+
+class ProcessRunner(ModelRunner):
+    """
+    A process pool dedicated to one model.
+    Every worker unpickles the model once at startup.
+    """
+
+    def __init__(self, model, workers: int):
+        super().__init__(model)
+        payload = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(payload,)
+        )
+
+        # Start and load every worker now so the first requests do not pay for it
+        pids = set()
+        for _ in range(20):
+            pids |= {f.result() for f in [self.pool.submit(_worker_ready, 0.05)
+                                          for _ in range(workers)]}
+            if len(pids) == workers:
+                break
+        logger.info(f"Process pool ready ({len(pids)} worker(s))")
+
+    def submit(self, X):
+        return self.pool.submit(_worker_predict, X)
+
+    def _close(self):
+        self.pool.shutdown(wait=False)
+        logger.info("Retired process pool shut down")
+
+
+class InferenceExecutor:
+    """
+    Bounded executor for model predictions.
+
+    create_runner() is blocking and is meant to be called from the model
+    loading job, before the new model is published. Requests hold a
+    reserve() slot while queued or running, which bounds the queue depth.
+    """
+
+    def __init__(self, kind: str = "thread", workers: int = None, max_queue: int = 256):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor '{kind}', expected one of {EXECUTOR_KINDS}")
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.pending = 0
+        self.rejected = 0
+        self._threads = ThreadPoolExecutor(max_workers=self.workers,
+                                           thread_name_prefix="inference")
+
+    def create_runner(self, model):
+        """Prepare a runner for model (starts and warms a process pool if needed)."""
+        if self.kind == "process":
+            return ProcessRunner(model, self.workers)
+        return ThreadRunner(model, self._threads)
+
+    def acquire_slot(self):
+        """Take a queue slot, or raise ExecutorBusy if max_queue are taken."""
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise ExecutorBusy(f"Inference queue full ({self.max_queue} pending)")
+        self.pending += 1
+
+    def release_slot(self):
+        self.pending -= 1
+
+    @contextmanager
+    def reserve(self):
+        """Hold a queue slot for one request, from queueing to its result."""
+        self.acquire_slot()
+        try:
+            yield
+        finally:
+            self.release_slot()
+
+    async def predict(self, runner, X: np.ndarray) -> np.ndarray:
+        """Run runner's model on X without blocking the event loop."""
+        return await asyncio.wrap_future(runner.submit(X))
+
+    def stats(self):
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False)
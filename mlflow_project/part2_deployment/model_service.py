@@ -4,18 +4,57 @@ Part 2: Model Deployment Web Service
 FastAPI service to serve ML models from MLflow
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from starlette.background import BackgroundTask
 from typing import List, Optional
-import mlflow
-import mlflow.sklearn
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime
 import numpy as np
+import gc
+import json
 import logging
+import os
+import tempfile
+import time
+import uuid
+
+from admission import AdmissionController, Rejected
+from artifact_cache import ArtifactCache, hash_directory
+from batch_jobs import (INPUT_EXTENSIONS, INPUT_FORMATS, BatchJobManager, UploadTooLarge,
+                        resolve_input_path, spool)
+from batching import MicroBatcher
+from coalescing import RequestCoalescer, rows_key
+from model_service_common.gc_tuning import GCMonitor, parse_thresholds
+from model_service_common.metrics import (BATCH_SIZE_BUCKETS, PROMETHEUS_CONTENT_TYPE,
+                                          MetricsRegistry, StageTimer)
+from inference import ExecutorBusy, InferenceExecutor
+import native
+from prediction_cache import PredictionCache
+from residency import ModelResidency, estimate_model_bytes
+from shared_model import share_model, shared_path, shared_size, verify_shared
+from socket_server import STATUS_BUSY, STATUS_NO_MODEL, RequestFailed, SocketPredictionServer
+from model_service_common.startup_profile import StartupProfile
+from model_service_common.thread_governor import ThreadGovernor, available_cpus
+from payloads import BINARY_CONTENT_TYPES, decode_features, encode_predictions, media_type
+from warmup import RowRecorder, over_budget, parse_budget, run_warmup, warmup_batches
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# mlflow is only imported by the first model load; it reads this variable then
+os.environ.setdefault("MLFLOW_TRACKING_URI", "http://mlflow:5000")
+
+# Startup milestones, reported by /health
+startup_profile = StartupProfile()
+
+# Threads and CPUs of this worker, applied before any pool is started
+governor = ThreadGovernor.from_env()
+governor.apply()
+
 # FastAPI app
 app = FastAPI(
     title="MLflow Model Service",
@@ -23,9 +62,210 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Global model variable
-current_model = None
-current_model_info = {}
+
+@dataclass(frozen=True)
+class ServedModel:
+    """
+    A loaded model together with its metadata and inference runner.
+    key is unique to one loaded model, unlike info["model_uri"], which may
+    resolve to another model on the next load.
+    """
+    model: object
+    info: dict
+    runner: object = None
+    key: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+
+# Currently served model. It is only ever replaced by a single assignment
+# once a new model is fully loaded, so a request that reads it once always
+# sees a model and metadata that belong together.
+served_model: Optional[ServedModel] = None
+
+# Model loads run in the background so /predict never waits on MLflow.
+load_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+load_jobs = {}
+MAX_LOAD_JOBS = 50
+
+# Prometheus metrics served at /metrics
+metrics = MetricsRegistry()
+predict_stage_seconds = metrics.histogram(
+    "model_service_predict_stage_seconds",
+    "Time spent in each stage of /predict",
+    ("stage", "model", "version")
+)
+model_call_rows = metrics.histogram(
+    "model_service_model_call_rows",
+    "Rows per model predict call (batch size)",
+    ("model", "version"),
+    buckets=BATCH_SIZE_BUCKETS
+)
+batch_queue_wait_seconds = metrics.histogram(
+    "model_service_batch_queue_wait_seconds",
+    "Time a request waited in the micro-batching queue",
+    ("model", "version")
+)
+
+# Predictions run off the event loop, on threads or on preloaded processes
+inference = InferenceExecutor(
+    kind=os.environ.get("INFERENCE_EXECUTOR", "thread"),
+    workers=int(os.environ.get("INFERENCE_WORKERS", "0")) or len(available_cpus()),
+    max_queue=int(os.environ.get("INFERENCE_MAX_QUEUE", "256"))
+)
+
+
+async def run_inference(served: ServedModel, X: np.ndarray) -> np.ndarray:
+    """Evaluate X with the served model on the inference executor."""
+    model_call_rows.observe(len(X), *model_labels(served))
+    return await inference.predict(served.runner, X)
+
+
+def model_labels(served: ServedModel) -> tuple:
+    """Metric labels identifying a served model."""
+    return served.info.get("model_name", "unknown"), served.info.get("version", "unknown")
+
+
+def record_queue_waits(served: ServedModel, queue_waits: list):
+    labels = model_labels(served)
+    for wait in queue_waits:
+        batch_queue_wait_seconds.observe(wait, *labels)
+
+
+# Concurrent /predict calls are stacked into one model call
+ENABLE_MICRO_BATCHING = os.environ.get("ENABLE_MICRO_BATCHING", "true").lower() == "true"
+batcher = MicroBatcher(
+    run_inference,
+    max_batch_rows=int(os.environ.get("MAX_BATCH_ROWS", "64")),
+    max_wait_ms=float(os.environ.get("MAX_WAIT_MS", "2")),
+    max_concurrent_batches=inference.workers,
+    on_flush=record_queue_waits
+)
+
+# Per-row prediction cache, dropped on every model swap
+prediction_cache = PredictionCache(
+    max_mb=float(os.environ.get("PREDICTION_CACHE_MB", "64")),
+    max_rows=int(os.environ.get("PREDICTION_CACHE_MAX_ROWS", "1024"))
+)
+
+# Downloaded model artifacts are kept on local disk across loads and restarts
+ARTIFACT_CACHE_MB = float(os.environ.get("ARTIFACT_CACHE_MB", "2048"))
+artifact_cache = ArtifactCache(
+    root=os.environ.get("ARTIFACT_CACHE_DIR",
+                        os.path.join(tempfile.gettempdir(), "model-artifact-cache")),
+    max_mb=ARTIFACT_CACHE_MB,
+    resolve_timeout_s=float(os.environ.get("ARTIFACT_RESOLVE_TIMEOUT_S", "10"))
+) if ARTIFACT_CACHE_MB > 0 else None
+# Reload the last served model from the cache when the service starts
+RESTORE_LAST_MODEL = os.environ.get("RESTORE_LAST_MODEL", "true").lower() == "true"
+
+# New models are warmed up on recent (or synthetic) rows before going live
+ENABLE_WARMUP = os.environ.get("ENABLE_WARMUP", "true").lower() == "true"
+WARMUP_BATCH_SIZES = tuple(int(b) for b in os.environ.get("WARMUP_BATCH_SIZES", "1,32,256").split(","))
+WARMUP_REPEATS = int(os.environ.get("WARMUP_REPEATS", "5"))
+# e.g. "20" (every batch size) or "1:5,256:40"; empty means no budget
+WARMUP_BUDGET = parse_budget(os.environ.get("WARMUP_LATENCY_BUDGET_MS", ""))
+warmup_rows = RowRecorder()
+
+# Supported models are transpiled to C with ml2c and served natively once
+# their predictions are verified against sklearn (needs gcc and lib/)
+ENABLE_NATIVE = os.environ.get("ENABLE_NATIVE", "false").lower() == "true"
+NATIVE_BUILD_DIR = os.environ.get("NATIVE_BUILD_DIR",
+                                  os.path.join(tempfile.gettempdir(), "model-service-native"))
+# ml2c code generation options, e.g. {"cflags": "-O3 -march=native"}
+NATIVE_OPTIONS = json.loads(os.environ.get("NATIVE_OPTIONS", "{}"))
+NATIVE_VERIFY_ROWS = int(os.environ.get("NATIVE_VERIFY_ROWS", "1024"))
+
+# Models selected per request (?model=...&version=...) stay loaded next to
+# the default model until the memory budget evicts them; 0 disables selection
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "2048"))
+
+# Identical concurrent requests (e.g. client retries) share one evaluation
+ENABLE_COALESCING = os.environ.get("ENABLE_COALESCING", "true").lower() == "true"
+coalescer = RequestCoalescer()
+
+# Large model arrays are exported once per host and memory-mapped read-only,
+# so worker processes share their pages instead of each holding a copy
+SHARE_MODEL_ARRAYS = os.environ.get("SHARE_MODEL_ARRAYS", "false").lower() == "true"
+SHARED_MODEL_DIR = os.environ.get("SHARED_MODEL_DIR",
+                                  os.path.join(tempfile.gettempdir(), "model-service-shared"))
+
+# Optional binary protocol on a Unix domain socket for co-located clients
+SOCKET_PATH = os.environ.get("SOCKET_PATH", "")
+
+# Rows scored per model call by /predict/stream
+STREAM_CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", "1024"))
+
+# Admission control for /predict: at most ADMISSION_MAX_INFLIGHT requests
+# run at once, the rest queue for up to ADMISSION_MAX_QUEUE_WAIT_MS. A
+# request that would queue past LATENCY_SLO_MS is rejected at once with
+# 503, and clients over CLIENT_RATE_LIMIT requests/s get 429.
+ADMISSION_MAX_INFLIGHT = int(os.environ.get("ADMISSION_MAX_INFLIGHT", "128"))
+CLIENT_ID_HEADER = os.environ.get("CLIENT_ID_HEADER", "X-Client-ID")
+admission = AdmissionController(
+    max_inflight=ADMISSION_MAX_INFLIGHT,
+    max_queue_wait_ms=float(os.environ.get("ADMISSION_MAX_QUEUE_WAIT_MS", "1000")),
+    latency_slo_ms=float(os.environ.get("LATENCY_SLO_MS", "0")),
+    client_rate=float(os.environ.get("CLIENT_RATE_LIMIT", "0")),
+    client_burst=float(os.environ.get("CLIENT_RATE_BURST", "0"))
+) if ADMISSION_MAX_INFLIGHT > 0 else None
+
+admission_rejected_total = metrics.counter(
+    "model_service_admission_rejected_total",
+    "Requests rejected by admission control",
+    ("reason",)
+)
+
+# Batch scoring jobs: inputs are uploaded (or read from BATCH_INPUT_DIR),
+# scored in chunks of BATCH_CHUNK_ROWS and the predictions spilled to disk
+BATCH_INPUT_DIR = os.environ.get("BATCH_INPUT_DIR", "")
+BATCH_MAX_UPLOAD_MB = float(os.environ.get("BATCH_MAX_UPLOAD_MB", "4096"))
+batch_jobs = BatchJobManager(
+    root=os.environ.get("BATCH_JOBS_DIR", os.path.join(tempfile.gettempdir(), "model-service-batch-jobs")),
+    chunk_rows=int(os.environ.get("BATCH_CHUNK_ROWS", "10000")),
+    max_jobs=int(os.environ.get("BATCH_MAX_JOBS", "50")),
+    workers=int(os.environ.get("BATCH_JOB_WORKERS", "1"))
+)
+
+# Garbage collector: long-lived objects are frozen after each model load so
+# collections only walk request garbage; pauses are exported as metrics
+GC_FREEZE_AFTER_LOAD = os.environ.get("GC_FREEZE_AFTER_LOAD", "true").lower() == "true"
+GC_FREEZE_MAX_WAIT_S = float(os.environ.get("GC_FREEZE_MAX_WAIT_S", "2"))
+GC_THRESHOLDS = parse_thresholds(os.environ.get("GC_THRESHOLDS", "10000,50,100"))
+if GC_THRESHOLDS:
+    gc.set_threshold(*GC_THRESHOLDS)
+gc_monitor = GCMonitor(metrics, "model_service")
+gc_monitor.install()
+
+socket_request_seconds = metrics.histogram(
+    "model_service_socket_request_seconds",
+    "Time to score one request from the binary socket",
+    ("model", "version")
+)
+
+metrics.callback("model_service_inference_pending",
+                 "Requests queued or running on the inference executor",
+                 lambda: inference.pending)
+metrics.callback("model_service_inference_rejected_total",
+                 "Requests rejected because the inference queue was full",
+                 lambda: inference.rejected, kind="counter")
+if admission is not None:
+    metrics.callback("model_service_admission_inflight",
+                     "Requests admitted and not yet answered",
+                     lambda: admission.inflight)
+    metrics.callback("model_service_admission_queued",
+                     "Requests waiting for admission",
+                     lambda: admission.queued)
+metrics.callback("model_service_coalesced_requests_total",
+                 "Requests that shared the evaluation of an identical in-flight request",
+                 lambda: coalescer.coalesced, kind="counter")
+metrics.callback("model_service_batch_job_rows_total",
+                 "Rows scored by batch jobs",
+                 lambda: batch_jobs.rows_scored, kind="counter")
+metrics.callback("model_service_prediction_cache_hits_total",
+                 "Rows served from the prediction cache",
+                 lambda: prediction_cache.hits, kind="counter")
+metrics.callback("model_service_prediction_cache_misses_total",
+                 "Rows sent to the model after a prediction cache miss",
+                 lambda: prediction_cache.misses, kind="counter")
 
 
 class PredictionRequest(BaseModel):
@@ -47,6 +287,20 @@ class PredictionResponse(BaseModel):
     model_name: str
 
 
+# /predict reads its body itself, so document the accepted formats here
+PREDICT_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "application/json": {"schema": PredictionRequest.model_json_schema()},
+        "application/x-npy": {"schema": {"type": "string", "format": "binary"}},
+        "application/octet-stream": {
+            "schema": {"type": "string", "format": "binary"},
+            "description": "Raw little-endian float32, shape in the X-Shape header"
+        }
+    }
+}
+
+
 class UpdateModelRequest(BaseModel):
     """Request model for updating the model"""
     model_name: str = Field(..., description="Name of the registered model in MLflow")
@@ -62,56 +316,394 @@ class UpdateModelRequest(BaseModel):
         }
 
 
+class BatchJobRequest(BaseModel):
+    """Batch job on a file already on the host"""
+    input_path: str = Field(..., description="Input file (.ndjson, .jsonl or .npy) under BATCH_INPUT_DIR")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "input_path": "/data/batch/wine_rows.ndjson"
+            }
+        }
+
+
+BATCH_JOB_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "application/json": {"schema": BatchJobRequest.model_json_schema()},
+        "application/x-ndjson": {
+            "schema": {"type": "string", "format": "binary"},
+            "description": "One JSON array of features per line"
+        },
+        "application/x-npy": {"schema": {"type": "string", "format": "binary"}}
+    }
+}
+
+
 class ModelInfo(BaseModel):
     """Model information"""
     model_name: str
     version: str
     loaded: bool
     mlflow_uri: str
+    memory_mb: Optional[float] = None
+    resolved_uri: Optional[str] = None
+    artifact_source: Optional[str] = None
+    shared_arrays: Optional[str] = None
+    warmup: Optional[dict] = None
+    native: Optional[dict] = None
+
+
+def load_sklearn_model(uri: str):
+    """mlflow.sklearn.load_model(), importing mlflow on first use."""
+    # Deferred: importing mlflow takes seconds, and /health must answer first
+    import mlflow.sklearn
+    return mlflow.sklearn.load_model(uri)
 
 
 def load_model_from_mlflow(model_name: str = None, version: int = None, 
                            run_id: str = None):
-    """Load model from MLflow."""
-    global current_model, current_model_info
-    
-    try:
-        if run_id:
-            # Load from specific run
-            model_uri = f"runs:/{run_id}/model"
-            logger.info(f"Loading model from run: {run_id}")
-            
-        elif model_name and version:
-            # Load specific version
-            model_uri = f"models:/{model_name}/{version}"
-            logger.info(f"Loading model: {model_name} version {version}")
-            
-        elif model_name:
-            # Load latest version
-            model_uri = f"models:/{model_name}/latest"
-            logger.info(f"Loading latest version of model: {model_name}")
-            
-        else:
-            raise ValueError("Must provide either model_name or run_id")
-        
-        # Load the model
-        current_model = mlflow.sklearn.load_model(model_uri)
+    """Load model from MLflow. Blocking; returns a ServedModel."""
+    if run_id:
+        # Load from specific run
+        model_uri = f"runs:/{run_id}/model"
+        logger.info(f"Loading model from run: {run_id}")
         
-        # Store model info
-        current_model_info = {
-            "model_name": model_name or "unknown",
-            "version": str(version) if version else "latest",
-            "model_uri": model_uri,
-            "loaded": True
-        }
+    elif model_name and version:
+        # Load specific version
+        model_uri = f"models:/{model_name}/{version}"
+        logger.info(f"Loading model: {model_name} version {version}")
         
-        logger.info(f"✓ Model loaded successfully: {model_uri}")
-        return True
+    elif model_name:
+        # Load latest version
+        model_uri = f"models:/{model_name}/latest"
+        logger.info(f"Loading latest version of model: {model_name}")
         
+    else:
+        raise ValueError("Must provide either model_name or run_id")
+    
+    info = {
+        "model_name": model_name or "unknown",
+        "version": str(version) if version else "latest",
+        "model_uri": model_uri,
+        "loaded": True
+    }
+    
+    # Load the model, through the local artifact cache when enabled
+    if artifact_cache is not None:
+        # The cached copy is not evicted while the model is read from it
+        with artifact_cache.fetch(model_uri) as artifact:
+            info["resolved_uri"] = artifact["resolved_uri"]
+            info["content_hash"] = artifact["content_hash"]
+            info["artifact_source"] = artifact["source"]
+            model = load_model_files(artifact["local_path"], info)
+    else:
+        model = load_model_files(model_uri, info)
+    info["n_jobs_params"] = governor.configure_model(model)
+    
+    info["loaded_at"] = datetime.now().isoformat()
+    if "shared_arrays" in info:
+        # Mapped pages are counted once per host
+        info["memory_bytes"] = shared_size(info["shared_arrays"])
+    else:
+        # Process runners hold one copy of the model per worker
+        copies = inference.workers if inference.kind == "process" else 1
+        info["memory_bytes"] = estimate_model_bytes(model) * copies
+    
+    logger.info(f"✓ Model loaded successfully: {model_uri}")
+    return ServedModel(model=model, info=info)
+
+
+def load_model_files(load_uri: str, info: dict):
+    """Load a model from a URI or a local directory."""
+    if SHARE_MODEL_ARRAYS:
+        return load_shared_model(load_uri, info)
+    return load_sklearn_model(load_uri)
+
+
+def load_shared_model(load_uri: str, info: dict):
+    """
+    Load a model with its arrays memory-mapped from SHARED_MODEL_DIR.
+    Only the first worker to load an artifact unpickles and exports it;
+    the others map the export. Falls back to a private copy on failure.
+    """
+    if info.get("content_hash"):
+        return load_shared_files(load_uri, info["content_hash"], info)
+    
+    # Without the artifact cache there is no content hash: hash the files of
+    # a download. Unpickling the model to hash it would defeat the sharing.
+    import mlflow.artifacts
+    with tempfile.TemporaryDirectory(prefix="model-download-") as tmp:
+        local_path = mlflow.artifacts.download_artifacts(artifact_uri=load_uri, dst_path=tmp)
+        info["content_hash"] = hash_directory(local_path)[0]
+        return load_shared_files(local_path, info["content_hash"], info)
+
+
+def load_shared_files(load_uri: str, key: str, info: dict):
+    """load_shared_model() for an artifact with a known content hash."""
+    loaded = []
+    
+    def load():
+        if not loaded:
+            loaded.append(load_sklearn_model(load_uri))
+        return loaded[0]
+    
+    def verify(shared, model):
+        n_features = getattr(model, "n_features_in_", None)
+        if n_features:
+            X = warmup_batches(n_features, warmup_rows.sample(n_features), (1024,))[1024]
+            verify_shared(shared, model, X)
+    
+    try:
+        shared = share_model(SHARED_MODEL_DIR, key, load, verify)
     except Exception as e:
-        logger.error(f"Failed to load model: {str(e)}")
-        current_model_info = {"loaded": False, "error": str(e)}
+        logger.error(f"Could not share model arrays, keeping a private copy: {str(e)}")
+        return load()
+    info["shared_arrays"] = shared_path(SHARED_MODEL_DIR, key)
+    logger.info(f"Model arrays memory-mapped from {info['shared_arrays']}")
+    return shared
+
+
+def acquire_served_model() -> Optional[ServedModel]:
+    """
+    Snapshot the served model and hold its runner for one request.
+    The caller must release the runner once the request is done.
+    """
+    while True:
+        served = served_model
+        if served is None or served.runner.acquire():
+            return served
+        # Retired between the read and the acquire: take the new model
+
+
+def load_resident_model(model_name: str, version: int = None) -> ServedModel:
+    """Load a model selected by a request, ready to serve. Blocking."""
+    served = load_model_from_mlflow(model_name, version)
+    served = replace(served, runner=inference.create_runner(served.model))
+    if ENABLE_WARMUP:
+        try:
+            served.info["warmup"] = warm_up_model(served)
+        except Exception:
+            served.runner.retire()
+            raise
+    return served
+
+
+def default_model_bytes() -> int:
+    served = served_model
+    return served.info["memory_bytes"] if served is not None else 0
+
+
+residency = ModelResidency(
+    load_resident_model,
+    max_mb=MODEL_MEMORY_BUDGET_MB,
+    reserved_bytes=default_model_bytes,
+    on_evict=lambda served: prediction_cache.invalidate(served.key)
+) if MODEL_MEMORY_BUDGET_MB > 0 else None
+
+
+async def select_model(model_name: Optional[str], version: Optional[int]) -> ServedModel:
+    """
+    Acquire the model a request selects, defaulting to the served model.
+    A selector naming the served model (without a version, or with its
+    version) uses it; anything else is served from the resident models.
+    """
+    default = served_model
+    if default is not None and model_name in (None, default.info["model_name"]) and (
+            version is None or str(version) == default.info["version"]):
+        served = acquire_served_model()
+    elif model_name is None and version is None:
+        served = None
+    else:
+        if residency is None:
+            raise HTTPException(status_code=400, detail="Model selection is disabled "
+                                                        "(MODEL_MEMORY_BUDGET_MB=0)")
+        if model_name is None:
+            if default is None:
+                raise HTTPException(status_code=400, detail="A version needs a model name "
+                                                            "when no model is loaded")
+            model_name = default.info["model_name"]
+        try:
+            return await residency.acquire(model_name, version)
+        except Exception as e:
+            logger.error(f"Failed to load model {model_name} version {version}: {str(e)}")
+            raise HTTPException(status_code=503,
+                                detail=f"Model {model_name} version {version or 'latest'} "
+                                       f"is not available: {str(e)}")
+    
+    if served is None:
+        raise HTTPException(
+            status_code=400, 
+            detail="No model loaded. Use /update-model to load a model first."
+        )
+    return served
+
+
+def warm_up_model(served: ServedModel) -> dict:
+    """
+    Run the new model through its runner on batches of several sizes.
+    Raises RuntimeError if the warm latency exceeds the configured budget.
+    """
+    n_features = getattr(served.model, "n_features_in_", None)
+    recorded = warmup_rows.sample(n_features)
+    if recorded is None and not n_features:
+        return {"skipped": "unknown number of features and no recorded rows"}
+    
+    start = time.perf_counter()
+    batches = warmup_batches(n_features, recorded, WARMUP_BATCH_SIZES)
+    results = run_warmup(lambda X: served.runner.submit(X).result(), batches, WARMUP_REPEATS)
+    report = {
+        "source": "recorded" if recorded is not None else "synthetic",
+        "batches": results,
+        "duration_s": round(time.perf_counter() - start, 3)
+    }
+    logger.info(f"Warm-up ({report['source']} rows): {results}")
+    
+    violations = over_budget(results, WARMUP_BUDGET)
+    if violations:
+        raise RuntimeError(f"Warm latency over budget ({'; '.join(violations)})")
+    return report
+
+
+def service_idle() -> bool:
+    """True when no admitted request and no user of the served model is in flight."""
+    if admission is not None and admission.inflight:
         return False
+    served = served_model
+    return served is None or served.runner.in_use == 0
+
+
+def run_load_job(job: dict, model_name: str = None, version: int = None,
+                 run_id: str = None):
+    """Load a model in the background and publish it when fully loaded."""
+    global served_model
+    
+    job["status"] = "loading"
+    job["started_at"] = datetime.now().isoformat()
+    start = time.perf_counter()
+    
+    try:
+        new_model = load_model_from_mlflow(model_name, version, run_id)
+        # Start the inference workers before the model is published
+        new_model = replace(new_model, runner=inference.create_runner(new_model.model))
+        if ENABLE_WARMUP:
+            try:
+                new_model.info["warmup"] = warm_up_model(new_model)
+            except Exception:
+                new_model.runner.retire()
+                raise
+    except Exception as e:
+        logger.error(f"Failed to load model: {str(e)}")
+        status = "failed"
+        job["error"] = str(e)
+    else:
+        # Single reference assignment: the swap is atomic for readers.
+        old_model, served_model = served_model, new_model
+        if old_model is not None:
+            old_model.runner.retire()
+            prediction_cache.invalidate(old_model.key)
+        # Drop this frame's reference, so the freeze below collects the old
+        # model rather than freezing it with the new one
+        old_model = None
+        status = "succeeded"
+        startup_profile.mark("first_model_loaded")
+        job["model_info"] = new_model.info
+        if artifact_cache is not None:
+            artifact_cache.remember_served(
+                {"model_name": model_name, "version": version, "run_id": run_id})
+    
+    job["finished_at"] = datetime.now().isoformat()
+    job["duration_s"] = round(time.perf_counter() - start, 3)
+    # Set last so pollers that see a final status also see the timings
+    job["status"] = status
+    
+    if status == "succeeded" and GC_FREEZE_AFTER_LOAD:
+        new_model.info["gc_freeze"] = gc_monitor.freeze(
+            idle=service_idle, max_wait=GC_FREEZE_MAX_WAIT_S)
+    if status == "succeeded" and ENABLE_NATIVE:
+        # Queued behind this job on the loader thread, so no load can
+        # publish a model while the native build decides whether to swap
+        new_model.info["native"] = {"status": "building"}
+        load_executor.submit(run_native_build, new_model)
+
+
+def native_verify_rows(model) -> Optional[np.ndarray]:
+    """
+    Rows to check a native predictor on: recent traffic, plus rows on every
+    split threshold for tree models. Generated noise would not do: features
+    such as proline are in the thousands, so it would rarely reach the
+    thresholds that matter. None when there is neither.
+    """
+    n_features = getattr(model, "n_features_in_", None)
+    rows = []
+    recorded = warmup_rows.sample(n_features)
+    if recorded is not None:
+        rows.append(warmup_batches(n_features, recorded, (NATIVE_VERIFY_ROWS,))[NATIVE_VERIFY_ROWS])
+    boundary = native.boundary_rows(model, NATIVE_VERIFY_ROWS)
+    if boundary is not None:
+        rows.append(boundary)
+    return np.vstack(rows) if rows else None
+
+
+def run_native_build(base: ServedModel):
+    """
+    Build a native predictor for a published model and swap it in if its
+    predictions match sklearn. The sklearn model keeps serving otherwise.
+    """
+    global served_model
+    
+    status = base.info["native"]
+    start = time.perf_counter()
+    try:
+        X = native_verify_rows(base.model)
+        if X is None:
+            logger.info("Native serving not enabled: no recorded traffic to verify it against")
+            status.update(status="unverified",
+                          error="No recorded traffic to verify the native predictor against")
+            return
+        predictor = native.build_native_predictor(base.model, NATIVE_BUILD_DIR, NATIVE_OPTIONS)
+        status["verification"] = native.verify_native(predictor, base.model, X)
+        runner = inference.create_runner(predictor)
+    except ValueError as e:
+        logger.info(f"Native serving not available for this model: {e}")
+        status.update(status="unsupported", error=str(e))
+        return
+    except Exception as e:
+        logger.error(f"Native build failed, keeping sklearn: {str(e)}")
+        status.update(status="failed", error=str(e))
+        return
+    
+    status["build_s"] = round(time.perf_counter() - start, 3)
+    if served_model is not base:
+        # Replaced while building (only possible if the loader was bypassed)
+        runner.retire()
+        status["status"] = "superseded"
+        return
+    
+    # A new key: regressors only match sklearn within a tolerance
+    served_model = replace(base, model=predictor, runner=runner, key=uuid.uuid4().hex)
+    base.runner.retire()
+    prediction_cache.invalidate(base.key)
+    status.update(status="active", library=predictor.library_path)
+    logger.info(f"✓ Serving native predictor ({predictor.kind}) in {status['build_s']}s")
+
+
+def submit_load_job(model_name: str = None, version: int = None, run_id: str = None) -> dict:
+    """Queue a model loading job and return it."""
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "status": "queued",
+        "request": {"model_name": model_name, "version": version, "run_id": run_id},
+        "submitted_at": datetime.now().isoformat()
+    }
+    load_jobs[job_id] = job
+    while len(load_jobs) > MAX_LOAD_JOBS:
+        load_jobs.pop(next(iter(load_jobs)))
+    
+    load_executor.submit(run_load_job, job, model_name=model_name, version=version, run_id=run_id)
+    return job
 
 
 @app.on_event("startup")
@@ -119,13 +711,39 @@ async def startup_event():
     """Load model on startup."""
     logger.info("Starting Model Service...")
     
-    # Try to load default model
-    # This will be updated via /update-model endpoint
-    mlflow.set_tracking_uri("http://mlflow:5000")
+    logger.info(f"MLflow tracking URI: {os.environ['MLFLOW_TRACKING_URI']}")
+    
+    if ENABLE_MICRO_BATCHING:
+        batcher.start()
+        logger.info(f"Micro-batching enabled (max_batch_rows={batcher.max_batch_rows}, "
+                    f"max_wait_ms={batcher.max_wait * 1000:g})")
+    
+    if socket_server is not None:
+        await socket_server.start()
     
+    if artifact_cache is not None and RESTORE_LAST_MODEL and artifact_cache.last_served:
+        # Pinned versions load from local disk even if MLflow is unreachable
+        job = submit_load_job(**artifact_cache.last_served)
+        logger.info(f"Restoring last served model {artifact_cache.last_served} (job {job['job_id']})")
+    
+    startup_profile.mark("started")
     logger.info("Model Service started. Use /update-model to load a model.")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work."""
+    if socket_server is not None:
+        await socket_server.stop()
+    await batcher.stop()
+    if served_model is not None:
+        served_model.runner.retire()
+    batch_jobs.shutdown()
+    if residency is not None:
+        residency.shutdown()
+    inference.shutdown()
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -135,9 +753,16 @@ async def root():
         "endpoints": {
             "GET /": "This help message",
             "POST /predict": "Make predictions",
-            "POST /update-model": "Update the model",
+            "POST /predict/stream": "Stream predictions for NDJSON rows",
+            "POST /update-model": "Start loading a new model (returns a job id)",
+            "GET /update-model/{job_id}": "Model loading job status",
             "GET /model-info": "Get current model information",
-            "GET /health": "Health check"
+            "GET /models": "List models loaded by per-request selection",
+            "POST /batch-jobs": "Submit a batch scoring job (returns a job id)",
+            "GET /batch-jobs/{job_id}": "Batch job status and progress",
+            "GET /batch-jobs/{job_id}/output": "Download batch job predictions",
+            "GET /health": "Health check",
+            "GET /metrics": "Prometheus metrics"
         }
     }
 
@@ -145,73 +770,463 @@ async def root():
 @app.get("/health")
 async def health():
     """Health check endpoint"""
+    served = served_model
     return {
         "status": "healthy",
-        "model_loaded": current_model is not None
+        "model_loaded": served is not None,
+        "batching": {
+            "enabled": ENABLE_MICRO_BATCHING,
+            **batcher.stats.as_dict()
+        },
+        "inference": inference.stats(),
+        "admission": admission.stats() if admission is not None else None,
+        "batch_jobs": batch_jobs.stats(),
+        "coalescing": {
+            "enabled": ENABLE_COALESCING,
+            **coalescer.stats()
+        },
+        "prediction_cache": prediction_cache.stats(),
+        "artifact_cache": artifact_cache.stats() if artifact_cache is not None else None,
+        "residency": residency.stats() if residency is not None else None,
+        "socket": socket_server.stats() if socket_server is not None else None,
+        "startup": startup_profile.as_dict(),
+        "threads": governor.stats(),
+        "gc": gc_monitor.stats(),
+        "native": {
+            "enabled": ENABLE_NATIVE,
+            "available": native.AVAILABLE,
+            "active": served is not None and isinstance(served.model, native.NativePredictor)
+        }
     }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    return Response(content=metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.get("/model-info", response_model=ModelInfo)
 async def get_model_info():
     """Get information about the currently loaded model"""
-    if not current_model:
+    served = served_model
+    if served is None:
         raise HTTPException(status_code=404, detail="No model loaded")
     
     return ModelInfo(
-        model_name=current_model_info.get("model_name", "unknown"),
-        version=current_model_info.get("version", "unknown"),
+        model_name=served.info.get("model_name", "unknown"),
+        version=served.info.get("version", "unknown"),
         loaded=True,
-        mlflow_uri=current_model_info.get("model_uri", "unknown")
+        mlflow_uri=served.info.get("model_uri", "unknown"),
+        memory_mb=round(served.info["memory_bytes"] / 1024 / 1024, 2),
+        resolved_uri=served.info.get("resolved_uri"),
+        artifact_source=served.info.get("artifact_source"),
+        shared_arrays=served.info.get("shared_arrays"),
+        warmup=served.info.get("warmup"),
+        native=served.info.get("native")
     )
 
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
-    """Make predictions using the loaded model"""
-    if current_model is None:
-        raise HTTPException(
-            status_code=400, 
-            detail="No model loaded. Use /update-model to load a model first."
-        )
+@app.get("/models")
+async def list_models():
+    """List the default model and the models resident for per-request selection"""
+    served = served_model
+    return {
+        "default": served.info if served is not None else None,
+        "resident": residency.models() if residency is not None else [],
+        "memory": residency.stats() if residency is not None else None
+    }
+
+
+async def predict_rows(served: ServedModel, X: np.ndarray) -> np.ndarray:
+    """Make predictions, stacked with concurrent requests when batching."""
+    if ENABLE_MICRO_BATCHING and X.ndim == 2:
+        return await batcher.predict(served, X)
+    return await run_inference(served, X)
+
+
+async def predict_with_cache(served: ServedModel, X: np.ndarray) -> np.ndarray:
+    """Serve cached rows and only send the cache misses to the model."""
+    keys, cached, missing = prediction_cache.lookup(served.key, X)
+    if len(missing) == 0:
+        return np.asarray(cached)
     
+    fresh = await predict_rows(served, X if len(missing) == len(X) else X[missing])
+    # Skip stale results computed by a model that was swapped out meanwhile
+    if served is served_model or (residency is not None and residency.is_resident(served)):
+        prediction_cache.store(keys, missing, fresh)
+    return prediction_cache.merge(cached, missing, fresh)
+
+
+async def score_rows(served: ServedModel, X: np.ndarray) -> np.ndarray:
+    """Predict X with served, through the prediction cache when enabled."""
+    if prediction_cache.accepts(X):
+        predictions = await predict_with_cache(served, X)
+    else:
+        predictions = await predict_rows(served, X)
+    startup_profile.mark("first_prediction")
+    return predictions
+
+
+async def score_reserved(served: ServedModel, X: np.ndarray) -> np.ndarray:
+    """score_rows() holding an inference queue slot."""
+    with inference.reserve():
+        return await score_rows(served, X)
+
+
+async def score_request(served: ServedModel, X: np.ndarray) -> np.ndarray:
+    """
+    Score one request's rows, sharing the evaluation with identical requests
+    in flight for the same loaded model. Raises ExecutorBusy if the
+    inference queue is full.
+    """
+    if not ENABLE_COALESCING:
+        return await score_reserved(served, X)
+    # id() tells apart two loads of the same URI; served stays referenced while in flight
+    key = (served.info["model_uri"], id(served), rows_key(X))
+    return await coalescer.run(key, lambda: score_reserved(served, X))
+
+
+@app.post("/predict", response_model=PredictionResponse,
+          openapi_extra={"requestBody": PREDICT_REQUEST_BODY})
+async def predict(request: Request, model: Optional[str] = None, version: Optional[int] = None):
+    """
+    Make predictions using the loaded model, or the model and version
+    selected with the model/version query parameters.
+    Accepts JSON (default), .npy or raw float32 bodies; predictions are
+    returned as .npy or raw float32 when the Accept header asks for it.
+    """
+    timer = StageTimer()
+    if admission is None:
+        return await predict_request(request, model, version, timer)
+    
+    client_id = request.headers.get(CLIENT_ID_HEADER) or (request.client.host if request.client else None)
     try:
-        # Convert to numpy array
-        X = np.array(request.features)
+        async with admission.admit(client_id):
+            timer.mark("admission")
+            return await predict_request(request, model, version, timer)
+    except Rejected as e:
+        admission_rejected_total.inc(e.reason)
+        raise HTTPException(status_code=e.status_code, detail=str(e),
+                            headers={"Retry-After": e.retry_after})
+
+
+async def predict_request(request: Request, model: Optional[str], version: Optional[int],
+                          timer: StageTimer) -> Response:
+    """Read, score and answer one /predict request."""
+    content_type = media_type(request.headers.get("content-type"))
+    body = await request.body()
+    timer.mark("body_read")
+    try:
+        if content_type in BINARY_CONTENT_TYPES:
+            X = decode_features(body, content_type, request.headers)
+            timer.mark("parse")
+        else:
+            payload = json.loads(body)
+            timer.mark("parse")
+            features = PredictionRequest.model_validate(payload).features
+            timer.mark("validation")
+            X = np.array(features)
+            timer.mark("array_build")
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json(include_url=False)))
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON body: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Hold one model for the whole request so a concurrent swap cannot mix versions
+    served = await select_model(model, version)
+    
+    warmup_rows.record(X)
+    try:
+        predictions = await score_request(served, X)
+        timer.mark("predict")
         
-        # Make predictions
-        predictions = current_model.predict(X)
+        accept = media_type(request.headers.get("accept"))
+        if accept in BINARY_CONTENT_TYPES:
+            content, headers = encode_predictions(predictions, accept)
+            headers["X-Model-Name"] = served.info.get("model_name", "unknown")
+            headers["X-Model-Version"] = served.info.get("version", "unknown")
+            response = Response(content=content, media_type=accept, headers=headers)
+        else:
+            # Serialize here rather than through response_model so it is timed
+            content = PredictionResponse(
+                predictions=predictions.tolist(),
+                model_version=served.info.get("version", "unknown"),
+                model_name=served.info.get("model_name", "unknown")
+            ).model_dump_json()
+            response = Response(content=content, media_type="application/json")
+        timer.mark("serialization")
         
-        return PredictionResponse(
-            predictions=predictions.tolist(),
-            model_version=current_model_info.get("version", "unknown"),
-            model_name=current_model_info.get("model_name", "unknown")
-        )
+        timer.observe(predict_stage_seconds, *model_labels(served))
+        return response
         
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+    finally:
+        served.runner.release()
+
+
+async def predict_socket(X: np.ndarray) -> np.ndarray:
+    """Score one request frame from the binary socket with the served model."""
+    start = time.perf_counter()
+    served = acquire_served_model()
+    if served is None:
+        raise RequestFailed(STATUS_NO_MODEL, "No model loaded. Use /update-model to load a model first.")
+    
+    warmup_rows.record(X)
+    try:
+        predictions = await score_request(served, X)
+    except ExecutorBusy as e:
+        raise RequestFailed(STATUS_BUSY, str(e))
+    finally:
+        served.runner.release()
+    socket_request_seconds.observe(time.perf_counter() - start, *model_labels(served))
+    return predictions
+
+
+socket_server = SocketPredictionServer(
+    predict_socket,
+    SOCKET_PATH,
+    max_pipeline=int(os.environ.get("SOCKET_MAX_PIPELINE", "64")),
+    max_frame_mb=float(os.environ.get("SOCKET_MAX_FRAME_MB", "64"))
+) if SOCKET_PATH else None
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that can stream while the request body is still
+    being read. The stock class may consume receive() to watch for
+    disconnects, which would swallow the remaining request body.
+    The background task runs even if the response could not be sent, so
+    it can release what the stream holds.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        finally:
+            if self.background is not None:
+                await self.background()
+
+
+async def score_ndjson_lines(served: ServedModel, lines: list) -> str:
+    """Score a chunk of NDJSON rows and return the NDJSON predictions."""
+    X = np.array(json.loads(b"[" + b",".join(lines) + b"]"), dtype=float)
+    if X.ndim != 2:
+        raise ValueError("Each line must be a JSON array of feature values")
+    predictions = await run_inference(served, X)
+    return "".join(json.dumps(p) + "\n" for p in predictions.tolist())
+
+
+async def stream_predictions(request: Request, served: ServedModel):
+    """Score the request body chunk by chunk while it is being uploaded."""
+    pending = b""
+    lines = []
+    try:
+        async for data in request.stream():
+            pending += data
+            *complete, pending = pending.split(b"\n")
+            lines.extend(line for line in complete if line.strip())
+            while len(lines) >= STREAM_CHUNK_ROWS:
+                chunk, lines = lines[:STREAM_CHUNK_ROWS], lines[STREAM_CHUNK_ROWS:]
+                yield await score_ndjson_lines(served, chunk)
+        
+        if pending.strip():
+            lines.append(pending)
+        if lines:
+            yield await score_ndjson_lines(served, lines)
+    except Exception as e:
+        # The status line is already sent; report the error in-band
+        logger.error(f"Streaming prediction error: {str(e)}")
+        yield json.dumps({"error": f"Prediction failed: {str(e)}"}) + "\n"
+
+
+async def release_stream(served: ServedModel):
+    """
+    Give back the queue slot and the model held by a stream. A coroutine
+    without awaits, so it completes even when the response was cancelled.
+    """
+    inference.release_slot()
+    served.runner.release()
+
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request, model: Optional[str] = None,
+                         version: Optional[int] = None):
+    """
+    Stream predictions for newline-delimited JSON rows.
+    Each input line is one row (a JSON array of features); each output line
+    is the prediction for the matching row, sent as soon as its chunk of
+    STREAM_CHUNK_ROWS rows is scored. The model is selected as for /predict.
+    """
+    served = await select_model(model, version)
+    
+    # Keep a queue slot for the whole stream
+    try:
+        inference.acquire_slot()
+    except ExecutorBusy as e:
+        served.runner.release()
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    return DuplexStreamingResponse(
+        stream_predictions(request, served),
+        media_type="application/x-ndjson",
+        headers={
+            "X-Model-Name": served.info.get("model_name", "unknown"),
+            "X-Model-Version": served.info.get("version", "unknown")
+        },
+        # Released by the response, not the body generator: the generator
+        # never runs if the client is gone before the body starts
+        background=BackgroundTask(release_stream, served)
+    )
 
 
-@app.post("/update-model")
+@app.post("/update-model", status_code=202)
 async def update_model(request: UpdateModelRequest):
-    """Update the model from MLflow"""
-    success = load_model_from_mlflow(
+    """
+    Start loading a model from MLflow in the background.
+    The current model keeps serving until the new one is fully loaded.
+    """
+    job = submit_load_job(
         model_name=request.model_name,
         version=request.version,
         run_id=request.run_id
     )
     
-    if success:
-        return {
-            "status": "success",
-            "message": "Model updated successfully",
-            "model_info": current_model_info
-        }
+    return {
+        "status": "accepted",
+        "message": "Model loading started",
+        "job_id": job["job_id"],
+        "status_url": f"/update-model/{job['job_id']}"
+    }
+
+
+@app.get("/update-model/{job_id}")
+async def get_update_model_job(job_id: str):
+    """Get the status of a model loading job"""
+    job = load_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+def batch_input_path(input_path: str) -> str:
+    """Resolve a batch input path, which must be a file under BATCH_INPUT_DIR."""
+    if not BATCH_INPUT_DIR:
+        raise HTTPException(status_code=400, detail="Batch jobs on host files are disabled "
+                                                    "(BATCH_INPUT_DIR is not set); upload the input")
+    try:
+        return resolve_input_path(BATCH_INPUT_DIR, input_path)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Input files must be under {BATCH_INPUT_DIR}")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Input file not found: {input_path}")
+
+
+async def spool_upload(request: Request, path: str):
+    """Write the request body to path as it arrives."""
+    try:
+        await spool(request.stream(), path, int(BATCH_MAX_UPLOAD_MB * 1024 * 1024))
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {BATCH_MAX_UPLOAD_MB:g} MB")
+
+
+@app.post("/batch-jobs", status_code=202, openapi_extra={"requestBody": BATCH_JOB_REQUEST_BODY})
+async def create_batch_job(request: Request, model: Optional[str] = None,
+                           version: Optional[int] = None):
+    """
+    Submit a batch scoring job and return its id at once.
+    The body is either the input itself (NDJSON rows or a 2D .npy array),
+    spooled to disk, or a JSON {"input_path": ...} naming a file under
+    BATCH_INPUT_DIR. The model is selected as for /predict and kept for the
+    whole job. Poll /batch-jobs/{job_id} for progress, then download the
+    predictions (one JSON value per line) from /batch-jobs/{job_id}/output.
+    """
+    content_type = media_type(request.headers.get("content-type"))
+    if content_type == "application/json":
+        try:
+            spec = BatchJobRequest.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=json.loads(e.json(include_url=False)))
+        input_path = batch_input_path(spec.input_path)
+        input_format = INPUT_EXTENSIONS.get(os.path.splitext(input_path)[1].lower())
+        if input_format is None:
+            raise HTTPException(status_code=400, detail=f"Unsupported input file type, expected "
+                                                        f"one of {sorted(INPUT_EXTENSIONS)}")
+    elif content_type in INPUT_FORMATS:
+        input_path = None
+        input_format = INPUT_FORMATS[content_type]
     else:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to load model: {current_model_info.get('error', 'Unknown error')}"
-        )
+        raise HTTPException(status_code=415, detail=f"Unsupported content type '{content_type}', "
+                                                    f"expected application/json or one of "
+                                                    f"{sorted(INPUT_FORMATS)}")
+    
+    # Held until the job is over, so the whole job is scored by one model
+    served = await select_model(model, version)
+    job = None
+    try:
+        job = batch_jobs.create(input_format, served.info, input_path)
+        if input_path is None:
+            await spool_upload(request, batch_jobs.upload_path(job))
+    except BaseException:
+        if job is not None:
+            batch_jobs.discard(job)
+        served.runner.release()
+        raise
+    
+    # Chunks go straight to the model's runner: they take one inference
+    # worker at a time and never enter the batching or admission queues
+    batch_jobs.submit(job, predict=lambda X: served.runner.submit(X).result(),
+                      release=served.runner.release)
+    return {
+        "status": "accepted",
+        "job_id": job["job_id"],
+        "status_url": f"/batch-jobs/{job['job_id']}",
+        "output_url": f"/batch-jobs/{job['job_id']}/output"
+    }
+
+
+@app.get("/batch-jobs")
+async def list_batch_jobs():
+    """List batch jobs, oldest first"""
+    return {"jobs": batch_jobs.jobs()}
+
+
+@app.get("/batch-jobs/{job_id}")
+async def get_batch_job(job_id: str):
+    """Get the status and progress of a batch job"""
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch job: {job_id}")
+    return job
+
+
+@app.get("/batch-jobs/{job_id}/output")
+async def get_batch_job_output(job_id: str):
+    """Stream the predictions of a finished batch job from disk"""
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch job: {job_id}")
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Batch job is {job['status']}")
+    return FileResponse(batch_jobs.output_path(job_id), media_type="application/x-ndjson",
+                        filename=f"predictions-{job_id}.ndjson")
+
+
+@app.delete("/batch-jobs/{job_id}")
+async def delete_batch_job(job_id: str):
+    """Cancel a batch job and delete its files"""
+    if not batch_jobs.cancel(job_id):
+        raise HTTPException(status_code=404, detail=f"Unknown batch job: {job_id}")
+    return {"status": "success", "message": f"Batch job {job_id} cancelled"}
+
+
+startup_profile.mark("imported")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+"""
+Modules shared by the Part 2 model service and the Part 3 canary service:
+Prometheus metrics, garbage collector tuning, thread governor and startup
+profiling.
+"""
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Low-overhead metrics for the model services.
+Fixed-bucket histograms and counters, rendered in the Prometheus text
+exposition format for a /metrics endpoint.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from 50µs to 10s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Rows per model call, for the histograms and the micro-batcher's /health counts
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed bucket bounds.
+
+    observe() is a bisect plus two additions under a lock; the cumulative
+    counts Prometheus expects are only computed when rendering.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Bucket counts, then the +Inf count and the sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket"
+                             f"{_format_labels(self.label_names, label_values, le)} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter."""
+
+    def __init__(self, name: str, documentation: str, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in sorted(series.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} "
+                         f"{_format_value(value)}")
+        return lines
+
+
+class CallbackMetric:
+    """Gauge or counter whose value is read from a callback when rendering."""
+
+    def __init__(self, name: str, documentation: str, callback, kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.kind = kind
+
+    def render(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}",
+                f"{self.name} {_format_value(self.callback())}"]
+
+
+class MetricsRegistry:
+    """A set of metrics rendered together at /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def counter(self, name, documentation, label_names=()):
+        return self.register(Counter(name, documentation, label_names))
+
+    def callback(self, name, documentation, callback, kind="gauge"):
+        return self.register(CallbackMetric(name, documentation, callback, kind))
+
+    def register(self, metric):
+        """Add a metric created elsewhere; anything with a render() method."""
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """
+    Times consecutive stages of one request.
+
+        timer = StageTimer()
+        body = await request.body()
+        timer.mark("body_read")
+        ...
+        timer.observe(histogram, model_name, version)
+    """
+
+    __slots__ = ("start", "_last", "stages")
+
+    def __init__(self):
+        self.start = self._last = time.perf_counter()
+        self.stages = []
+
+    def mark(self, stage: str):
+        """Close the current stage under the given name."""
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    def observe(self, histogram: Histogram, *label_values):
+        """Record every stage plus the total, labelled (stage, *label_values)."""
+        for stage, elapsed in self.stages:
+            histogram.observe(elapsed, stage, *label_values)
+        histogram.observe(self._last - self.start, "total", *label_values)
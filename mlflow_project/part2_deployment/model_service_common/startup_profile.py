@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Startup profiling for the model services.
+
+In the services, StartupProfile records when the process reached each
+startup milestone (module imported, listening, first model loaded, first
+prediction), shown under "startup" in /health.
+
+As a command, it starts a service, measures time-to-listen and
+time-to-first-prediction from the outside and fails when they exceed a
+budget, so that startup regressions are caught:
+
+    python -m model_service_common.startup_profile --model-name wine_classification_model \\
+        --max-listen-s 2 --max-first-prediction-s 10
+    python -m model_service_common.startup_profile --app canary_service:app --app-dir ../part3_canary
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+WINE_ROW = [14.23, 1.71, 2.43, 15.6, 127.0, 2.8, 3.06, 0.28, 2.29, 5.64, 1.04, 3.92, 1065.0]
+
+
+def process_uptime():
+    """Seconds since this process started, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces: fields start after ')'
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile:
+    """First time each startup milestone was reached, in seconds since process start."""
+
+    def __init__(self):
+        # Fallback origin when the process start time is unknown
+        self._origin = time.perf_counter() - (process_uptime() or 0.0)
+        self.marks = {}
+
+    def mark(self, milestone: str):
+        if milestone not in self.marks:
+            self.marks[milestone] = round(time.perf_counter() - self._origin, 3)
+
+    def as_dict(self):
+        return dict(self.marks)
+
+
+def _wait_for(check, timeout_s: float, interval_s: float = 0.01):
+    deadline = time.perf_counter() + timeout_s
+    while time.perf_counter() < deadline:
+        try:
+            result = check()
+            if result is not None:
+                return result
+        except Exception:
+            pass
+        time.sleep(interval_s)
+    raise TimeoutError(f"Gave up after {timeout_s:g}s")
+
+
+def profile_startup(args) -> dict:
+    """Start the service once and time its startup milestones."""
+    import requests
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    command = [sys.executable, "-m", "uvicorn", args.app, "--app-dir", args.app_dir,
+               "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"]
+    start = time.perf_counter()
+    service = subprocess.Popen(command)
+    report = {"app": args.app}
+    try:
+        def listening():
+            if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return True
+        _wait_for(listening, args.timeout_s)
+        report["time_to_listen_s"] = round(time.perf_counter() - start, 3)
+
+        if args.model_name:
+            response = requests.post(f"{base_url}/update-model", timeout=args.timeout_s,
+                                     json={"model_name": args.model_name, "version": args.version})
+            response.raise_for_status()
+            status_url = response.json().get("status_url")
+            if status_url:
+                # Background load: poll the job
+                def loaded():
+                    job = requests.get(f"{base_url}{status_url}", timeout=1).json()
+                    if job["status"] == "failed":
+                        raise SystemExit(f"Model load failed: {job.get('error')}")
+                    return job if job["status"] == "succeeded" else None
+                _wait_for(loaded, args.timeout_s, interval_s=0.05)
+            report["time_to_model_loaded_s"] = round(time.perf_counter() - start, 3)
+
+            response = requests.post(f"{base_url}/predict", json={"features": [args.features]},
+                                     timeout=args.timeout_s)
+            response.raise_for_status()
+            report["time_to_first_prediction_s"] = round(time.perf_counter() - start, 3)
+
+        report["service"] = requests.get(f"{base_url}/health", timeout=1).json().get("startup")
+    finally:
+        service.terminate()
+        service.wait(timeout=10)
+    return report
+
+
+def import_profile(args, top: int = 10) -> list:
+    """Slowest direct imports of the app module, from python -X importtime."""
+    module = args.app.split(":")[0]
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=args.app_dir, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under the module importing them, and
+        # listed before it: the app's own imports are one level deep
+        if name.startswith("   ") and not name.startswith("     "):
+            imports.append((name.strip(), int(cumulative_us) / 1e6))
+        elif name.strip() == module:
+            imports.append((f"{module} (total)", int(cumulative_us) / 1e6))
+    imports.sort(key=lambda item: item[1], reverse=True)
+    return [{"module": name, "cumulative_s": round(seconds, 3)} for name, seconds in imports[:top]]
+
+
+def check_budget(report: dict, args) -> list:
+    violations = []
+    for key, limit in (("time_to_listen_s", args.max_listen_s),
+                       ("time_to_first_prediction_s", args.max_first_prediction_s)):
+        if limit is not None and report.get(key) is not None and report[key] > limit:
+            violations.append(f"{key} = {report[key]}s > {limit:g}s")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure service startup times")
+    parser.add_argument("--app", default="model_service:app", help="uvicorn app (module:attribute)")
+    # The model service, in part2_deployment next to this package
+    parser.add_argument("--app-dir", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--model-name", help="Model to load for time-to-first-prediction")
+    parser.add_argument("--version", type=int, help="Model version (latest if not specified)")
+    parser.add_argument("--features", type=json.loads, default=WINE_ROW,
+                        help="Feature row (JSON array) for the first prediction")
+    parser.add_argument("--max-listen-s", type=float, help="Fail if listening takes longer")
+    parser.add_argument("--max-first-prediction-s", type=float,
+                        help="Fail if the first prediction takes longer")
+    parser.add_argument("--imports", action="store_true", help="Also list the slowest imports")
+    parser.add_argument("--timeout-s", type=float, default=120)
+    args = parser.parse_args()
+
+    report = profile_startup(args)
+    if args.imports:
+        report["slowest_imports"] = import_profile(args)
+    violations = check_budget(report, args)
+    report["violations"] = violations
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
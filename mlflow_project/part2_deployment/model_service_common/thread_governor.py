@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Thread governor for the model services.
+Scikit-learn ensembles fan out over joblib workers, and BLAS and OpenMP keep
+thread pools of their own sized to the whole machine. Every service worker
+doing so oversubscribes the cores. The governor sets n_jobs on loaded
+models, caps the native thread pools, and can pin each worker process to
+its own set of CPUs.
+"""
+
+import fcntl
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Read by the native libraries when they are loaded, including in spawned
+# inference workers and by libraries imported after the limits were applied
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                   "VECLIB_MAXIMUM_THREADS")
+
+# Set by a worker that claimed a CPU slot, for the processes it starts
+CPU_SLOT_ENV_VAR = "MODEL_SERVICE_CPU_SLOT"
+
+
+def parse_cpu_list(spec: str) -> list:
+    """Parse a Linux CPU list such as "0-3,8,10-11"."""
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def available_cpus() -> list:
+    """CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def set_model_n_jobs(model, n_jobs: int) -> list:
+    """Set every n_jobs parameter of a scikit-learn model; returns the names set."""
+    get_params = getattr(model, "get_params", None)
+    if get_params is None:
+        # Not a scikit-learn estimator (e.g. native or shared predictors)
+        return []
+    names = [name for name in get_params(deep=True)
+             if name == "n_jobs" or name.endswith("__n_jobs")]
+    if names:
+        model.set_params(**{name: n_jobs for name in names})
+    return names
+
+
+class ThreadGovernor:
+    """
+    Thread and CPU configuration of one service process.
+
+    model_n_jobs and blas_threads of 0 leave models and thread pools as
+    they are. cpu_affinity is a CPU list to pin the process to, or "auto"
+    to claim the next free slot of cpus_per_worker CPUs among those
+    available, so that the worker processes of one host do not share cores.
+    """
+
+    def __init__(self, model_n_jobs: int = 1, blas_threads: int = 1, cpu_affinity: str = "",
+                 cpus_per_worker: int = 1, slot_dir: str = None):
+        self.model_n_jobs = model_n_jobs
+        self.blas_threads = blas_threads
+        self.cpu_affinity = cpu_affinity
+        self.cpus_per_worker = cpus_per_worker
+        self.slot_dir = slot_dir or os.path.join(tempfile.gettempdir(), "model-service-cpu-slots")
+        self.cpu_slot = None
+        self._slot_lock = None
+        self._limits = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            model_n_jobs=int(os.environ.get("MODEL_N_JOBS", "1")),
+            blas_threads=int(os.environ.get("BLAS_THREADS", "1")),
+            cpu_affinity=os.environ.get("CPU_AFFINITY", ""),
+            cpus_per_worker=int(os.environ.get("WORKER_CPUS", "1")),
+            slot_dir=os.environ.get("CPU_SLOT_DIR")
+        )
+
+    def apply(self):
+        """Pin the process and cap the BLAS and OpenMP threads. Call before starting workers."""
+        if self.cpu_affinity:
+            self._pin()
+        if self.blas_threads > 0:
+            for name in THREAD_ENV_VARS:
+                os.environ[name] = str(self.blas_threads)
+            self.limit_blas_threads()
+
+    def limit_blas_threads(self):
+        """Cap the BLAS and OpenMP thread pools of the libraries loaded so far."""
+        if self.blas_threads <= 0:
+            return
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            # Only libraries loaded from now on follow the environment variables
+            return
+        self._limits = threadpool_limits(limits=self.blas_threads)
+
+    def configure_model(self, model) -> list:
+        """
+        Apply the governor to a freshly loaded model. Loading it may have
+        loaded new native libraries (e.g. SciPy's BLAS), so they are capped too.
+        """
+        self.limit_blas_threads()
+        if self.model_n_jobs == 0:
+            return []
+        return set_model_n_jobs(model, self.model_n_jobs)
+
+    def _pin(self):
+        if not hasattr(os, "sched_setaffinity"):
+            logger.warning("CPU affinity is not supported on this platform")
+            return
+        if self.cpu_affinity != "auto":
+            os.sched_setaffinity(0, parse_cpu_list(self.cpu_affinity))
+            return
+
+        if CPU_SLOT_ENV_VAR in os.environ:
+            # An inference worker process: it inherited its parent's CPUs
+            return
+        cpus = available_cpus()
+        n_slots = max(1, len(cpus) // self.cpus_per_worker)
+        os.makedirs(self.slot_dir, exist_ok=True)
+        for slot in range(n_slots):
+            lock = open(os.path.join(self.slot_dir, f"slot-{slot}.lock"), "w")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                continue
+            # Held for the life of the process; released by the OS on exit
+            self._slot_lock = lock
+            self.cpu_slot = slot
+            os.environ[CPU_SLOT_ENV_VAR] = str(slot)
+            os.sched_setaffinity(0, cpus[slot * self.cpus_per_worker:(slot + 1) * self.cpus_per_worker])
+            return
+        logger.warning(f"All {n_slots} CPU slot(s) are taken; this worker is not pinned")
+
+    def stats(self):
+        try:
+            from threadpoolctl import threadpool_info
+            pools = [
+                {key: pool.get(key) for key in ("user_api", "internal_api", "num_threads", "prefix")}
+                for pool in threadpool_info()
+            ]
+        except ImportError:
+            pools = None
+        return {
+            "model_n_jobs": self.model_n_jobs or None,
+            "blas_threads": self.blas_threads or None,
+            "cpu_affinity": self.cpu_affinity or None,
+            "cpu_slot": self.cpu_slot,
+            "cpus": available_cpus(),
+            "cpu_count": os.cpu_count(),
+            "thread_pools": pools
+        }
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Native predictors built with the ml2c transpiler (lib/).
+Supported scikit-learn models are transpiled to C, compiled to a shared
+library and called in-process through ctypes, one whole batch per call.
+"""
+
+import ctypes
+import hashlib
+import importlib.util
+import logging
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ml2c is not an installed package: import it from the repository's lib/
+ML2C_PATH = os.environ.get(
+    "ML2C_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lib"))
+if ML2C_PATH not in sys.path:
+    sys.path.append(ML2C_PATH)
+
+# The transpiler imports scikit-learn, so it is only imported for a build
+AVAILABLE = importlib.util.find_spec("transpiler") is not None
+
+# Forests and trees compare pre-binned features against sklearn's own
+# float32 thresholds, which keeps their predictions exact.
+TREE_OPTIONS = {"binning": True}
+
+# Class labels are returned as float32 by the generated code
+_MAX_EXACT_LABEL = 2 ** 24
+
+
+def output_kind(model) -> str:
+    """
+    How to turn the float returned by the generated prediction() into the
+    value sklearn's predict() returns. Raises ValueError for models ml2c
+    cannot serve.
+    """
+    name = type(model).__name__
+    classes = getattr(model, "classes_", None)
+    if name == "LinearRegression":
+        if np.ndim(model.coef_) != 1:
+            raise ValueError("multi-output LinearRegression is not supported")
+        return "value"
+    if name == "LogisticRegression":
+        if len(classes) != 2:
+            raise ValueError("only binary LogisticRegression is supported")
+        return "threshold"
+    if name == "DecisionTreeClassifier":
+        return "index"
+    if name == "RandomForestClassifier":
+        if (classes.dtype.kind not in "iuf" or np.any(classes != np.round(classes))
+                or np.any(np.abs(classes) > _MAX_EXACT_LABEL)):
+            raise ValueError("RandomForestClassifier labels must be integers")
+        return "label"
+    raise ValueError(f"{name} is not supported by ml2c")
+
+
+class NativePredictor:
+    """
+    Drop-in replacement for a model's predict() backed by a compiled ml2c
+    library. ctypes releases the GIL during the call, so thread runners
+    predict in parallel. Pickled by library path for process runners.
+    """
+
+    def __init__(self, library_path: str, n_features: int, kind: str, classes=None):
+        self.library_path = library_path
+        self.n_features_in_ = n_features
+        self.kind = kind
+        self.classes_ = classes
+        self._load()
+
+    def _load(self):
+        library = ctypes.CDLL(self.library_path)
+        batch = library.prediction_batch
+        batch.argtypes = (ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p)
+        batch.restype = None
+        self._library = library
+        self._batch = batch
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_library"], state["_batch"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load()
+
+    def predict(self, X) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, but the model expects "
+                             f"{self.n_features_in_} features per row")
+        out = np.empty(len(X), dtype=np.float32)
+        if len(X):
+            self._batch(X.ctypes.data, len(X), out.ctypes.data)
+
+        if self.kind == "threshold":
+            return self.classes_[(out > 0.5).astype(np.intp)]
+        if self.kind == "index":
+            return self.classes_[out.astype(np.intp)]
+        if self.kind == "label":
+            return out.astype(self.classes_.dtype)
+        return out.astype(np.float64)
+
+
+def build_native_predictor(model, build_dir: str, options: dict = None) -> NativePredictor:
+    """
+    Transpile and compile model into build_dir.
+    Libraries are named after the hash of their C code and cflags, so a
+    model that was already built (e.g. before a restart) is not recompiled.
+    """
+    if not AVAILABLE:
+        raise RuntimeError(f"ml2c transpiler not found (ML2C_PATH={ML2C_PATH})")
+    kind = output_kind(model)
+    from transpiler import ModelTranspiler
+
+    if kind in ("index", "label"):
+        options = {**TREE_OPTIONS, **(options or {})}
+    transpiler = ModelTranspiler.from_model(model, options)
+    code = transpiler.generate_library_code()
+    digest = hashlib.sha256((transpiler.options["cflags"] + "\n" + code).encode()).hexdigest()
+
+    os.makedirs(build_dir, exist_ok=True)
+    library_path = os.path.join(build_dir, f"{digest[:24]}.so")
+    if os.path.exists(library_path):
+        logger.info(f"Reusing native library {library_path}")
+    else:
+        with tempfile.TemporaryDirectory(dir=build_dir, prefix="build-") as tmp:
+            c_file = os.path.join(tmp, "model.c")
+            with open(c_file, "w") as f:
+                f.write(code)
+            # Compile aside, then install atomically
+            os.replace(transpiler.compile_shared(c_file), library_path)
+        logger.info(f"Built native library {library_path}")
+
+    return NativePredictor(library_path, transpiler._n_features(), kind,
+                           getattr(model, "classes_", None))
+
+
+def boundary_rows(model, n_rows: int, seed: int = 0):
+    """
+    Rows on the split thresholds of a tree model, or None for other models.
+    Every feature takes, in each row, one of its thresholds rounded down to
+    float32 or the next float32 above, so each comparison goes both ways
+    across the rows whatever the scale of the features.
+    """
+    estimators = getattr(model, "estimators_", None)
+    if estimators is None:
+        estimators = [model] if hasattr(model, "tree_") else []
+    if len(estimators) == 0:
+        return None
+
+    thresholds = [[] for _ in range(model.n_features_in_)]
+    for estimator in estimators:
+        tree = estimator.tree_
+        for node in np.flatnonzero(tree.children_left != tree.children_right):
+            thresholds[tree.feature[node]].append(tree.threshold[node])
+
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_rows, model.n_features_in_))
+    for feature, values in enumerate(thresholds):
+        if not values:
+            continue
+        t64 = np.array(values)
+        below = t64.astype(np.float32)
+        below = np.where(below > t64, np.nextafter(below, np.float32(-np.inf)), below)
+        above = np.nextafter(below, np.float32(np.inf))
+        X[:, feature] = rng.choice(np.concatenate([below, above]), n_rows)
+    return X
+
+
+def verify_native(native: NativePredictor, model, X: np.ndarray,
+                  rtol: float = 1e-4, atol: float = 1e-4) -> dict:
+    """
+    Compare native and sklearn predictions on X.
+    Classifiers must match exactly, regressors within rtol/atol.
+    Raises RuntimeError on a mismatch; returns a summary otherwise.
+    """
+    expected = model.predict(X)
+    actual = native.predict(X)
+    if native.kind == "value":
+        error = np.abs(actual - expected)
+        mismatches = int(np.count_nonzero(error > atol + rtol * np.abs(expected)))
+        report = {"rows": len(X), "mismatches": mismatches,
+                  "max_abs_error": float(error.max()) if len(X) else 0.0}
+    else:
+        mismatches = int(np.count_nonzero(actual != expected))
+        report = {"rows": len(X), "mismatches": mismatches}
+    if mismatches:
+        raise RuntimeError(f"Native predictions differ from sklearn on "
+                           f"{mismatches}/{len(X)} rows")
+    return report
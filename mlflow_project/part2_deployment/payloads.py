@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Binary tensor payloads for /predict.
+Decodes .npy and raw little-endian float32 request bodies straight into
+NumPy arrays (no per-cell Python objects) and encodes predictions back in
+the same formats.
+"""
+
+import io
+
+import numpy as np
+
+NPY_CONTENT_TYPE = "application/x-npy"
+RAW_CONTENT_TYPE = "application/octet-stream"
+
+# Header carrying the array shape of raw float32 bodies, e.g. "128,13"
+SHAPE_HEADER = "X-Shape"
+
+BINARY_CONTENT_TYPES = (NPY_CONTENT_TYPE, RAW_CONTENT_TYPE)
+
+
+def media_type(header_value: str) -> str:
+    """Return the bare media type of a Content-Type/Accept header value."""
+    return (header_value or "").split(";")[0].strip().lower()
+
+
+def parse_shape(value: str) -> tuple:
+    """Parse a shape header such as '128,13'."""
+    try:
+        shape = tuple(int(dim) for dim in value.split(","))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid {SHAPE_HEADER} header: {value!r} (expected e.g. '128,13')")
+    if len(shape) != 2 or min(shape) < 0:
+        raise ValueError(f"{SHAPE_HEADER} must be 'n_rows,n_features', got {value!r}")
+    return shape
+
+
+def decode_npy(body: bytes) -> np.ndarray:
+    """Decode a .npy body as a read-only view of the request bytes."""
+    stream = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    except ValueError as e:
+        raise ValueError(f"Invalid .npy payload: {e}")
+    if dtype.hasobject:
+        raise ValueError("Object arrays are not accepted")
+
+    count = int(np.prod(shape))
+    if len(body) - stream.tell() != count * dtype.itemsize:
+        raise ValueError(f".npy payload size does not match its header shape {shape}")
+    X = np.frombuffer(body, dtype=dtype, count=count, offset=stream.tell())
+    return X.reshape(shape, order="F" if fortran_order else "C")
+
+
+def decode_raw(body: bytes, shape_header: str) -> np.ndarray:
+    """Decode a raw little-endian float32 body using the X-Shape header."""
+    if shape_header is None:
+        raise ValueError(f"Raw float32 payloads need an {SHAPE_HEADER} header")
+    shape = parse_shape(shape_header)
+    expected = shape[0] * shape[1] * 4
+    if len(body) != expected:
+        raise ValueError(f"Expected {expected} bytes for shape {shape}, got {len(body)}")
+    return np.frombuffer(body, dtype="<f4").reshape(shape)
+
+
+def decode_features(body: bytes, content_type: str, headers) -> np.ndarray:
+    """Decode a binary request body into a 2D feature array."""
+    if content_type == NPY_CONTENT_TYPE:
+        X = decode_npy(body)
+    else:
+        X = decode_raw(body, headers.get(SHAPE_HEADER))
+    if X.ndim != 2:
+        raise ValueError(f"Features must be a 2D array, got shape {X.shape}")
+    if X.dtype.kind not in "fiu":
+        raise ValueError(f"Features must be numeric, got dtype {X.dtype}")
+    return X
+
+
+def encode_predictions(predictions: np.ndarray, content_type: str) -> tuple:
+    """Encode predictions as (body, extra headers) for a binary response."""
+    predictions = np.asarray(predictions)
+    if content_type == NPY_CONTENT_TYPE:
+        buffer = io.BytesIO()
+        np.save(buffer, predictions, allow_pickle=False)
+        return buffer.getvalue(), {}
+    data = np.ascontiguousarray(predictions, dtype="<f4")
+    return data.tobytes(), {SHAPE_HEADER: ",".join(str(dim) for dim in data.shape)}
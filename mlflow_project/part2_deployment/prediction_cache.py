@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+LRU cache of per-row predictions for the model service.
+Rows are hashed a whole batch at a time with vectorized 128-bit hashing,
+so only the rows that miss the cache are sent to the model. The LRU
+bookkeeping still runs in Python, on the event loop, so requests of more
+than max_rows rows bypass the cache.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Rough memory cost of one cache entry: key tuple, two hash ints, the
+# prediction and the OrderedDict link.
+ENTRY_BYTES = 240
+
+# Two independent 64-bit multiply-xorshift lanes give a 128-bit row hash
+_SEEDS = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F))
+_PRIMES = (np.uint64(0xFF51AFD7ED558CCD), np.uint64(0xC4CEB9FE1A85EC53))
+_SHIFT = np.uint64(29)
+
+
+def hash_rows(X: np.ndarray) -> list:
+    """Return one 128-bit hash per row of X as (high, low) int tuples."""
+    words = np.ascontiguousarray(X, dtype=np.float64)
+    # Treat 0.0 and -0.0 as the same value
+    words = (words + 0.0).view(np.uint64)
+    n_rows, n_cols = words.shape
+
+    lanes = []
+    for seed, prime in zip(_SEEDS, _PRIMES):
+        h = np.full(n_rows, seed ^ np.uint64(n_cols), dtype=np.uint64)
+        for j in range(n_cols):
+            h ^= words[:, j]
+            h *= prime
+            h ^= h >> _SHIFT
+        lanes.append(h.tolist())
+    return list(zip(*lanes))
+
+
+class PredictionCache:
+    """
+    Bounded LRU map from (model key, row hash) to a prediction.
+
+    The model key identifies one loaded model, not the URI it was loaded
+    from: a URI such as models:/name/latest can resolve to another model
+    on the next load. Lookups and stores only happen on the event loop.
+    invalidate() may be called from any thread (the model loading job): it
+    only flags the model, whose entries are dropped by the next lookup or
+    store.
+    """
+
+    def __init__(self, max_mb: float = 64, max_rows: int = 1024):
+        self.max_entries = int(max_mb * 1024 * 1024 / ENTRY_BYTES)
+        self.max_rows = max_rows
+        self.enabled = self.max_entries > 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._entries = OrderedDict()
+        self._invalidated = set()
+        self._invalidated_lock = threading.Lock()
+
+    def accepts(self, X: np.ndarray) -> bool:
+        """Whether X goes through the cache: a non-empty batch of at most max_rows rows."""
+        if not self.enabled or X.ndim != 2 or len(X) == 0:
+            return False
+        if len(X) > self.max_rows:
+            # About 2 us per row of event loop time, whether rows hit or miss
+            self.bypassed += 1
+            return False
+        return True
+
+    def lookup(self, model_key, X: np.ndarray) -> tuple:
+        """
+        Look up every row of X.
+        Returns (keys, cached, missing): cached holds the prediction or None
+        for each row, missing the indices of the rows to send to the model.
+        """
+        self._drop_if_invalidated()
+        keys = [(model_key, h) for h in hash_rows(X)]
+        cached = [None] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            value = self._entries.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                self._entries.move_to_end(key)
+                cached[i] = value
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        return keys, cached, np.array(missing, dtype=np.intp)
+
+    def store(self, keys: list, missing: np.ndarray, predictions: np.ndarray):
+        """Insert the predictions computed for the missing rows."""
+        self._drop_if_invalidated()
+        for i, value in zip(missing.tolist(), predictions):
+            self._entries[keys[i]] = value
+            self._entries.move_to_end(keys[i])
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def merge(cached: list, missing: np.ndarray, predictions: np.ndarray) -> np.ndarray:
+        """Fill the computed predictions into the cached results."""
+        if len(missing) == len(cached):
+            return np.asarray(predictions)
+        for i, value in zip(missing.tolist(), predictions):
+            cached[i] = value
+        return np.asarray(cached)
+
+    def invalidate(self, model_key):
+        """Drop the entries of one model, e.g. once it is retired."""
+        with self._invalidated_lock:
+            self._invalidated.add(model_key)
+
+    def _drop_if_invalidated(self):
+        if not self._invalidated:
+            return
+        with self._invalidated_lock:
+            invalidated, self._invalidated = self._invalidated, set()
+        for key in [key for key in self._entries if key[0] in invalidated]:
+            del self._entries[key]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "max_rows": self.max_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bypassed_requests": self.bypassed
+        }
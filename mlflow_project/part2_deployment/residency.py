@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Multi-model residency for the model service.
+Models selected per request are loaded lazily, once per (name, version)
+however many requests ask for them concurrently, and kept in memory under
+a RAM budget with least recently used models evicted first.
+"""
+
+import asyncio
+import logging
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class _ByteCounter:
+    """File-like sink that only counts what is written to it."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        # Large buffers may be written as PickleBuffer objects
+        self.size += memoryview(data).nbytes
+
+
+def estimate_model_bytes(model) -> int:
+    """
+    Estimate the memory held by a model from its pickled size.
+    Fitted sklearn models are dominated by their numpy arrays, which pickle
+    at their in-memory size; nothing is buffered while counting.
+    """
+    counter = _ByteCounter()
+    pickle.dump(model, counter, protocol=pickle.HIGHEST_PROTOCOL)
+    return counter.size
+
+
+class ModelResidency:
+    """
+    LRU set of loaded models keyed by (name, version).
+
+    load_fn(name, version) is blocking and returns a ServedModel whose
+    info holds "memory_bytes"; it runs on a small loader pool. Models are
+    evicted once resident models plus reserved_bytes() (e.g. the default
+    model, which is never evicted) exceed max_mb. Evicted runners are
+    retired, so requests still using them finish first, and then passed
+    to on_evict(served).
+    """
+
+    def __init__(self, load_fn, max_mb: float = 2048, reserved_bytes=lambda: 0,
+                 max_concurrent_loads: int = 2, on_evict=lambda served: None):
+        self.load_fn = load_fn
+        self.on_evict = on_evict
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.reserved_bytes = reserved_bytes
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self._models = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_loads,
+                                            thread_name_prefix="model-resident")
+
+    async def acquire(self, name: str, version: int = None):
+        """
+        Return the model for (name, version) with its runner acquired,
+        loading it first if needed. Load errors are raised to every
+        request that waited on the load. The caller releases the runner.
+        """
+        key = (name, version)
+        while True:
+            with self._lock:
+                served = self._models.get(key)
+                if served is not None:
+                    self._models.move_to_end(key)
+                    self.hits += 1
+                else:
+                    future = self._loading.get(key)
+                    if future is None:
+                        # First request for this model: it starts the load
+                        future = self._loading[key] = self._executor.submit(self._load, key)
+                        self.loads += 1
+            if served is None:
+                served = await asyncio.wrap_future(future)
+            if served.runner.acquire():
+                return served
+            # Evicted between the lookup and the acquire: load it again
+
+    def _load(self, key):
+        try:
+            served = self.load_fn(*key)
+        except Exception:
+            with self._lock:
+                del self._loading[key]
+            raise
+        with self._lock:
+            # Publish in the same step, so no request starts a second load
+            del self._loading[key]
+            self._models[key] = served
+            self._evict(keep=key)
+        logger.info(f"Resident model loaded: {key} "
+                    f"({served.info['memory_bytes'] / 1e6:.1f} MB)")
+        return served
+
+    def _used_bytes(self) -> int:
+        return self.reserved_bytes() + sum(s.info["memory_bytes"] for s in self._models.values())
+
+    def _evict(self, keep):
+        """Drop least recently used models until the budget is met."""
+        for key in list(self._models):
+            if self._used_bytes() <= self.max_bytes:
+                return
+            if key == keep:
+                continue
+            served = self._models.pop(key)
+            served.runner.retire()
+            self.on_evict(served)
+            self.evictions += 1
+            logger.info(f"Evicted resident model {key} "
+                        f"({served.info['memory_bytes'] / 1e6:.1f} MB)")
+        if self._used_bytes() > self.max_bytes:
+            logger.warning(f"Model {keep} alone exceeds the memory budget "
+                           f"({self.max_bytes / 1024 / 1024:g} MB); keeping it loaded")
+
+    def is_resident(self, served) -> bool:
+        with self._lock:
+            return any(s is served for s in self._models.values())
+
+    def models(self) -> list:
+        """Resident models, least recently used first."""
+        with self._lock:
+            return [
+                {
+                    "model_name": name,
+                    "version": version,
+                    "model_uri": served.info["model_uri"],
+                    "memory_mb": round(served.info["memory_bytes"] / 1024 / 1024, 2),
+                    "loaded_at": served.info.get("loaded_at")
+                }
+                for (name, version), served in self._models.items()
+            ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resident": len(self._models),
+                "loading": len(self._loading),
+                "used_mb": round(self._used_bytes() / 1024 / 1024, 2),
+                "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions
+            }
+
+    def shutdown(self):
+        """Retire every resident model."""
+        with self._lock:
+            models, self._models = list(self._models.values()), OrderedDict()
+        for served in models:
+            served.runner.retire()
+            self.on_evict(served)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,14 @@
+"""
+The model_service_common package, which the Part 3 canary service reuses,
+installable on its own: pip install -e part2_deployment
+"""
+
+from setuptools import setup
+
+setup(
+    name="model-service-common",
+    version="1.0.0",
+    description="Metrics, GC tuning, thread governor and startup profiling for the model services",
+    packages=["model_service_common"],
+    python_requires=">=3.8",
+)
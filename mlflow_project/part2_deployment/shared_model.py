@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Models whose large arrays are memory-mapped from disk, so that every
+worker process on a host shares one copy of them through the page cache.
+
+scikit-learn trees copy their node arrays into private memory when they
+are unpickled, even with joblib's mmap_mode. Tree ensembles are therefore
+exported to flat .npy node arrays and evaluated with a vectorized numpy
+traversal. Other models are dumped with joblib and loaded with
+mmap_mode='r', which maps their numpy arrays directly.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+JOBLIB_FILE = "model.joblib"
+FOREST_ARRAYS = ("children", "feature", "threshold", "value")
+
+# Tree-row pairs traversed at once: bounds the temporary arrays of one
+# predict call to a few MB per value column, whatever the batch size
+MAX_CHUNK_NODES = 1 << 18
+
+
+def _trees(model):
+    """The fitted single-output trees of a supported tree model, or None."""
+    if getattr(model, "n_outputs_", 1) != 1:
+        return None
+    if hasattr(model, "tree_"):
+        return [model]
+    estimators = getattr(model, "estimators_", None)
+    if (isinstance(estimators, list) and estimators and hasattr(estimators[0], "tree_")
+            and type(model).__name__ in ("RandomForestClassifier", "RandomForestRegressor",
+                                         "ExtraTreesClassifier", "ExtraTreesRegressor")):
+        return estimators
+    return None
+
+
+def export_forest(model, trees, path: str):
+    """
+    Write the nodes of all trees as flat arrays, one .npy file each.
+    children[2 * node + go_left] is the next node. Leaves point to
+    themselves, so rows that reached a leaf need no special casing.
+    """
+    children, features, thresholds, values, roots = [], [], [], [], []
+    offset = 0
+    for estimator in trees:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        leaf = tree.children_left == -1
+        pairs = np.empty((tree.node_count, 2), dtype=np.int64)
+        pairs[:, 0] = np.where(leaf, nodes, tree.children_right)
+        pairs[:, 1] = np.where(leaf, nodes, tree.children_left)
+        children.append(pairs.ravel() + offset)
+        features.append(np.where(leaf, 0, tree.feature))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold))
+        value = tree.value[:, 0, :]
+        if hasattr(model, "classes_"):
+            # Class fractions, as summed by predict_proba()
+            value = value / value.sum(axis=1, keepdims=True)
+        values.append(value)
+        roots.append(offset)
+        offset += tree.node_count
+
+    arrays = {
+        "children": np.concatenate(children).astype(np.int32),
+        "feature": np.concatenate(features).astype(np.int32),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "value": np.ascontiguousarray(np.concatenate(values), dtype=np.float64)
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), array)
+
+    classes = getattr(model, "classes_", None)
+    meta = {
+        "format": "forest",
+        "model_type": type(model).__name__,
+        "roots": roots,
+        "max_depth": max(int(t.tree_.max_depth) for t in trees),
+        "n_features_in": int(model.n_features_in_),
+        "averaged": len(trees) > 1 or not hasattr(model, "tree_"),
+        "classes": classes.tolist() if classes is not None else None
+    }
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+
+class SharedForest:
+    """
+    Tree ensemble evaluated from memory-mapped node arrays.
+    Read-only: the mapped pages are shared between processes and never
+    copied. Pickled by path, so process workers map the same files.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._load()
+
+    def _load(self):
+        with open(os.path.join(self.path, META_FILE)) as f:
+            meta = json.load(f)
+        self.model_type = meta["model_type"]
+        self.n_features_in_ = meta["n_features_in"]
+        self.max_depth = meta["max_depth"]
+        self.averaged = meta["averaged"]
+        self.roots = np.array(meta["roots"], dtype=np.int32)
+        self.classes_ = np.array(meta["classes"]) if meta["classes"] is not None else None
+        for name in FOREST_ARRAYS:
+            setattr(self, name, np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r"))
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._load()
+
+    def _leaf_sums(self, X) -> np.ndarray:
+        """Leaf values of every row summed over the trees: (n_rows, n_values)."""
+        # sklearn compares float32 features against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, but the model expects "
+                             f"{self.n_features_in_} features per row")
+        sums = np.empty((len(X), self.value.shape[1]), dtype=np.float64)
+        chunk_rows = max(1, MAX_CHUNK_NODES // len(self.roots))
+        for start in range(0, len(X), chunk_rows):
+            chunk = X[start:start + chunk_rows]
+            sums[start:start + len(chunk)] = self._leaf_values(chunk).sum(axis=0)
+        return sums
+
+    def _leaf_values(self, X) -> np.ndarray:
+        """Leaf values of every tree for every row: (n_trees, n_rows, n_values)."""
+        flat = X.ravel()
+        row_start = (np.arange(len(X), dtype=np.intp) * X.shape[1])[None, :]
+        node = np.repeat(self.roots[:, None], len(X), axis=1)
+        for _ in range(self.max_depth):
+            go_left = np.take(flat, row_start + np.take(self.feature, node)) <= np.take(self.threshold, node)
+            next_node = np.take(self.children, 2 * node + go_left)
+            if np.array_equal(next_node, node):
+                # Every row reached a leaf in every tree
+                break
+            node = next_node
+        return np.take(self.value, node, axis=0)
+
+    def predict_proba(self, X) -> np.ndarray:
+        proba = self._leaf_sums(X)
+        return proba / len(self.roots) if self.averaged else proba
+
+    def predict(self, X) -> np.ndarray:
+        if self.classes_ is not None:
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+        values = self._leaf_sums(X)[:, 0]
+        return values / len(self.roots) if self.averaged else values
+
+
+def _export(model, path: str):
+    trees = _trees(model)
+    if trees is not None:
+        export_forest(model, trees, path)
+    else:
+        import joblib
+        joblib.dump(model, os.path.join(path, JOBLIB_FILE))
+        with open(os.path.join(path, META_FILE), "w") as f:
+            json.dump({"format": "joblib", "model_type": type(model).__name__}, f)
+
+
+def open_shared_model(path: str):
+    """Map a model exported by share_model()."""
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta["format"] == "forest":
+        return SharedForest(path)
+    import joblib
+    return joblib.load(os.path.join(path, JOBLIB_FILE), mmap_mode="r")
+
+
+def shared_path(root: str, key: str) -> str:
+    return os.path.join(root, key)
+
+
+def share_model(root: str, key: str, load_model, verify=None):
+    """
+    Map the model exported under root/key. If no worker exported it yet,
+    load_model() is called and its arrays are exported first; verify(mapped,
+    model) may reject the export by raising. An exclusive file lock makes
+    concurrent workers wait for the first one instead of all unpickling.
+    """
+    path = shared_path(root, key)
+    os.makedirs(root, exist_ok=True)
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.isdir(path):
+                tmp = tempfile.mkdtemp(dir=root, prefix="export-")
+                try:
+                    model = load_model()
+                    _export(model, tmp)
+                    if verify is not None:
+                        verify(open_shared_model(tmp), model)
+                    os.replace(tmp, path)
+                except Exception:
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    raise
+                logger.info(f"Exported shared model arrays to {path}")
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return open_shared_model(path)
+
+
+def shared_size(path: str) -> int:
+    """Bytes mapped by a shared model."""
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def verify_shared(shared, model, X: np.ndarray):
+    """Raise RuntimeError if the shared model does not predict like model on X."""
+    expected = model.predict(X)
+    actual = shared.predict(X)
+    if getattr(model, "classes_", None) is not None:
+        mismatches = int(np.count_nonzero(actual != expected))
+    else:
+        mismatches = int(np.count_nonzero(~np.isclose(actual, expected, rtol=1e-9, atol=1e-12)))
+    if mismatches:
+        raise RuntimeError(f"Shared model predictions differ on {mismatches}/{len(X)} rows")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Binary prediction protocol over a Unix domain socket, for clients on the
+same host. Requests are length-prefixed frames holding a feature matrix;
+many requests can be pipelined on one connection.
+
+Request frame (little-endian):
+
+    magic "MP" | version u8 | dtype u8 | request_id u32 | n_rows u32 | n_cols u32
+    n_rows * n_cols values of dtype, row-major
+
+Response frame:
+
+    magic "MP" | version u8 | status u8 | request_id u32 | n_bytes u32 | reserved u32
+    n_bytes of payload: one float32 prediction per row if status is OK,
+    a UTF-8 error message otherwise
+
+Responses come back in request order and echo the request_id.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import struct
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MP"
+PROTOCOL_VERSION = 1
+# Request and response headers share one 16-byte layout
+HEADER = struct.Struct("<2sBBIII")
+
+DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f8")}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+STATUS_OK = 0
+STATUS_BAD_REQUEST = 1
+STATUS_NO_MODEL = 2
+STATUS_BUSY = 3
+STATUS_ERROR = 4
+
+
+class RequestFailed(Exception):
+    """Raised by a request handler to answer with a non-OK status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_request(X: np.ndarray, request_id: int = 0) -> bytes:
+    X = np.ascontiguousarray(X if X.dtype in DTYPE_CODES else X.astype(DTYPES[1]))
+    if X.ndim != 2:
+        raise ValueError(f"Expected a 2D feature array, got shape {X.shape}")
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, DTYPE_CODES[X.dtype], request_id,
+                       X.shape[0], X.shape[1]) + X.tobytes()
+
+
+def encode_response(status: int, request_id: int, payload: bytes) -> bytes:
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, status, request_id, len(payload), 0) + payload
+
+
+class SocketPredictionServer:
+    """
+    asyncio Unix socket server calling handler(X) -> predictions for every
+    request frame. Up to max_pipeline requests per connection are scored
+    concurrently (so they can share micro-batches); replies keep the
+    request order. Frames larger than max_frame_mb close the connection.
+    """
+
+    def __init__(self, handler, path: str, max_pipeline: int = 64, max_frame_mb: float = 64):
+        self.handler = handler
+        self.path = path
+        self.max_pipeline = max_pipeline
+        self.max_frame_bytes = int(max_frame_mb * 1024 * 1024)
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+        self._server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            # Left over from a previous run
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+        logger.info(f"Binary prediction socket listening on {self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        replies = asyncio.Queue(maxsize=self.max_pipeline)
+        sender = asyncio.ensure_future(self._send_replies(replies, writer))
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                magic, version, dtype_code, request_id, n_rows, n_cols = HEADER.unpack(header)
+                dtype = DTYPES.get(dtype_code)
+                n_bytes = n_rows * n_cols * (dtype.itemsize if dtype else 0)
+                if magic != MAGIC or version != PROTOCOL_VERSION or dtype is None \
+                        or n_bytes > self.max_frame_bytes:
+                    # The stream cannot be resynchronized: reply and hang up
+                    await replies.put(self._fail(STATUS_BAD_REQUEST, request_id, "Invalid frame header "
+                                                 f"(magic={magic!r}, version={version}, "
+                                                 f"dtype={dtype_code}, {n_bytes} bytes)"))
+                    break
+                payload = await reader.readexactly(n_bytes)
+                X = np.frombuffer(payload, dtype=dtype).reshape(n_rows, n_cols)
+                # Blocks when max_pipeline replies are pending (backpressure)
+                await replies.put(asyncio.ensure_future(self._handle(X, request_id)))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            await replies.put(None)
+            await sender
+            writer.close()
+            self.connections -= 1
+
+    async def _handle(self, X: np.ndarray, request_id: int) -> bytes:
+        self.requests += 1
+        try:
+            predictions = await self.handler(X)
+            return encode_response(STATUS_OK, request_id,
+                                   np.asarray(predictions, dtype=DTYPES[1]).tobytes())
+        except RequestFailed as e:
+            self.errors += 1
+            return encode_response(e.status, request_id, str(e).encode())
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Socket prediction error: {str(e)}")
+            return encode_response(STATUS_ERROR, request_id, f"Prediction failed: {e}".encode())
+
+    def _fail(self, status: int, request_id: int, message: str):
+        self.errors += 1
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(encode_response(status, request_id, message.encode()))
+        return future
+
+    async def _send_replies(self, replies: asyncio.Queue, writer: asyncio.StreamWriter):
+        broken = False
+        while True:
+            reply = await replies.get()
+            if reply is None:
+                return
+            frame = await reply
+            if broken:
+                continue
+            try:
+                writer.write(frame)
+                await writer.drain()
+            except ConnectionError:
+                # Keep consuming so the reader and pending requests finish
+                broken = True
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "connections": self.connections,
+            "requests": self.requests,
+            "errors": self.errors
+        }
+
+
+class SocketClient:
+    """
+    Blocking client for the binary socket protocol.
+
+        with SocketClient("/run/model.sock") as client:
+            predictions = client.predict(X)
+            many = client.predict_many([X1, X2, X3])  # pipelined
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self._next_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.sock.close()
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.predict_many([X])[0]
+
+    def predict_many(self, batches: list, window: int = 32) -> list:
+        """
+        Pipeline the batches: up to window requests are in flight before
+        the oldest reply is read. Keep window below the server's
+        max_pipeline so neither side can block the other.
+        """
+        pending = []
+        results = []
+        for X in batches:
+            if len(pending) >= window:
+                results.append(self._read_reply(pending.pop(0)))
+            self._next_id = (self._next_id + 1) % 2 ** 32
+            self.sock.sendall(encode_request(np.asarray(X), self._next_id))
+            pending.append(self._next_id)
+        results.extend(self._read_reply(request_id) for request_id in pending)
+        return results
+
+    def _read_reply(self, request_id: int) -> np.ndarray:
+        magic, version, status, reply_id, n_bytes, _ = HEADER.unpack(self._read(HEADER.size))
+        payload = self._read(n_bytes)
+        if magic != MAGIC or reply_id != request_id:
+            raise ConnectionError(f"Unexpected reply {reply_id} (magic {magic!r}) "
+                                  f"for request {request_id}")
+        if status != STATUS_OK:
+            raise RuntimeError(f"Prediction failed (status {status}): {payload.decode()}")
+        return np.frombuffer(payload, dtype=DTYPES[1])
+
+    def _read(self, n: int) -> bytes:
+        data = bytearray()
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("Connection closed by the server")
+            data += chunk
+        return bytes(data)
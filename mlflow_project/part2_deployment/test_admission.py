@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the admission controller.
+
+Run with: python -m pytest test_admission.py
+"""
+
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Rejected
+
+
+def test_queued_request_is_admitted_when_a_slot_is_released():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue_wait_ms=1000)
+        await controller._acquire()
+        waiting = asyncio.ensure_future(controller._acquire())
+        await asyncio.sleep(0)
+        assert controller.queued == 1
+
+        controller._release()
+        await waiting
+        assert (controller.inflight, controller.queued) == (1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_and_release_in_the_same_iteration():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue_wait_ms=50)
+        await controller._acquire()
+        waiting = asyncio.ensure_future(controller._acquire())
+        await asyncio.sleep(0)
+        # Fires right after the queue timeout, before the waiter resumes
+        asyncio.get_running_loop().call_later(0.05, controller._release)
+
+        with pytest.raises(Rejected) as rejected:
+            await waiting
+        assert rejected.value.reason == "queue_timeout"
+        assert (controller.inflight, controller.queued) == (0, 0)
+
+        # The slot handed back by the release is free again
+        await controller._acquire()
+        assert controller.inflight == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_passes_its_slot_on():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue_wait_ms=1000)
+        await controller._acquire()
+        first = asyncio.ensure_future(controller._acquire())
+        second = asyncio.ensure_future(controller._acquire())
+        await asyncio.sleep(0)
+
+        controller._release()
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await second
+        assert (controller.inflight, controller.queued) == (1, 0)
+
+    asyncio.run(scenario())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for the artifact cache, with downloads from a local directory.
+
+Run with: python -m pytest test_artifact_cache.py
+"""
+
+import fcntl
+import os
+import shutil
+
+import mlflow.artifacts
+import pytest
+
+from artifact_cache import LOCK_FILE, ArtifactCache
+
+URI = "models:/wine/1"
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """A model directory that downloads of URI copy; returns (path, download count)."""
+    path = tmp_path / "source" / "model"
+    path.mkdir(parents=True)
+    (path / "model.pkl").write_bytes(b"weights" * 1000)
+    (path / "MLmodel").write_text("flavors: {}\n")
+    downloads = []
+
+    def download_artifacts(artifact_uri, dst_path):
+        downloads.append(artifact_uri)
+        return shutil.copytree(path, os.path.join(dst_path, "model"))
+
+    monkeypatch.setattr(mlflow.artifacts, "download_artifacts", download_artifacts)
+    return path, downloads
+
+
+def index_locked(cache) -> bool:
+    with open(os.path.join(cache.root, LOCK_FILE), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        return False
+
+
+def test_download_then_hit(tmp_path, source):
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    with cache.fetch(URI) as first:
+        assert first["source"] == "download"
+    with cache.fetch(URI) as second:
+        assert second["source"] == "cache"
+        assert second["content_hash"] == first["content_hash"]
+        assert os.path.isfile(os.path.join(second["local_path"], "model.pkl"))
+    assert source[1] == [URI]
+
+
+def test_hits_are_verified_outside_the_index_lock(tmp_path, source, monkeypatch):
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    with cache.fetch(URI):
+        pass
+    verify = cache._verify
+    locked = []
+
+    def checked_verify(path, entry):
+        locked.append(index_locked(cache))
+        return verify(path, entry)
+
+    monkeypatch.setattr(cache, "_verify", checked_verify)
+    with cache.fetch(URI) as result:
+        assert result["source"] == "cache"
+    assert locked == [False]
+
+
+def test_corrupt_entry_is_downloaded_again(tmp_path, source):
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    with cache.fetch(URI) as result:
+        local_path = result["local_path"]
+    with open(os.path.join(local_path, "model.pkl"), "ab") as f:
+        f.write(b"corrupt")
+
+    with cache.fetch(URI) as result:
+        assert result["source"] == "download"
+        with open(os.path.join(result["local_path"], "model.pkl"), "rb") as f:
+            assert f.read() == b"weights" * 1000
+    assert source[1] == [URI, URI]
+
+
+def test_pinned_objects_are_not_evicted(tmp_path, source):
+    cache = ArtifactCache(str(tmp_path / "cache"), max_mb=0)
+    with cache.fetch(URI) as pinned:
+        (source[0] / "model.pkl").write_bytes(b"other weights")
+        with cache.fetch("models:/wine/2"):
+            pass
+        assert os.path.isdir(pinned["local_path"])
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Tests for batch jobs, run against a stub predict function.
+
+Run with: python -m pytest test_batch_jobs.py
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from batch_jobs import FINAL_STATES, BatchJobManager, UploadTooLarge, resolve_input_path, spool
+
+MODEL_INFO = {"model_name": "wine", "version": "1"}
+
+
+class StubRunner:
+    """predict() sums each row; gate, when given, holds every call until set."""
+
+    def __init__(self, gate: threading.Event = None):
+        self.gate = gate
+        self.calls = 0
+        self.started = threading.Event()
+        self.releases = 0
+
+    def predict(self, X):
+        self.calls += 1
+        self.started.set()
+        if self.gate is not None:
+            assert self.gate.wait(5)
+        return X.sum(axis=1)
+
+    def release(self):
+        self.releases += 1
+
+
+def write_input(path, rows: int, cols: int = 3):
+    with open(path, "w") as f:
+        for i in range(rows):
+            f.write(json.dumps([float(i)] * cols) + "\n")
+    return str(path)
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def run_job(manager, runner, input_path):
+    job = manager.create("ndjson", MODEL_INFO, input_path=input_path)
+    manager.submit(job, runner.predict, runner.release)
+    wait_for(lambda: job["status"] in FINAL_STATES)
+    return job
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = BatchJobManager(str(tmp_path / "jobs"), chunk_rows=2, max_jobs=2)
+    yield manager
+    manager.shutdown()
+
+
+def test_job_scores_every_chunk(manager, tmp_path):
+    runner = StubRunner()
+    job = run_job(manager, runner, write_input(tmp_path / "in.ndjson", 5))
+
+    assert job["status"] == "succeeded"
+    assert job["rows_done"] == 5
+    assert job["progress"] == 1.0
+    assert runner.calls == 3
+    assert runner.releases == 1
+    with open(manager.output_path(job["job_id"])) as f:
+        assert [json.loads(line) for line in f] == [3.0 * i for i in range(5)]
+
+
+def test_cancel_stops_before_next_chunk(manager, tmp_path):
+    gate = threading.Event()
+    runner = StubRunner(gate)
+    job = manager.create("ndjson", MODEL_INFO, input_path=write_input(tmp_path / "in.ndjson", 10))
+    manager.submit(job, runner.predict, runner.release)
+    assert runner.started.wait(5)
+
+    assert manager.cancel(job["job_id"])
+    gate.set()
+    wait_for(lambda: job["status"] in FINAL_STATES)
+
+    assert job["status"] == "cancelled"
+    assert runner.calls == 1
+    assert job["rows_done"] == 2
+    assert runner.releases == 1
+    wait_for(lambda: manager.get(job["job_id"]) is None)
+    assert not os.path.exists(manager.job_dir(job["job_id"]))
+
+
+def test_cancel_unknown_and_finished_jobs(manager, tmp_path):
+    assert not manager.cancel("missing")
+
+    job = run_job(manager, StubRunner(), write_input(tmp_path / "in.ndjson", 3))
+    assert manager.cancel(job["job_id"])
+    assert manager.get(job["job_id"]) is None
+    assert not os.path.exists(manager.output_path(job["job_id"]))
+
+
+def test_cancelled_upload_input_is_removed(manager, tmp_path):
+    gate = threading.Event()
+    runner = StubRunner(gate)
+    job = manager.create("ndjson", MODEL_INFO)
+    upload = manager.upload_path(job)
+    write_input(upload, 10)
+    manager.submit(job, runner.predict, runner.release)
+    assert runner.started.wait(5)
+
+    manager.cancel(job["job_id"])
+    gate.set()
+    wait_for(lambda: manager.get(job["job_id"]) is None)
+    assert not os.path.exists(upload)
+
+
+def test_prune_deletes_oldest_finished_jobs_with_output(manager, tmp_path):
+    input_path = write_input(tmp_path / "in.ndjson", 3)
+    first, second = (run_job(manager, StubRunner(), input_path) for _ in range(2))
+    first_output = manager.output_path(first["job_id"])
+    assert os.path.exists(first_output)
+
+    third = manager.create("ndjson", MODEL_INFO, input_path=input_path)
+
+    assert [job["job_id"] for job in manager.jobs()] == [second["job_id"], third["job_id"]]
+    assert not os.path.exists(first_output)
+    assert not os.path.exists(manager.job_dir(first["job_id"]))
+    assert os.path.exists(manager.output_path(second["job_id"]))
+    # The caller's input file is not the manager's to delete
+    assert os.path.exists(input_path)
+
+
+def test_prune_keeps_unfinished_jobs(manager, tmp_path):
+    jobs = [manager.create("ndjson", MODEL_INFO) for _ in range(3)]
+
+    assert manager.jobs() == jobs
+    assert all(os.path.isdir(manager.job_dir(job["job_id"])) for job in jobs)
+
+
+def test_resolve_input_path(tmp_path):
+    root = tmp_path / "inputs"
+    (root / "sub").mkdir(parents=True)
+    write_input(root / "sub" / "in.ndjson", 1)
+
+    assert resolve_input_path(str(root), "sub/in.ndjson") == os.path.realpath(root / "sub" / "in.ndjson")
+    with pytest.raises(FileNotFoundError):
+        resolve_input_path(str(root), "missing.ndjson")
+    with pytest.raises(FileNotFoundError):
+        resolve_input_path(str(root), "sub")
+
+
+@pytest.mark.parametrize("escape", ["../secret.ndjson", "sub/../../secret.ndjson", "/etc/passwd",
+                                    "link.ndjson"])
+def test_resolve_input_path_rejects_escapes(tmp_path, escape):
+    root = tmp_path / "inputs"
+    (root / "sub").mkdir(parents=True)
+    secret = write_input(tmp_path / "secret.ndjson", 1)
+    os.symlink(secret, root / "link.ndjson")
+
+    with pytest.raises(ValueError):
+        resolve_input_path(str(root), escape)
+
+
+def test_resolve_input_path_rejects_sibling_prefix(tmp_path):
+    (tmp_path / "inputs").mkdir()
+    (tmp_path / "inputs-other").mkdir()
+    write_input(tmp_path / "inputs-other" / "in.ndjson", 1)
+
+    with pytest.raises(ValueError):
+        resolve_input_path(str(tmp_path / "inputs"), "../inputs-other/in.ndjson")
+
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_spool_writes_upload(tmp_path):
+    path = tmp_path / "upload"
+    written = asyncio.run(spool(stream(b"abc", b"def"), str(path), max_bytes=6))
+
+    assert written == 6
+    assert path.read_bytes() == b"abcdef"
+
+
+def test_spool_rejects_oversized_upload(tmp_path):
+    chunks = [b"x" * 4] * 3
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool(stream(*chunks), str(tmp_path / "upload"), max_bytes=10))
+    # Nothing past the limit is written
+    assert os.path.getsize(tmp_path / "upload") == 8
+
+
+def test_spool_without_limit(tmp_path):
+    chunks = [np.zeros(1024, dtype=np.uint8).tobytes()] * 64
+    assert asyncio.run(spool(stream(*chunks), str(tmp_path / "upload"))) == 64 * 1024
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the micro-batcher.
+
+Run with: python -m pytest test_batching.py
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+
+class StubModel:
+    """Sums each row; rejects infinite values like scikit-learn does."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def predict(self, served, X):
+        self.calls.append(len(X))
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains infinity")
+        return X.sum(axis=1)
+
+
+def run_batch(model, *requests, max_batch_rows=64):
+    async def scenario():
+        batcher = MicroBatcher(model.predict, max_batch_rows=max_batch_rows, max_wait_ms=50)
+        batcher.start()
+        try:
+            return batcher, await asyncio.gather(
+                *(batcher.predict("served", X) for X in requests), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_concurrent_requests_share_one_batch():
+    model = StubModel()
+    batcher, results = run_batch(model, np.ones((2, 3)), np.full((1, 3), 2.0))
+    assert model.calls == [3]
+    np.testing.assert_array_equal(results[0], [3.0, 3.0])
+    np.testing.assert_array_equal(results[1], [6.0])
+    assert batcher.stats.as_dict()["split_batches"] == 0
+
+
+def test_failing_request_does_not_fail_its_batch():
+    model = StubModel()
+    bad = np.array([[1.0, np.inf, 0.0]])
+    batcher, results = run_batch(model, np.ones((2, 3)), bad, np.full((1, 3), 2.0))
+
+    np.testing.assert_array_equal(results[0], [3.0, 3.0])
+    with pytest.raises(ValueError, match="infinity"):
+        raise results[1]
+    np.testing.assert_array_equal(results[2], [6.0])
+    # The stacked batch, then each request on its own
+    assert model.calls == [4, 2, 1, 1]
+    assert batcher.stats.as_dict()["split_batches"] == 1
+
+
+def test_single_request_failure_is_not_retried():
+    model = StubModel()
+    _, results = run_batch(model, np.array([[np.inf]]))
+    assert isinstance(results[0], ValueError)
+    assert model.calls == [1]
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for request coalescing.
+
+Run with: python -m pytest test_coalescing.py
+"""
+
+import asyncio
+import json
+
+import numpy as np
+
+from coalescing import RequestCoalescer, rows_key
+from payloads import RAW_CONTENT_TYPE, SHAPE_HEADER, decode_features
+
+
+def test_rows_key_ignores_the_encoding():
+    X = np.array([[0.5, -1.25, 3.0], [2.0, 0.0, -0.0]], dtype=np.float32)
+    from_json = np.array(json.loads(json.dumps(X.tolist())), dtype=float)
+    from_binary = decode_features(X.astype("<f4").tobytes(), RAW_CONTENT_TYPE,
+                                  {SHAPE_HEADER: "2,3"})
+    assert from_json.dtype != from_binary.dtype
+    assert rows_key(from_json) == rows_key(from_binary)
+    assert rows_key(X + 1) != rows_key(X)
+    assert rows_key(X.reshape(3, 2)) != rows_key(X)
+
+
+def test_json_and_binary_requests_share_one_evaluation():
+    X = np.random.default_rng(0).standard_normal((4, 3)).astype(np.float32)
+    evaluations = []
+
+    async def evaluate():
+        evaluations.append(1)
+        await asyncio.sleep(0.01)
+        return "predictions"
+
+    async def scenario():
+        coalescer = RequestCoalescer()
+        results = await asyncio.gather(
+            coalescer.run(rows_key(X.astype(np.float64)), evaluate),
+            coalescer.run(rows_key(X), evaluate)
+        )
+        assert results == ["predictions", "predictions"]
+        assert coalescer.stats()["coalesced"] == 1
+
+    asyncio.run(scenario())
+    assert len(evaluations) == 1
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for the garbage collector tuning.
+
+Run with: python -m pytest test_gc_tuning.py
+"""
+
+import gc
+import weakref
+
+import pytest
+
+from model_service_common.gc_tuning import GCMonitor, parse_thresholds
+from model_service_common.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def monitor():
+    yield GCMonitor(MetricsRegistry(), "test")
+    gc.unfreeze()
+
+
+def test_parse_thresholds():
+    assert parse_thresholds("10000,50,100") == (10000, 50, 100)
+    assert parse_thresholds(" ") is None
+    with pytest.raises(ValueError):
+        parse_thresholds("1,2")
+
+
+def test_freeze_waits_for_idle(monitor):
+    calls = []
+
+    def idle():
+        calls.append(1)
+        return len(calls) >= 3
+
+    report = monitor.freeze(idle=idle, max_wait=5)
+    assert len(calls) == 3
+    assert report["waited_s"] < 1
+    assert report["frozen_objects"] == gc.get_freeze_count() > 0
+
+
+def test_freeze_gives_up_waiting_after_max_wait(monitor):
+    report = monitor.freeze(idle=lambda: False, max_wait=0.05)
+    assert 0.05 <= report["waited_s"] < 1
+    assert gc.get_freeze_count() > 0
+
+
+def test_freeze_collects_garbage_frozen_before(monitor):
+    class Node:
+        pass
+
+    cycle = Node()
+    cycle.self = cycle
+    ref = weakref.ref(cycle)
+    monitor.freeze()
+    del cycle
+    gc.collect()
+    # Frozen: out of the collector's reach
+    assert ref() is not None
+    monitor.freeze()
+    # Unfrozen and collected by the next freeze, not frozen again
+    assert ref() is None
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-row prediction cache.
+
+Run with: python -m pytest test_prediction_cache.py
+"""
+
+import numpy as np
+
+from prediction_cache import ENTRY_BYTES, PredictionCache
+
+ROWS = np.arange(12, dtype=float).reshape(4, 3)
+
+
+def predict(X):
+    return X.sum(axis=1)
+
+
+def score(cache, model_key, X):
+    """predict_with_cache() of the model service, without the model runner."""
+    keys, cached, missing = cache.lookup(model_key, X)
+    if len(missing) == 0:
+        return np.asarray(cached), missing
+    fresh = predict(X[missing])
+    cache.store(keys, missing, fresh)
+    return cache.merge(cached, missing, fresh), missing
+
+
+def test_miss_then_hit():
+    cache = PredictionCache(max_mb=1)
+    predictions, missing = score(cache, "model", ROWS)
+    np.testing.assert_array_equal(predictions, predict(ROWS))
+    np.testing.assert_array_equal(missing, [0, 1, 2, 3])
+
+    predictions, missing = score(cache, "model", ROWS)
+    np.testing.assert_array_equal(predictions, predict(ROWS))
+    assert len(missing) == 0
+    assert (cache.hits, cache.misses) == (4, 4)
+
+
+def test_partial_hit_merges_in_request_order():
+    cache = PredictionCache(max_mb=1)
+    score(cache, "model", ROWS[[1, 3]])
+    X = np.vstack([ROWS, ROWS[3] + 100])
+
+    predictions, missing = score(cache, "model", X)
+    np.testing.assert_array_equal(missing, [0, 2, 4])
+    np.testing.assert_array_equal(predictions, predict(X))
+
+
+def test_rows_are_keyed_by_value_not_dtype():
+    cache = PredictionCache(max_mb=1)
+    score(cache, "model", ROWS)
+    _, missing = score(cache, "model", ROWS.astype(np.float32))
+    assert len(missing) == 0
+    score(cache, "model", np.array([[0.0, -0.0, 1.0]]))
+    _, missing = score(cache, "model", np.array([[-0.0, 0.0, 1.0]]))
+    assert len(missing) == 0
+
+
+def test_invalidation_on_model_swap_drops_only_the_old_model():
+    cache = PredictionCache(max_mb=1)
+    old, new = object(), object()
+    score(cache, old, ROWS)
+    score(cache, new, ROWS[:2])
+
+    cache.invalidate(old)
+    _, missing = score(cache, new, ROWS[:2])
+    assert len(missing) == 0
+    assert cache.stats()["entries"] == 2
+    _, missing = score(cache, old, ROWS)
+    assert len(missing) == 4
+
+
+def test_least_recently_used_rows_are_evicted():
+    cache = PredictionCache(max_mb=3 * ENTRY_BYTES / (1024 * 1024))
+    assert cache.max_entries == 3
+    score(cache, "model", ROWS[:3])
+    score(cache, "model", ROWS[:1])
+    score(cache, "model", ROWS[3:])
+
+    _, missing = score(cache, "model", ROWS)
+    # Row 1 was the least recently used when row 3 was stored
+    np.testing.assert_array_equal(missing, [1])
+
+
+def test_large_requests_bypass_the_cache():
+    cache = PredictionCache(max_mb=1, max_rows=4)
+    assert cache.accepts(ROWS)
+    assert not cache.accepts(np.vstack([ROWS, ROWS]))
+    assert not cache.accepts(ROWS[:0])
+    assert cache.stats()["bypassed_requests"] == 1
+    assert not PredictionCache(max_mb=0).accepts(ROWS)
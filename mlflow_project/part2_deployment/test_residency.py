@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests for multi-model residency, with stub loaders.
+
+Run with: python -m pytest test_residency.py
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from inference import ModelRunner
+from residency import ModelResidency
+
+MB = 1024 * 1024
+
+
+class StubRunner(ModelRunner):
+    def submit(self, X):
+        future = Future()
+        future.set_result(X)
+        return future
+
+
+class StubLoader:
+    """load_fn returning models of the given sizes in MB; may wait on a gate."""
+
+    def __init__(self, sizes_mb, gate=None):
+        self.sizes_mb = sizes_mb
+        self.gate = gate
+        self.calls = []
+
+    def __call__(self, name, version):
+        self.calls.append((name, version))
+        if self.gate is not None:
+            self.gate.wait(5)
+        if name == "broken":
+            raise RuntimeError("no such model")
+        return SimpleNamespace(runner=StubRunner(name),
+                               info={"model_uri": f"models:/{name}/{version}",
+                                     "memory_bytes": self.sizes_mb[name] * MB})
+
+
+def acquire_all(residency, *keys):
+    async def scenario():
+        return await asyncio.gather(*(residency.acquire(*key) for key in keys),
+                                    return_exceptions=True)
+
+    return asyncio.run(scenario())
+
+
+def test_concurrent_requests_share_one_load():
+    gate = threading.Event()
+    loader = StubLoader({"a": 1}, gate)
+    residency = ModelResidency(loader, max_mb=10)
+
+    async def scenario():
+        tasks = [asyncio.ensure_future(residency.acquire("a", 1)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        gate.set()
+        return await asyncio.gather(*tasks)
+
+    served = asyncio.run(scenario())
+    assert loader.calls == [("a", 1)]
+    assert all(s is served[0] for s in served)
+    assert served[0].runner.in_use == 5
+    assert residency.stats()["loads"] == 1
+
+
+def test_load_errors_reach_every_waiter_and_are_not_cached():
+    gate = threading.Event()
+    loader = StubLoader({}, gate)
+    residency = ModelResidency(loader, max_mb=10)
+
+    async def scenario():
+        tasks = [asyncio.ensure_future(residency.acquire("broken", 1)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        gate.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert loader.calls == [("broken", 1)]
+
+    acquire_all(residency, ("broken", 1))
+    assert len(loader.calls) == 2
+    assert residency.stats()["resident"] == 0
+
+
+def test_least_recently_used_model_is_evicted():
+    evicted = []
+    residency = ModelResidency(StubLoader({"a": 4, "b": 4, "c": 4}), max_mb=10,
+                               on_evict=lambda served: evicted.append(served))
+    (a,) = acquire_all(residency, ("a", 1))
+    acquire_all(residency, ("b", 1))
+    acquire_all(residency, ("a", 1))
+    acquire_all(residency, ("c", 1))
+
+    assert [m["model_name"] for m in residency.models()] == ["a", "c"]
+    assert [s.info["model_uri"] for s in evicted] == ["models:/b/1"]
+    assert residency.stats()["evictions"] == 1
+    assert residency.is_resident(a)
+
+
+def test_reserved_default_model_counts_against_the_budget():
+    default_mb = [0]
+    residency = ModelResidency(StubLoader({"a": 4, "b": 4}), max_mb=10,
+                               reserved_bytes=lambda: default_mb[0] * MB)
+    acquire_all(residency, ("a", 1))
+    default_mb[0] = 5
+    acquire_all(residency, ("b", 1))
+    # The default model is never evicted: resident models make room for it
+    assert [m["model_name"] for m in residency.models()] == ["b"]
+
+
+def test_model_over_budget_is_kept_alone():
+    residency = ModelResidency(StubLoader({"a": 4, "big": 20}), max_mb=10)
+    acquire_all(residency, ("a", 1))
+    (big,) = acquire_all(residency, ("big", 1))
+    assert [m["model_name"] for m in residency.models()] == ["big"]
+    assert big.runner.in_use == 1
+
+
+def test_evicted_runner_is_retired_after_its_requests():
+    residency = ModelResidency(StubLoader({"a": 8, "b": 8}), max_mb=10)
+    (a,) = acquire_all(residency, ("a", 1))
+    acquire_all(residency, ("b", 1))
+    # Still held by the request that acquired it
+    assert not residency.is_resident(a)
+    assert a.runner.in_use == 1
+    a.runner.release()
+    assert not a.runner.acquire()
+
+    # Requested again: loaded anew
+    (again,) = acquire_all(residency, ("a", 1))
+    assert again is not a
@@ -3,10 +3,14 @@
 Automated testing script for the model service
 """
 
+import numpy as np
 import requests
 import json
 import time
 import sys
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_URL = "http://localhost:8000"
 
@@ -35,16 +39,36 @@ def test_update_model(model_name="wine_classification_model", version=None):
         json=data
     )
     
-    if response.status_code != 200:
+    if response.status_code != 202:
         print(f"✗ Model update failed: {response.status_code}")
         print(f"  Error: {response.json()}")
         return False
     
+    # Loading happens in the background: poll the job until it finishes
+    job_id = response.json()["job_id"]
+    print(f"  Loading job: {job_id}")
+    job = wait_for_load_job(job_id)
+    
+    if job["status"] != "succeeded":
+        print(f"✗ Model update failed: {job['status']}")
+        print(f"  Error: {job.get('error')}")
+        return False
+    
     print("✓ Model updated successfully")
-    print(f"  Response: {json.dumps(response.json(), indent=2)}")
+    print(f"  Job: {json.dumps(job, indent=2)}")
     return True
 
 
+def wait_for_load_job(job_id, timeout=120):
+    """Poll a model loading job until it succeeds, fails or times out"""
+    deadline = time.time() + timeout
+    while True:
+        job = requests.get(f"{BASE_URL}/update-model/{job_id}").json()
+        if job["status"] in ("succeeded", "failed") or time.time() > deadline:
+            return job
+        time.sleep(0.5)
+
+
 def test_model_info():
     """Test model info endpoint"""
     print("\nTesting /model-info endpoint...")
@@ -88,6 +112,170 @@ def test_predict():
         return None
 
 
+def test_predict_npy():
+    """Test prediction with a binary .npy payload and response"""
+    print("\nTesting /predict with .npy payload...")
+    
+    X = np.array([
+        [14.23, 1.71, 2.43, 15.6, 127.0, 2.8, 3.06, 0.28, 2.29, 5.64, 1.04, 3.92, 1065.0],
+        [13.2, 1.78, 2.14, 11.2, 100.0, 2.65, 2.76, 0.26, 1.28, 4.38, 1.05, 3.4, 1050.0]
+    ], dtype=np.float32)
+    buffer = io.BytesIO()
+    np.save(buffer, X)
+    
+    response = requests.post(
+        f"{BASE_URL}/predict",
+        data=buffer.getvalue(),
+        headers={"Content-Type": "application/x-npy", "Accept": "application/x-npy"}
+    )
+    
+    if response.status_code == 200:
+        predictions = np.load(io.BytesIO(response.content))
+        print("✓ Binary prediction successful")
+        print(f"  Predictions: {predictions.tolist()}")
+        print(f"  Model: {response.headers['X-Model-Name']} v{response.headers['X-Model-Version']}")
+        return predictions
+    else:
+        print(f"✗ Binary prediction failed: {response.status_code}")
+        print(f"  Error: {response.text}")
+        return None
+
+
+def test_predict_stream(n_rows=5000):
+    """Test the streaming NDJSON prediction endpoint"""
+    print(f"\nTesting /predict/stream with {n_rows} rows...")
+    
+    row = json.dumps([14.23, 1.71, 2.43, 15.6, 127.0, 2.8, 3.06, 0.28, 2.29, 5.64, 1.04, 3.92, 1065.0])
+    body = "".join(row + "\n" for _ in range(n_rows))
+    
+    response = requests.post(
+        f"{BASE_URL}/predict/stream",
+        data=body,
+        headers={"Content-Type": "application/x-ndjson"},
+        stream=True
+    )
+    
+    if response.status_code != 200:
+        print(f"✗ Streaming prediction failed: {response.status_code}")
+        print(f"  Error: {response.text}")
+        return False
+    
+    predictions = [json.loads(line) for line in response.iter_lines() if line]
+    if len(predictions) == n_rows and not isinstance(predictions[-1], dict):
+        print(f"✓ Streamed {len(predictions)} predictions")
+        return True
+    else:
+        print(f"✗ Expected {n_rows} predictions, got {len(predictions)}: {predictions[-1:]}")
+        return False
+
+
+def test_concurrent_predict(n_requests=50):
+    """Test that concurrent predictions are batched and routed back correctly"""
+    print(f"\nTesting {n_requests} concurrent /predict calls...")
+    
+    row = [14.23, 1.71, 2.43, 15.6, 127.0, 2.8, 3.06, 0.28, 2.29, 5.64, 1.04, 3.92, 1065.0]
+    
+    def send(i):
+        n_rows = 1 + i % 3
+        response = requests.post(f"{BASE_URL}/predict", json={"features": [row] * n_rows})
+        return response.status_code == 200 and len(response.json()["predictions"]) == n_rows
+    
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(send, range(n_requests)))
+    
+    if all(results):
+        print("✓ All concurrent predictions returned the right number of rows")
+    else:
+        print(f"✗ {results.count(False)} concurrent predictions failed")
+    
+    batching = requests.get(f"{BASE_URL}/health").json().get("batching", {})
+    if batching.get("enabled"):
+        print(f"  Batches: {batching['batches']}, mean rows/batch: {batching['mean_batch_rows']}, "
+              f"mean queue wait: {batching['mean_queue_wait_ms']} ms")
+    return all(results)
+
+
+def test_predict_selected_version(model_name="wine_classification_model", version=1):
+    """Test per-request model selection through the query parameters"""
+    print(f"\nTesting /predict?model={model_name}&version={version}...")
+    
+    row = [14.23, 1.71, 2.43, 15.6, 127.0, 2.8, 3.06, 0.28, 2.29, 5.64, 1.04, 3.92, 1065.0]
+    response = requests.post(
+        f"{BASE_URL}/predict",
+        params={"model": model_name, "version": version},
+        json={"features": [row]}
+    )
+    
+    if response.status_code == 200 and response.json()["model_version"] == str(version):
+        print(f"✓ Served by {model_name} v{version}")
+        resident = requests.get(f"{BASE_URL}/models").json()["resident"]
+        print(f"  Resident models: {[(m['model_name'], m['version']) for m in resident]}")
+        return True
+    else:
+        print(f"✗ Model selection failed: {response.status_code}")
+        print(f"  Error: {response.text}")
+        return False
+
+
+def test_socket_predict(n_requests=200):
+    """Test pipelined predictions over the binary Unix socket (needs SOCKET_PATH)"""
+    path = os.environ.get("SOCKET_PATH")
+    if not path:
+        print("\nSkipping socket test (SOCKET_PATH not set)")
+        return None
+    print(f"\nTesting {n_requests} pipelined requests on {path}...")
+    
+    from socket_server import SocketClient
+    
+    row = [14.23, 1.71, 2.43, 15.6, 127.0, 2.8, 3.06, 0.28, 2.29, 5.64, 1.04, 3.92, 1065.0]
+    batches = [np.array([row] * (1 + i % 3), dtype=np.float32) for i in range(n_requests)]
+    with SocketClient(path) as client:
+        results = client.predict_many(batches)
+    
+    if all(len(r) == len(b) for r, b in zip(results, batches)):
+        print(f"✓ All {n_requests} socket replies returned the right number of rows")
+        return True
+    else:
+        print("✗ Socket replies do not match the requests")
+        return False
+
+
+def test_batch_job(n_rows=20000, timeout=120):
+    """Test a batch scoring job: upload, poll progress, download the output"""
+    print(f"\nTesting /batch-jobs with {n_rows} rows...")
+    
+    row = json.dumps([14.23, 1.71, 2.43, 15.6, 127.0, 2.8, 3.06, 0.28, 2.29, 5.64, 1.04, 3.92, 1065.0])
+    response = requests.post(
+        f"{BASE_URL}/batch-jobs",
+        data="".join(row + "\n" for _ in range(n_rows)),
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    if response.status_code != 202:
+        print(f"✗ Batch job submission failed: {response.status_code}")
+        print(f"  Error: {response.text}")
+        return False
+    job = response.json()
+    
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = requests.get(f"{BASE_URL}{job['status_url']}").json()
+        if status["status"] in ("succeeded", "failed", "cancelled"):
+            break
+        time.sleep(0.5)
+    if status["status"] != "succeeded":
+        print(f"✗ Batch job {status['status']}: {status.get('error')}")
+        return False
+    
+    response = requests.get(f"{BASE_URL}{job['output_url']}", stream=True)
+    predictions = [json.loads(line) for line in response.iter_lines() if line]
+    if len(predictions) == n_rows:
+        print(f"✓ Batch job scored {len(predictions)} rows")
+        return True
+    else:
+        print(f"✗ Expected {n_rows} predictions, got {len(predictions)}")
+        return False
+
+
 def test_model_update_workflow():
     """Test complete model update workflow"""
     print("\n" + "="*60)
@@ -142,6 +330,12 @@ def run_all_tests():
     if test_update_model("wine_classification_model"):
         test_model_info()
         test_predict()
+        test_predict_npy()
+        test_predict_stream()
+        test_concurrent_predict()
+        test_predict_selected_version()
+        test_socket_predict()
+        test_batch_job()
         test_model_update_workflow()
     else:
         print("\n⚠ Could not load model from MLflow")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for memory-mapped shared models: the node array traversal must
+predict exactly like scikit-learn.
+
+Run with: python -m pytest test_shared_model.py
+"""
+
+import pickle
+
+import numpy as np
+import pytest
+from sklearn.datasets import load_wine
+from sklearn.ensemble import (ExtraTreesClassifier, ExtraTreesRegressor, RandomForestClassifier,
+                              RandomForestRegressor)
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+
+import shared_model
+from shared_model import SharedForest, share_model, verify_shared
+
+MODELS = {
+    "rf_classifier": lambda: RandomForestClassifier(n_estimators=20, random_state=0),
+    "et_classifier": lambda: ExtraTreesClassifier(n_estimators=20, random_state=0),
+    "dt_classifier": lambda: DecisionTreeClassifier(random_state=0),
+    "rf_regressor": lambda: RandomForestRegressor(n_estimators=20, random_state=0),
+    "et_regressor": lambda: ExtraTreesRegressor(n_estimators=20, random_state=0),
+    "dt_regressor": lambda: DecisionTreeRegressor(random_state=0),
+}
+
+
+@pytest.fixture(scope="module")
+def wine():
+    return load_wine(return_X_y=True)
+
+
+def fit(name, wine, labels=None):
+    X, y = wine
+    if name.endswith("regressor"):
+        y = X[:, 12]
+        X = X[:, :12]
+    elif labels is not None:
+        y = np.asarray(labels)[y]
+    return MODELS[name]().fit(X, y), X
+
+
+def threshold_rows(model, X):
+    """
+    Rows of X with one feature set to each float32 neighbour of a split
+    threshold, as sklearn compares float32 inputs against float64 thresholds.
+    """
+    rows = []
+    for estimator in getattr(model, "estimators_", [model]):
+        tree = estimator.tree_
+        for node in np.flatnonzero(tree.children_left != tree.children_right)[:10]:
+            t32 = np.float32(tree.threshold[node])
+            if t32 > tree.threshold[node]:
+                t32 = np.nextafter(t32, np.float32(-np.inf))
+            for value in (t32, np.nextafter(t32, np.float32(np.inf))):
+                row = X[node % len(X)].copy()
+                row[tree.feature[node]] = value
+                rows.append(row)
+    return np.vstack([X] + rows)
+
+
+def share(model, tmp_path, key="model"):
+    return share_model(str(tmp_path), key, lambda: model)
+
+
+@pytest.mark.parametrize("name", MODELS)
+def test_forest_matches_sklearn(wine, tmp_path, name):
+    model, X = fit(name, wine)
+    shared = share(model, tmp_path)
+    assert isinstance(shared, SharedForest)
+    X = threshold_rows(model, X)
+    if name.endswith("classifier"):
+        np.testing.assert_array_equal(shared.predict(X), model.predict(X))
+        np.testing.assert_allclose(shared.predict_proba(X), model.predict_proba(X), rtol=1e-12)
+    else:
+        np.testing.assert_allclose(shared.predict(X), model.predict(X), rtol=1e-12)
+
+
+def test_string_labels(wine, tmp_path):
+    model, X = fit("rf_classifier", wine, labels=["barolo", "grignolino", "barbera"])
+    shared = share(model, tmp_path)
+    np.testing.assert_array_equal(shared.predict(X), model.predict(X))
+    np.testing.assert_array_equal(shared.classes_, model.classes_)
+
+
+def test_chunked_traversal(wine, tmp_path, monkeypatch):
+    model, X = fit("rf_classifier", wine)
+    shared = share(model, tmp_path)
+    expected = shared.predict_proba(X)
+    # 20 trees: one row per chunk, then a partial last chunk
+    for max_nodes in (20, 7 * 20):
+        monkeypatch.setattr(shared_model, "MAX_CHUNK_NODES", max_nodes)
+        np.testing.assert_array_equal(shared.predict_proba(X), expected)
+
+
+def test_wrong_feature_count_is_rejected(wine, tmp_path):
+    model, X = fit("dt_classifier", wine)
+    with pytest.raises(ValueError, match="13 features"):
+        share(model, tmp_path).predict(X[:, :5])
+
+
+def test_pickled_by_path(wine, tmp_path):
+    model, X = fit("rf_regressor", wine)
+    shared = share(model, tmp_path)
+    assert len(pickle.dumps(shared)) < 1000
+    np.testing.assert_array_equal(pickle.loads(pickle.dumps(shared)).predict(X), shared.predict(X))
+
+
+def test_other_models_are_memory_mapped_with_joblib(wine, tmp_path):
+    X, y = wine
+    model = LogisticRegression(max_iter=5000).fit(X, y)
+    shared = share(model, tmp_path)
+    assert isinstance(shared.coef_, np.memmap)
+    np.testing.assert_array_equal(shared.predict(X), model.predict(X))
+
+
+def test_export_happens_once_per_key(wine, tmp_path):
+    model, X = fit("dt_classifier", wine)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return model
+
+    share_model(str(tmp_path), "key", load)
+    share_model(str(tmp_path), "key", load)
+    assert loads == [1]
+
+
+def test_verification_rejects_a_wrong_export(wine, tmp_path):
+    model, X = fit("rf_classifier", wine)
+    other = DecisionTreeClassifier(max_depth=1).fit(*wine)
+
+    def verify(shared, _model):
+        verify_shared(shared, other, threshold_rows(model, X))
+
+    with pytest.raises(RuntimeError, match="differ on"):
+        share_model(str(tmp_path), "key", lambda: model, verify)
+    # Nothing is left behind for the next worker
+    assert not (tmp_path / "key").exists()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for the binary socket protocol, with a stub predictor.
+
+Run with: python -m pytest test_socket_server.py
+"""
+
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+import numpy as np
+import pytest
+
+from socket_server import (HEADER, MAGIC, PROTOCOL_VERSION, STATUS_BAD_REQUEST, STATUS_ERROR,
+                           STATUS_NO_MODEL, RequestFailed, SocketClient, SocketPredictionServer,
+                           encode_request)
+
+
+async def stub_predict(X):
+    """Sums each row. The first value picks a delay, or an error when negative."""
+    if X[0, 0] < 0:
+        raise RequestFailed(STATUS_NO_MODEL, "No model loaded")
+    if X[0, 0] == 99:
+        raise ValueError("model exploded")
+    await asyncio.sleep(X[0, 0] / 1000)
+    return X.sum(axis=1)
+
+
+@pytest.fixture
+def server():
+    """A server on a short temporary path (Unix socket paths are limited to ~100 bytes)."""
+    directory = tempfile.mkdtemp(prefix="sock-")
+    server = SocketPredictionServer(stub_predict, os.path.join(directory, "model.sock"),
+                                    max_pipeline=8, max_frame_mb=1 / 1024)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result(5)
+    try:
+        yield server
+    finally:
+        asyncio.run_coroutine_threadsafe(server.stop(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
+        shutil.rmtree(directory)
+
+
+def read_reply(sock):
+    header = sock.recv(HEADER.size, socket.MSG_WAITALL)
+    magic, version, status, request_id, n_bytes, _ = HEADER.unpack(header)
+    assert (magic, version) == (MAGIC, PROTOCOL_VERSION)
+    return status, request_id, sock.recv(n_bytes, socket.MSG_WAITALL) if n_bytes else b""
+
+
+def connect(server):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(server.path)
+    return sock
+
+
+def assert_closed(sock):
+    assert sock.recv(1) == b""
+
+
+def test_predictions_in_both_dtypes(server):
+    X = np.arange(6, dtype=np.float64).reshape(2, 3) + 1
+    with SocketClient(server.path) as client:
+        np.testing.assert_array_equal(client.predict(X), [6, 15])
+        np.testing.assert_array_equal(client.predict(X.astype(np.float32)), [6, 15])
+    assert server.stats()["requests"] == 2
+
+
+def test_pipelined_replies_keep_request_order(server):
+    # The first requests are the slowest to score
+    batches = [np.full((1, 2), delay, dtype=np.float32) for delay in (40, 20, 0, 10, 0)]
+    with SocketClient(server.path) as client:
+        results = client.predict_many(batches, window=5)
+    assert [float(r[0]) for r in results] == [80, 40, 0, 20, 0]
+
+
+def test_handler_errors_keep_the_connection_open(server):
+    with connect(server) as sock:
+        sock.sendall(encode_request(np.array([[-1.0]]), 7) + encode_request(np.array([[99.0]]), 8)
+                     + encode_request(np.array([[1.0, 2.0]]), 9))
+        assert read_reply(sock) == (STATUS_NO_MODEL, 7, b"No model loaded")
+        status, request_id, message = read_reply(sock)
+        assert (status, request_id) == (STATUS_ERROR, 8)
+        assert b"model exploded" in message
+        status, request_id, payload = read_reply(sock)
+        assert (status, request_id) == (0, 9)
+        np.testing.assert_array_equal(np.frombuffer(payload, dtype="<f4"), [3.0])
+    assert server.stats()["errors"] == 2
+
+
+@pytest.mark.parametrize("magic, version, dtype", [
+    (b"XX", PROTOCOL_VERSION, 1),
+    (MAGIC, PROTOCOL_VERSION + 1, 1),
+    (MAGIC, PROTOCOL_VERSION, 9),
+])
+def test_invalid_header_is_rejected_and_closed(server, magic, version, dtype):
+    with connect(server) as sock:
+        sock.sendall(HEADER.pack(magic, version, dtype, 5, 1, 1) + b"\0" * 4)
+        status, request_id, message = read_reply(sock)
+        assert (status, request_id) == (STATUS_BAD_REQUEST, 5)
+        assert message.startswith(b"Invalid frame header")
+        assert_closed(sock)
+
+
+def test_oversized_frame_is_rejected_and_closed(server):
+    # max_frame_mb is 1 KiB: 200 float32 values fit, 200 float64 do not
+    with connect(server) as sock:
+        sock.sendall(encode_request(np.ones((1, 200), dtype=np.float32), 1))
+        assert read_reply(sock)[0] == 0
+        sock.sendall(HEADER.pack(MAGIC, PROTOCOL_VERSION, 2, 2, 1, 200))
+        status, request_id, message = read_reply(sock)
+        assert (status, request_id) == (STATUS_BAD_REQUEST, 2)
+        assert b"1600 bytes" in message
+        assert_closed(sock)
+
+
+def test_valid_requests_before_a_bad_frame_are_answered(server):
+    with connect(server) as sock:
+        sock.sendall(encode_request(np.full((1, 1), 30.0), 1) + b"garbage!" * 2)
+        status, request_id, payload = read_reply(sock)
+        assert (status, request_id) == (0, 1)
+        assert read_reply(sock)[0] == STATUS_BAD_REQUEST
+        assert_closed(sock)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Model warm-up before go-live.
+A freshly loaded model is run on batches of several sizes, taken from
+recently served rows when available or generated otherwise. Cold and warm
+latencies are measured so slow models can be rejected before they serve.
+"""
+
+import time
+
+import numpy as np
+
+WARMUP_BATCH_SIZES = (1, 32, 256)
+
+
+class RowRecorder:
+    """
+    Ring buffer of recently served feature rows, replayed during warm-up.
+    Only a few rows are copied per request, so recording stays cheap.
+    """
+
+    def __init__(self, max_rows: int = 1024, rows_per_request: int = 4):
+        self.max_rows = max_rows
+        self.rows_per_request = rows_per_request
+        self._rows = None
+        self._count = 0
+        self._next = 0
+
+    def record(self, X: np.ndarray):
+        if X.ndim != 2 or len(X) == 0 or self.max_rows <= 0:
+            return
+        if self._rows is None or self._rows.shape[1] != X.shape[1]:
+            # New feature layout (e.g. a different model): start over
+            self._rows = np.empty((self.max_rows, X.shape[1]), dtype=np.float64)
+            self._count = self._next = 0
+        for row in X[:self.rows_per_request]:
+            self._rows[self._next] = row
+            self._next = (self._next + 1) % self.max_rows
+            self._count = min(self._count + 1, self.max_rows)
+
+    def sample(self, n_features: int):
+        """Return a copy of the recorded rows, or None if they do not fit n_features."""
+        rows = self._rows
+        if rows is None or self._count == 0 or (n_features and rows.shape[1] != n_features):
+            return None
+        return rows[:self._count].copy()
+
+
+def warmup_batches(n_features: int, recorded=None, batch_sizes=WARMUP_BATCH_SIZES, seed=0):
+    """Build one batch per size from recorded rows or standard normal noise."""
+    rng = np.random.default_rng(seed)
+    batches = {}
+    for size in batch_sizes:
+        if recorded is not None:
+            batches[size] = recorded[rng.integers(0, len(recorded), size)]
+        else:
+            batches[size] = rng.standard_normal((size, n_features))
+    return batches
+
+
+def run_warmup(predict, batches: dict, repeats: int = 5) -> dict:
+    """
+    Call predict(X) on every batch: once cold, then repeats times warm.
+    Returns latencies in milliseconds per batch size.
+    """
+    results = {}
+    for size, X in batches.items():
+        start = time.perf_counter()
+        predict(X)
+        cold_ms = (time.perf_counter() - start) * 1000
+
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            predict(X)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        results[str(size)] = {
+            "cold_ms": round(cold_ms, 3),
+            "warm_p50_ms": round(float(np.median(timings)), 3),
+            "warm_max_ms": round(max(timings), 3)
+        }
+    return results
+
+
+def parse_budget(value: str) -> dict:
+    """
+    Parse a latency budget: either one number of milliseconds applied to
+    every batch size ("20"), or per-size limits ("1:5,256:40").
+    Returns {batch size or "*": ms}; an empty value means no budget.
+    """
+    budget = {}
+    for part in filter(None, (p.strip() for p in (value or "").split(","))):
+        size, _, limit = part.rpartition(":")
+        budget[size or "*"] = float(limit)
+    return budget
+
+
+def over_budget(results: dict, budget: dict) -> list:
+    """Describe every batch size whose warm median latency exceeds the budget."""
+    violations = []
+    for size, r in results.items():
+        limit = budget.get(size, budget.get("*"))
+        if limit is not None and limit > 0 and r["warm_p50_ms"] > limit:
+            violations.append(f"batch {size}: {r['warm_p50_ms']} ms > {limit:g} ms")
+    return violations
@@ -4,20 +4,40 @@ Part 3: Canary Deployment Service
 FastAPI service with canary deployment for ML models
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, HTTPException, Request, Response
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
-import mlflow
-import mlflow.sklearn
 import numpy as np
+import asyncio
+import gc
+import json
 import random
 import logging
+import os
 from datetime import datetime
 
+# Shared with the Part 2 model service, installed from part2_deployment
+# (see requirements.txt)
+from model_service_common.metrics import (BATCH_SIZE_BUCKETS, PROMETHEUS_CONTENT_TYPE,
+                                          MetricsRegistry, StageTimer)
+from model_service_common.gc_tuning import GCMonitor, parse_thresholds
+from model_service_common.startup_profile import StartupProfile
+from model_service_common.thread_governor import ThreadGovernor
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# mlflow is only imported by the first model load; it reads this variable then
+os.environ.setdefault("MLFLOW_TRACKING_URI", "http://localhost:5000")
+
+# Startup milestones, reported by /health
+startup_profile = StartupProfile()
+
+# Threads and CPUs of this worker (see model_service_common/thread_governor.py)
+governor = ThreadGovernor.from_env()
+governor.apply()
+
 # FastAPI app
 app = FastAPI(
     title="MLflow Canary Deployment Service",
@@ -31,6 +51,37 @@ next_model = None
 current_model_info = {}
 next_model_info = {}
 canary_ratio = 0.0  # Probability of using next_model (0.0 to 1.0)
+predictions_in_flight = 0  # /predict requests being handled, on the event loop
+
+# Prometheus metrics served at /metrics
+metrics = MetricsRegistry()
+predict_stage_seconds = metrics.histogram(
+    "canary_service_predict_stage_seconds",
+    "Time spent in each stage of /predict",
+    ("stage", "model_used", "model", "version")
+)
+model_call_rows = metrics.histogram(
+    "canary_service_model_call_rows",
+    "Rows per model predict call (batch size)",
+    ("model_used", "model", "version"),
+    buckets=BATCH_SIZE_BUCKETS
+)
+predictions_total = metrics.counter(
+    "canary_service_predictions_total",
+    "Prediction requests served, by routed model",
+    ("model_used", "model", "version")
+)
+# Garbage collector tuning and pause metrics (see model_service_common/gc_tuning.py)
+GC_FREEZE_AFTER_LOAD = os.environ.get("GC_FREEZE_AFTER_LOAD", "true").lower() == "true"
+GC_FREEZE_MAX_WAIT_S = float(os.environ.get("GC_FREEZE_MAX_WAIT_S", "2"))
+GC_THRESHOLDS = parse_thresholds(os.environ.get("GC_THRESHOLDS", "10000,50,100"))
+if GC_THRESHOLDS:
+    gc.set_threshold(*GC_THRESHOLDS)
+gc_monitor = GCMonitor(metrics, "canary_service")
+gc_monitor.install()
+metrics.callback("canary_service_canary_ratio",
+                 "Probability of routing a request to the next model",
+                 lambda: canary_ratio)
 
 # Statistics
 stats = {
@@ -117,7 +168,10 @@ def load_model_from_mlflow(model_name: str = None, version: int = None,
         else:
             raise ValueError("Must provide either model_name or run_id")
         
+        # Deferred: importing mlflow takes seconds, and /health must answer first
+        import mlflow.sklearn
         model = mlflow.sklearn.load_model(model_uri)
+        governor.configure_model(model)
         
         model_info = {
             "name": model_name or "unknown",
@@ -141,8 +195,9 @@ async def startup_event():
     global current_model, next_model
     
     logger.info("Starting Canary Deployment Service...")
-    mlflow.set_tracking_uri("http://localhost:5000")
+    logger.info(f"MLflow tracking URI: {os.environ['MLFLOW_TRACKING_URI']}")
     
+    startup_profile.mark("started")
     logger.info("Service started. Both current and next models are unloaded.")
     logger.info("Use /update-model to load models.")
 
@@ -161,7 +216,8 @@ async def root():
             "POST /predict": "Make predictions (uses canary routing)",
             "POST /update-model": "Update next model",
             "POST /accept-next-model": "Promote next to current",
-            "POST /set-canary-ratio": "Set canary routing ratio"
+            "POST /set-canary-ratio": "Set canary routing ratio",
+            "GET /metrics": "Prometheus metrics"
         }
     }
 
@@ -173,10 +229,19 @@ async def health():
         "status": "healthy",
         "current_model_loaded": current_model is not None,
         "next_model_loaded": next_model is not None,
-        "canary_ratio": canary_ratio
+        "canary_ratio": canary_ratio,
+        "startup": startup_profile.as_dict(),
+        "threads": governor.stats(),
+        "gc": gc_monitor.stats()
     }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    return Response(content=metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.get("/canary-status", response_model=CanaryStatus)
 async def get_canary_status():
     """Get detailed canary deployment status"""
@@ -206,13 +271,28 @@ async def get_canary_status():
     )
 
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
+@app.post("/predict", response_model=PredictionResponse,
+          openapi_extra={"requestBody": {
+              "required": True,
+              "content": {"application/json": {"schema": PredictionRequest.model_json_schema()}}
+          }})
+async def predict(request: Request):
     """
     Make predictions using canary routing.
     Uses next_model with probability = canary_ratio,
     otherwise uses current_model.
     """
+    global predictions_in_flight
+    
+    predictions_in_flight += 1
+    try:
+        return await route_prediction(request)
+    finally:
+        predictions_in_flight -= 1
+
+
+async def route_prediction(request: Request):
+    """predict() once counted in flight."""
     global stats
     
     if current_model is None and next_model is None:
@@ -221,8 +301,23 @@ async def predict(request: PredictionRequest):
             detail="No models loaded. Use /update-model to load a model."
         )
     
+    # Parsed and validated here rather than by FastAPI so each stage is timed
+    timer = StageTimer()
+    body = await request.body()
+    timer.mark("body_read")
     try:
-        X = np.array(request.features)
+        payload = json.loads(body)
+        timer.mark("parse")
+        features = PredictionRequest.model_validate(payload).features
+        timer.mark("validation")
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json(include_url=False)))
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON body: {e}")
+    
+    try:
+        X = np.array(features)
+        timer.mark("array_build")
         
         # Canary routing logic
         use_next = (next_model is not None and 
@@ -248,18 +343,29 @@ async def predict(request: PredictionRequest):
                 model_used = "current"
                 stats["current_model_predictions"] += 1
         
+        labels = (model_used, model_info.get("name", "unknown"), model_info.get("version", "unknown"))
+        
         # Make prediction
+        model_call_rows.observe(len(X), *labels)
         predictions = model.predict(X)
+        timer.mark("predict")
+        startup_profile.mark("first_prediction")
         stats["total_predictions"] += 1
         
         logger.info(f"Prediction made using {model_used} model")
         
-        return PredictionResponse(
+        # Serialize here rather than through response_model so it is timed
+        content = PredictionResponse(
             predictions=predictions.tolist(),
             model_used=model_used,
             model_name=model_info.get("name", "unknown"),
             model_version=model_info.get("version", "unknown")
-        )
+        ).model_dump_json()
+        timer.mark("serialization")
+        
+        timer.observe(predict_stage_seconds, *labels)
+        predictions_total.inc(*labels)
+        return Response(content=content, media_type="application/json")
         
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
@@ -274,13 +380,19 @@ async def update_model(request: UpdateModelRequest):
     """
     global next_model, next_model_info
     
+    loop = asyncio.get_running_loop()
     try:
-        next_model, next_model_info = load_model_from_mlflow(
-            model_name=request.model_name,
-            version=request.version,
-            run_id=request.run_id
-        )
+        # Loading and freezing block for seconds: keep them off the event loop
+        next_model, next_model_info = await loop.run_in_executor(
+            None, load_model_from_mlflow, request.model_name, request.version, request.run_id)
+        if GC_FREEZE_AFTER_LOAD:
+            # After the swap, so the replaced next model is collected, not frozen
+            # The collection holds the GIL: wait for a moment with no /predict in flight
+            next_model_info["gc_freeze"] = await loop.run_in_executor(
+                None, lambda: gc_monitor.freeze(idle=lambda: predictions_in_flight == 0,
+                                                max_wait=GC_FREEZE_MAX_WAIT_S))
         
+        startup_profile.mark("first_model_loaded")
         logger.info(f"Next model updated to: {next_model_info['mlflow_uri']}")
         
         return {
@@ -373,6 +485,9 @@ async def reset_stats():
     }
 
 
+startup_profile.mark("imported")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)